@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+
+# vim: autoindent tabstop=4 shiftwidth=4 expandtab softtabstop=4 filetype=python
+
+# End-to-end timings of ODS construction, DNS.get_ds() and zone_status() for fleets of zones.
+# Keys come from a fake enforcer (fake_enforcer.py), DS-records from fake authoritative DNS-servers
+# (fake_dns.py) on loopback. Nothing goes to the network.
+# Usage: benchmarks/bench_e2e.py [--sizes 1,100,10000] [--enforcer cli|socket] [--latency MS] [--loss RATIO]
+#                                [--truncate] [--repeat N]
+# Fake DNS-servers listen on port 53. Unless run as root, the benchmark re-runs itself as root of a new
+# user and network namespace, see unshare(1).
+
+import argparse
+import importlib.util
+import math
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..'))
+from lib.dnsutils import *
+from lib.odsutils import *
+from lib.reportutils import *
+from fake_fleet import *
+
+DEFAULT_SIZES = '1,100,10000'
+DEFAULT_REPEAT = 5
+
+
+def percentile(samples: list, pct: float):
+    # Nearest rank
+    ordered = sorted(samples)
+
+    return ordered[max(math.ceil(pct / 100.0 * len(ordered)) - 1, 0)]
+
+
+def report(zones: int, stage: str, samples: list, total: float, count: int):
+    """
+    :param samples: latencies, seconds
+    :param total: time taken by count operations, seconds
+    """
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print("%6d zones  %-14s %10.1f zones/s  p50 %9.3f ms  p99 %9.3f ms  peak RSS %7.1f MiB" % (
+        zones, stage, count / total, percentile(samples, 50) * 1000, percentile(samples, 99) * 1000,
+        peak_rss / 1024), flush=True)
+
+
+def start_server(cmd: list, env: dict = None):
+    """
+    Start a fake server and wait until it tells it's ready by its first line of output.
+    """
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, env=env)
+    if not process.stdout.readline():
+        raise RuntimeError("%s failed to start" % ' '.join(cmd))
+
+    return process
+
+
+def load_helper():
+    """
+    dnssec-ods-ksk-helper.py is not a module name, import it by path.
+    """
+    path = os.path.join(BENCHMARKS_DIR, '..', 'dnssec-ods-ksk-helper.py')
+    spec = importlib.util.spec_from_file_location('dnssec_ods_ksk_helper', path)
+    helper = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(helper)
+
+    return helper
+
+
+def use_fake_enforcer(args, directory: str, processes: list):
+    if args.enforcer == 'socket':
+        path = os.path.join(directory, 'enforcer.sock')
+        processes.append(start_server([sys.executable, os.path.join(BENCHMARKS_DIR, 'fake_enforcer.py'),
+                                       '--socket', path, directory]))
+        ODS.use_socket(path)
+        return
+
+    # ods-enforcer in PATH is the fake one
+    bin_dir = os.path.join(directory, 'bin')
+    os.mkdir(bin_dir)
+    wrapper = os.path.join(bin_dir, 'ods-enforcer')
+    with open(wrapper, 'w') as wrapper_file:
+        wrapper_file.write('#!/bin/sh\nexec "%s" "%s" "$@"\n' % (sys.executable,
+                                                                os.path.join(BENCHMARKS_DIR, 'fake_enforcer.py')))
+    os.chmod(wrapper, 0o755)
+    os.environ['PATH'] = '%s:%s' % (bin_dir, os.environ.get('PATH', ''))
+    os.environ['FAKE_ENFORCER_DIR'] = directory
+
+
+def run_size(args, size: int):
+    """
+    Benchmark a fleet of given size. Run in a process of its own, peak RSS is per process.
+    """
+    helper = load_helper()
+    fleet = Fleet(Zones=size, Seed=args.seed)
+    processes = []
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            fleet.write_enforcer_outputs(directory)
+            use_fake_enforcer(args, directory, processes)
+            dns_cmd = [sys.executable, os.path.join(BENCHMARKS_DIR, 'fake_dns.py'), '--zones', str(size),
+                       '--seed', str(args.seed), '--latency', str(args.latency), '--loss', str(args.loss)]
+            if args.truncate:
+                dns_cmd.append('--truncate')
+            processes.append(start_server(dns_cmd))
+
+            # Whole fleet from the enforcer at once, with DS-information, like --all does
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                zones = list(ODS.get_zones().values())
+                ODS.prefetch_zones_ds(zones)
+                samples.append(time.perf_counter() - start)
+            report(size, 'ODS', samples, sum(samples), size * len(samples))
+
+            # Zone by zone, one resolver with its delegation cache
+            dns_client = DNS()
+            dns_client.resolver.nameservers = [ROOT_ADDRESS]
+            results = {}
+            samples = []
+            for zone in zones:
+                start = time.perf_counter()
+                results[zone.zone] = dns_client.get_ds(zone.zone)
+                samples.append(time.perf_counter() - start)
+            report(size, 'DNS.get_ds', samples, sum(samples), len(samples))
+
+            renderer = TextRenderer(Output=open(os.devnull, 'w'))
+            samples = []
+            phases = {}
+            for zone in zones:
+                start = time.perf_counter()
+                zone_report = helper.zone_status(zone, results[zone.zone], renderer=renderer)
+                samples.append(time.perf_counter() - start)
+                phases[zone_report.phase] = phases.get(zone_report.phase, 0) + 1
+            renderer.output.close()
+            report(size, 'zone_status', samples, sum(samples), len(samples))
+            print("%6d zones  phases: %s" % (size, ', '.join(
+                ['%s %d' % (phase, phases[phase]) for phase in sorted(phases)])), flush=True)
+        finally:
+            ODS.backend.close()
+            for process in processes:
+                process.terminate()
+                process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end benchmark with fake enforcer and DNS-servers')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Comma-separated fleet sizes, default: %s' %
+                                                               DEFAULT_SIZES)
+    parser.add_argument('--enforcer', choices=['cli', 'socket'], default='cli',
+                        help='Ask the fake enforcer by running ods-enforcer or via control socket')
+    parser.add_argument('--latency', type=float, default=0.0, help='Delay of each DNS-response, ms')
+    parser.add_argument('--loss', type=float, default=0.0, help='Ratio of UDP DNS-queries left unanswered')
+    parser.add_argument('--truncate', action='store_true', help='Truncate DS-responses over UDP, forcing TCP')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Rounds of ODS construction')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of fleet')
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--in-namespace', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.size is not None:
+        run_size(args, args.size)
+        return
+
+    if os.geteuid() != 0 and not args.in_namespace:
+        # Binding port 53 needs root. Be one, in a network namespace of our own having only loopback.
+        os.execvp('unshare', ['unshare', '--user', '--map-root-user', '--net', sys.executable,
+                              os.path.abspath(__file__)] + sys.argv[1:] + ['--in-namespace'])
+    if args.in_namespace:
+        subprocess.run(['ip', 'link', 'set', 'lo', 'up'], check=True)
+
+    print("Fake enforcer via %s, DNS latency %.1f ms, loss %.1f %%%s:" % (
+        args.enforcer, args.latency, args.loss * 100, ', truncated UDP' if args.truncate else ''))
+    for size in [int(size) for size in args.sizes.split(',')]:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--size', str(size)] + sys.argv[1:], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+# vim: autoindent tabstop=4 shiftwidth=4 expandtab softtabstop=4 filetype=python
+
+# Throughput and memory of parsing large ods-enforcer outputs.
+# Usage: benchmarks/bench_parser.py [LINES]
+
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from lib.odsutils import *
+
+DEFAULT_LINES = 100000
+
+
+def synthetic_key_list(lines: int):
+    """
+    Output of ods-enforcer key list --verbose --keytype ksk for a large fleet
+    """
+    yield "Keys:"
+    yield "Zone:                           Keytype: State:    Date of next transition: Size: Algorithm: " \
+          "CKA_ID:                          Repository:                      KeyTag:"
+    states = [('active', '2030-05-01 10:00:00'), ('active', '2030-06-01 12:00:00'), ('ready', 'waiting for ds-seen'),
+              ('retire', 'waiting for ds-gone'), ('publish', '2030-05-02 00:00:00')]
+    rand = random.Random(lines)
+    for idx in range(lines):
+        (state, transition) = rand.choice(states)
+        yield "%-31s KSK      %-9s %-24s %-5d %-10d %032x SoftHSM                          %d" % (
+            'zone%d.example' % idx, state, transition, 2048, 8, idx, idx % 65536)
+
+
+def legacy_parse(output: str):
+    """
+    Parser before streaming: whole buffer, line.split() and strptime on every line
+    """
+    keys = {}
+    for line in output.splitlines():
+        line_parts = line.split()
+        if len(line_parts) < 2 or not line_parts[1] == 'KSK':
+            continue
+        bits_idx = 5
+        do_transition = True
+        while not line_parts[bits_idx].isdigit():
+            bits_idx += 1
+            do_transition = False
+        next_transition = None
+        if do_transition:
+            next_transition = datetime.strptime('%s %s' % (line_parts[3], line_parts[4]), '%Y-%m-%d %H:%M:%S')
+        key = OdsKey(Type='KSK', Tag=int(line_parts[bits_idx + 4]), State=line_parts[2],
+                     Bits=int(line_parts[bits_idx]), Algorithm=int(line_parts[bits_idx + 1]),
+                     NextTransition=next_transition)
+        keys.setdefault(line_parts[0], {})[key.tag] = key
+
+    return keys
+
+
+def measure(name: str, lines: int, func):
+    start = time.perf_counter()
+    count = func()
+    elapsed = time.perf_counter() - start
+    # Tracing slows things down, measure memory with a separate run
+    tracemalloc.start()
+    func()
+    (_, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("%-32s %8d keys %8.3f s %10.0f lines/s  peak %8.1f KiB" % (name, count, elapsed, lines / elapsed,
+                                                                      peak / 1024))
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_LINES
+    output = '\n'.join(synthetic_key_list(lines)) + '\n'
+
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.txt') as output_file:
+        output_file.write(output)
+        output_file.flush()
+
+        print("Parsing %d lines of ods-enforcer key list --verbose:" % lines)
+        measure("legacy, buffered", lines, lambda: sum(len(keys) for keys in legacy_parse(output).values()))
+        measure("iter_list_keys(), buffered", lines, lambda: sum(1 for _ in iter_list_keys(output)))
+        measure("iter_list_keys(), KeyStore", lines, lambda: len(ODS._ods_enforcer_cmd_list_all_keys_result(output)))
+
+        # Lines straight from a pipe. Keys are counted, not stored, so memory use stays flat.
+        def _stream():
+            with subprocess.Popen(['cat', output_file.name], stdout=subprocess.PIPE) as process:
+                return sum(1 for _ in iter_list_keys(line.decode('utf-8') for line in process.stdout))
+
+        del output
+        measure("iter_list_keys(), piped stream", lines, _stream)
+
+
+if __name__ == '__main__':
+    main()
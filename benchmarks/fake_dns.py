@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+# vim: autoindent tabstop=4 shiftwidth=4 expandtab softtabstop=4 filetype=python
+
+# Authoritative DNS-servers for the zones of fake_fleet.py: root, TLDs and hosting servers of the zones,
+# each on its own loopback address, port 53. Latency, packet loss and truncation can be set.
+# Usage: benchmarks/fake_dns.py [--zones N] [--seed SEED] [--latency MS] [--loss RATIO] [--truncate]
+
+import argparse
+import asyncio
+import random
+import struct
+import dns.flags
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+from fake_fleet import *
+
+TTL = 3600
+DELEGATION_TTL = 86400
+
+
+class FakeZoneData:
+    """
+    Records of a zone in the fake tree, as needed for referrals and DS-, NS- and DNSKEY-queries.
+    """
+
+    def __init__(self, Name: str, Nameservers: list, Ds: list = None, Dnskeys: list = None):
+        """
+        :param Nameservers: list of (host, address)
+        """
+        self.name = dns.name.from_text(Name)
+        self.ns = dns.rrset.from_text_list(self.name, DELEGATION_TTL, 'IN', 'NS',
+                                           [host for (host, _) in Nameservers])
+        self.glue = [dns.rrset.from_text(host, DELEGATION_TTL, 'IN', 'A', address)
+                     for (host, address) in Nameservers]
+        self.soa = dns.rrset.from_text(self.name, 300, 'IN', 'SOA', '%s %s 1 3600 600 86400 300' % (
+            Nameservers[0][0], dns.name.from_text('hostmaster', self.name)))
+        self.ds = dns.rrset.from_rdata_list(self.name, TTL, Ds) if Ds else None
+        self.dnskey = dns.rrset.from_rdata_list(self.name, TTL, Dnskeys) if Dnskeys else None
+
+
+class FakeTree:
+    def __init__(self, fleet: Fleet):
+        self.zones = {}
+        self._add(FakeZoneData(Name='.', Nameservers=[('a.root-servers.test.', ROOT_ADDRESS)]))
+        for (tld_idx, tld) in enumerate(TLDS):
+            self._add(FakeZoneData(Name=tld, Nameservers=[('ns%d.nic.%s.' % (idx + 1, tld), address)
+                                                          for (idx, address) in enumerate(tld_addresses(tld_idx))]))
+        for zone in fleet.zones:
+            hosting = zone.hosting
+            self._add(FakeZoneData(Name=zone.name, Nameservers=[('ns%d.hosting.test.' % (hosting + 1),
+                                                                 hosting_address(hosting))],
+                                   Ds=[zone.get_ds(key) for key in zone.get_parent_keys()],
+                                   Dnskeys=[key.dnskey for key in zone.keys]))
+
+    def _add(self, zone: FakeZoneData):
+        self.zones[zone.name] = zone
+
+    def answer(self, query: dns.message.Message, served: set):
+        question = query.question[0]
+        response = dns.message.make_response(query)
+        (zone, cut) = self._find(question.name, served)
+        if zone is None:
+            response.set_rcode(dns.rcode.REFUSED)
+            return response
+
+        if cut is not None and not (question.rdtype == dns.rdatatype.DS and question.name == cut.name):
+            # Referral
+            response.authority.append(cut.ns)
+            response.additional.extend(cut.glue)
+            return response
+
+        response.flags |= dns.flags.AA
+        if cut is not None:
+            # DS is in the parent side of the zone cut
+            rrset = cut.ds
+        elif question.name != zone.name:
+            response.set_rcode(dns.rcode.NXDOMAIN)
+            rrset = None
+        elif question.rdtype == dns.rdatatype.NS:
+            response.additional.extend(zone.glue)
+            rrset = zone.ns
+        elif question.rdtype == dns.rdatatype.DNSKEY:
+            rrset = zone.dnskey
+        else:
+            rrset = None
+        if rrset is not None:
+            response.answer.append(rrset)
+        else:
+            response.authority.append(zone.soa)
+
+        return response
+
+    def _find(self, name: dns.name.Name, served: set):
+        """
+        :return: tuple (closest zone served, topmost zone cut below it towards name or None)
+        """
+        cut = None
+        while True:
+            if name in served:
+                return self.zones[name], cut
+            if name in self.zones:
+                cut = self.zones[name]
+            if name == dns.name.root:
+                return None, None
+            name = name.parent()
+
+
+class FakeServer:
+    def __init__(self, Tree: FakeTree, Address: str, Zones: list, Latency: float = 0.0, Loss: float = 0.0,
+                 Truncate: bool = False):
+        self.tree = Tree
+        self.address = Address
+        self.zones = {dns.name.from_text(zone) for zone in Zones}
+        self.latency = Latency
+        self.loss = Loss
+        self.truncate = Truncate
+
+    def handle(self, wire: bytes, tcp: bool):
+        query = dns.message.from_wire(wire)
+        response = self.tree.answer(query, self.zones)
+        if self.truncate and not tcp and response.answer:
+            response.answer = []
+            response.flags |= dns.flags.TC
+
+        return response.to_wire()
+
+
+class UdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server: FakeServer):
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if self.server.loss and random.random() < self.server.loss:
+            return
+        response = self.server.handle(data, False)
+        if self.server.latency:
+            asyncio.get_running_loop().call_later(self.server.latency, self.transport.sendto, response, addr)
+        else:
+            self.transport.sendto(response, addr)
+
+
+async def _tcp_connection(server: FakeServer, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            (length,) = struct.unpack('!H', await reader.readexactly(2))
+            data = await reader.readexactly(length)
+            if server.latency:
+                await asyncio.sleep(server.latency)
+            response = server.handle(data, True)
+            writer.write(struct.pack('!H', len(response)) + response)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    writer.close()
+
+
+def make_servers(fleet: Fleet, latency: float = 0.0, loss: float = 0.0, truncate: bool = False):
+    """
+    Truncation applies to TLD-servers: DS-responses over UDP are truncated and retried over TCP.
+    """
+    tree = FakeTree(fleet)
+    servers = [FakeServer(Tree=tree, Address=ROOT_ADDRESS, Zones=['.'], Latency=latency, Loss=loss)]
+    for (tld_idx, tld) in enumerate(TLDS):
+        for address in tld_addresses(tld_idx):
+            servers.append(FakeServer(Tree=tree, Address=address, Zones=[tld], Latency=latency, Loss=loss,
+                                      Truncate=truncate))
+    for hosting in range(HOSTING_SERVERS):
+        zones = [zone.name for zone in fleet.zones if zone.hosting == hosting]
+        servers.append(FakeServer(Tree=tree, Address=hosting_address(hosting), Zones=zones, Latency=latency,
+                                  Loss=loss))
+
+    return servers
+
+
+async def serve(servers: list, port: int = 53):
+    loop = asyncio.get_running_loop()
+    for server in servers:
+        await loop.create_datagram_endpoint(lambda server=server: UdpProtocol(server),
+                                            local_addr=(server.address, port))
+        await asyncio.start_server(lambda reader, writer, server=server: _tcp_connection(server, reader, writer),
+                                   server.address, port)
+
+
+async def _main(args):
+    servers = make_servers(Fleet(Zones=args.zones, Seed=args.seed), args.latency / 1000.0, args.loss, args.truncate)
+    await serve(servers)
+    print("Serving %d zones on %d servers" % (args.zones, len(servers)), flush=True)
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake authoritative DNS-servers for benchmarks')
+    parser.add_argument('--zones', type=int, default=100, help='Number of zones in fleet')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of fleet')
+    parser.add_argument('--latency', type=float, default=0.0, help='Delay of each response, ms')
+    parser.add_argument('--loss', type=float, default=0.0, help='Ratio of UDP-queries left unanswered')
+    parser.add_argument('--truncate', action='store_true', help='Truncate DS-responses of TLD-servers over UDP')
+    args = parser.parse_args()
+
+    asyncio.run(_main(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+# vim: autoindent tabstop=4 shiftwidth=4 expandtab softtabstop=4 filetype=python
+
+# Stand-in for ods-enforcer, answering key list and key export from outputs rendered by fake_fleet.py.
+# Usage:
+#   FAKE_ENFORCER_DIR=DIR benchmarks/fake_enforcer.py key list --verbose ...   like ods-enforcer
+#   benchmarks/fake_enforcer.py --socket PATH DIR                             like the enforcer daemon
+
+import os
+import socket
+import struct
+import sys
+import threading
+
+# Message opcodes, see OpenDNSSEC common/clientpipe.h
+OPC_STDOUT = 0
+OPC_STDIN = 2
+OPC_EXIT = 4
+MAX_MESSAGE = 65535
+
+
+def _arg_value(args: list, name: str):
+    if name not in args or args.index(name) + 1 >= len(args):
+        return None
+
+    return args[args.index(name) + 1]
+
+
+def run_command(directory: str, cmd_args: list):
+    """
+    :param cmd_args: arguments like given to ods-enforcer, options can share an argument
+    :return: tuple (output lines, exit code)
+    """
+    args = ' '.join(cmd_args).split()
+    zone = _arg_value(args, '--zone')
+    if args[:2] == ['key', 'list']:
+        filename = 'key-list.txt'
+        prefix = '%s ' % zone if zone else None
+    elif args[:2] == ['key', 'export']:
+        filename = 'export-%s.txt' % _arg_value(args, '--keystate')
+        prefix = '%s.\t' % zone if zone else None
+    else:
+        return ["Unknown command: %s\n" % ' '.join(args)], 1
+
+    with open(os.path.join(directory, filename)) as output_file:
+        lines = output_file.readlines()
+    if prefix:
+        # Header and comment lines don't matter for the parser
+        lines = [line for line in lines if line.startswith(prefix)]
+
+    return lines, 0
+
+
+def _receive_bytes(conn: socket.socket, length: int):
+    data = b''
+    while len(data) < length:
+        received = conn.recv(length - len(data))
+        if not received:
+            return None
+        data += received
+
+    return data
+
+
+def _serve_connection(conn: socket.socket, directory: str):
+    with conn:
+        while True:
+            header = _receive_bytes(conn, 3)
+            if header is None:
+                return
+            (_, length) = struct.unpack('!BH', header)
+            command = _receive_bytes(conn, length)
+            if command is None:
+                return
+            (lines, exit_code) = run_command(directory, [command.decode('utf-8')])
+            output = ''.join(lines).encode('utf-8')
+            for idx in range(0, len(output), MAX_MESSAGE):
+                chunk = output[idx:idx + MAX_MESSAGE]
+                conn.sendall(struct.pack('!BH', OPC_STDOUT, len(chunk)) + chunk)
+            conn.sendall(struct.pack('!BHB', OPC_EXIT, 1, exit_code))
+
+
+def serve(path: str, directory: str):
+    """
+    Listen on a control socket like the enforcer daemon does, commands of a connection can be pipelined.
+    """
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(16)
+    print("Listening on %s" % path, flush=True)
+    while True:
+        (conn, _) = server.accept()
+        threading.Thread(target=_serve_connection, args=(conn, directory), daemon=True).start()
+
+
+def main():
+    if sys.argv[1:2] == ['--socket']:
+        serve(sys.argv[2], sys.argv[3])
+        return
+
+    directory = os.environ.get('FAKE_ENFORCER_DIR')
+    if not directory:
+        print("Need FAKE_ENFORCER_DIR", file=sys.stderr)
+        sys.exit(2)
+    (lines, exit_code) = run_command(directory, sys.argv[1:])
+    sys.stdout.writelines(lines)
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
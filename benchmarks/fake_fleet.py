@@ -0,0 +1,125 @@
+# vim: autoindent tabstop=4 shiftwidth=4 expandtab softtabstop=4 filetype=python
+
+# Synthetic fleet of DNSSEC-signed zones, shared by the fake enforcer and the fake DNS-servers.
+# The same number of zones and seed always yield the same zones, keys and DS-records.
+
+import hashlib
+import os
+import random
+import struct
+import dns.dnssec
+import dns.name
+import dns.rdata
+import dns.rdataclass
+import dns.rdatatype
+
+# Address plan of the fake DNS-tree, all on loopback
+ROOT_ADDRESS = '127.53.0.1'
+TLDS = ['test', 'example']
+# Servers per TLD, DS-queries with --propagation go to all of them
+TLD_SERVERS = 2
+HOSTING_SERVERS = 4
+
+KEY_ALGORITHM = 8
+KEY_BITS = 2048
+TRANSITION = '2030-05-01 10:00:00'
+
+# Rollover phases of zones: (weight, keys as (state, next transition), states of keys having DS at parent)
+PHASES = {
+    'active': (60, [('active', TRANSITION)], ['active']),
+    'publish': (6, [('publish', TRANSITION)], []),
+    'ready': (7, [('ready', 'waiting for ds-seen')], ['ready']),
+    'rollover': (7, [('ready', 'waiting for ds-seen'), ('retire', TRANSITION)], ['retire']),
+    'rollover-seen': (7, [('ready', 'waiting for ds-seen'), ('retire', TRANSITION)], ['ready', 'retire']),
+    'retire': (7, [('active', TRANSITION), ('retire', 'waiting for ds-gone')], ['active', 'retire']),
+    'ds-gone': (6, [('active', TRANSITION), ('retire', 'waiting for ds-gone')], ['active']),
+}
+
+
+def tld_addresses(tld_idx: int):
+    return ['127.53.1.%d' % (tld_idx * TLD_SERVERS + idx + 1) for idx in range(TLD_SERVERS)]
+
+
+def hosting_address(idx: int):
+    return '127.53.2.%d' % (idx + 1)
+
+
+class FakeKey:
+    def __init__(self, State: str, Transition: str, Dnskey: dns.rdata.Rdata):
+        self.state = State
+        self.transition = Transition
+        self.dnskey = Dnskey
+        self.tag = dns.dnssec.key_id(Dnskey)
+
+
+class FakeZone:
+    def __init__(self, Name: str, Tld: int, Hosting: int, Phase: str, Keys: list, ParentStates: list):
+        self.name = Name
+        self.tld = Tld
+        self.hosting = Hosting
+        self.phase = Phase
+        self.keys = Keys
+        self.parent_states = ParentStates
+
+    def get_parent_keys(self):
+        return [key for key in self.keys if key.state in self.parent_states]
+
+    def get_ds(self, key: FakeKey, digest: str = 'SHA256'):
+        # SHA-1 is not for validating, but enforcer exports it
+        return dns.dnssec.make_ds(self.name + '.', key.dnskey, digest, validating=True)
+
+
+class Fleet:
+    def __init__(self, Zones: int, Seed: int = 1):
+        self.zones = []
+        rand = random.Random(Seed)
+        phases = list(PHASES)
+        weights = [PHASES[phase][0] for phase in phases]
+        for idx in range(Zones):
+            tld = idx % len(TLDS)
+            phase = rand.choices(phases, weights)[0]
+            (_, key_states, parent_states) = PHASES[phase]
+            name = 'zone%05d.%s' % (idx, TLDS[tld])
+            keys = [FakeKey(State=state, Transition=transition, Dnskey=Fleet._make_dnskey(name, key_idx))
+                    for (key_idx, (state, transition)) in enumerate(key_states)]
+            self.zones.append(FakeZone(Name=name, Tld=tld, Hosting=idx % HOSTING_SERVERS, Phase=phase, Keys=keys,
+                                       ParentStates=parent_states))
+
+    def __len__(self):
+        return len(self.zones)
+
+    def get_zone_names(self):
+        return [zone.name for zone in self.zones]
+
+    def write_enforcer_outputs(self, directory: str):
+        """
+        Render outputs of ods-enforcer key list and key export once, the fake enforcer only filters them.
+        """
+        with open(os.path.join(directory, 'key-list.txt'), 'w') as output:
+            output.write("Keys:\n")
+            output.write("Zone:                           Keytype: State:    Date of next transition: Size: "
+                         "Algorithm: CKA_ID:                          Repository:                      KeyTag:\n")
+            for zone in self.zones:
+                for key in zone.keys:
+                    output.write("%-31s KSK      %-9s %-24s %-5d %-10d %032x SoftHSM                          %d\n" % (
+                        zone.name, key.state, key.transition, KEY_BITS, KEY_ALGORITHM,
+                        int.from_bytes(key.dnskey.key[:16], 'big'), key.tag))
+
+        for state in ('publish', 'ready', 'retire'):
+            with open(os.path.join(directory, 'export-%s.txt' % state), 'w') as output:
+                for zone in self.zones:
+                    for key in zone.keys:
+                        if key.state != state:
+                            continue
+                        for digest in ('SHA1', 'SHA256'):
+                            output.write(";%s KSK DS record (%s):\n" % (state, digest))
+                            output.write("%s.\t3600\tIN\tDS\t%s\n" % (zone.name, zone.get_ds(key, digest).to_text()))
+                        output.write("\n")
+
+    @staticmethod
+    def _make_dnskey(zone: str, idx: int):
+        # Not a usable RSA-key, only its bytes matter for keytags and digests
+        key = hashlib.sha256(('%s %d' % (zone, idx)).encode('ascii')).digest() * 8
+        wire = struct.pack('!HBB', 257, 3, KEY_ALGORITHM) + key
+
+        return dns.rdata.from_wire(dns.rdataclass.IN, dns.rdatatype.DNSKEY, wire, 0, len(wire))
@@ -1 +1,8 @@
 from .dns import *
+from .async_dns import *
+from .child_keys import *
+from .delegation import *
+from .disk_cache import *
+from .propagation import *
+from .server_stats import *
+from .tcp_pool import *
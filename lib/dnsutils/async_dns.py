@@ -0,0 +1,422 @@
+import asyncio
+import errno
+import dns.asyncquery
+import dns.asyncresolver
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdataclass
+import dns.rdatatype
+import dns.resolver
+import time
+from .child_keys import ChildKeys
+from .delegation import Delegation, DelegationCache
+from .disk_cache import DiskCache
+from .dns import DNS, DsQueryError
+from .propagation import PropagationReport, ServerDsResult
+from .server_stats import ServerStats
+from .tcp_pool import TcpConnectionPool
+from ..traceutils import TRACER
+
+
+class AsyncDNS:
+    """
+    asyncio-based counterpart of DNS. Does DS-lookups for many zones concurrently.
+    """
+    DEFAULT_DNS_TIMEOUT = DNS.DEFAULT_DNS_TIMEOUT
+    DEFAULT_MAX_IN_FLIGHT = 50
+    DEFAULT_MAX_PER_SERVER = 5
+    # Number of servers to try, if query doesn't get answered fast enough
+    MAX_TRIES = DNS.MAX_TRIES
+    # Errors of a server address not usable from here, rather than of a failing server
+    UNREACHABLE_ERRNOS = (errno.ENETUNREACH, errno.EHOSTUNREACH, errno.EADDRNOTAVAIL, errno.EAFNOSUPPORT)
+
+    def __init__(self, MaxInFlight: int = DEFAULT_MAX_IN_FLIGHT, MaxPerServer: int = DEFAULT_MAX_PER_SERVER,
+                 Delegations: DelegationCache = None, Cache: DiskCache = None, Stats: ServerStats = None,
+                 Tcp: bool = False, Child: bool = False):
+        """
+        :param Child: along with DS-records at parent, query DNSKEY-, CDS- and CDNSKEY-records from the zone's
+                      own nameservers, see child_keys
+        """
+        self.resolver = dns.asyncresolver.Resolver()
+        if Delegations is None:
+            Delegations = DelegationCache(Storage=Cache)
+        self.delegations = Delegations
+        self.cache = Cache
+        if Stats is None:
+            Stats = ServerStats(Timeout=self.DEFAULT_DNS_TIMEOUT)
+        self.server_stats = Stats
+        # Query DS-records over pooled TCP-connections right away, don't wait for a truncated UDP-response
+        self.tcp = Tcp
+        self.tcp_pool = TcpConnectionPool()
+        # zone -> TTL of its DS-records at parent, from the latest lookup
+        self.ds_ttls = {}
+        self.child = Child
+        # zone -> ChildKeys, from the latest lookup
+        self.child_keys = {}
+        self._ns_lookups = {}
+        self.max_in_flight = MaxInFlight
+        self.max_per_server = MaxPerServer
+        self._server_limits = {}
+
+    async def get_ds_many(self, zones: list):
+        """
+        Query DS-records of given zones concurrently.
+        Results are yielded in the order the lookups complete.
+        :param zones: list of zone names
+        :return: async generator of (zone, result). Result is (ns, ds) as returned by get_ds()
+                 or the exception the lookup failed with.
+        """
+        async for result in self._lookup_many(zones, self.get_ds):
+            yield result
+
+    async def get_ds_propagation_many(self, zones: list):
+        """
+        Query DS-records of given zones concurrently from all nameservers of their parents.
+        Results are yielded in the order the lookups complete.
+        :param zones: list of zone names
+        :return: async generator of (zone, result). Result is PropagationReport
+                 or the exception the lookup failed with.
+        """
+        async for result in self._lookup_many(zones, self.get_ds_propagation):
+            yield result
+
+    async def _lookup_many(self, zones: list, lookup):
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+
+        async def _lookup(zone: str):
+            async with in_flight:
+                try:
+                    return zone, await lookup(zone)
+                except Exception as exc:
+                    return zone, exc
+
+        tasks = [asyncio.ensure_future(_lookup(zone)) for zone in zones]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def get_ds(self, zone: str):
+        if self.child:
+            (result, _) = await asyncio.gather(self._get_ds(zone), self.get_child_keys(zone))
+            return result
+
+        return await self._get_ds(zone)
+
+    async def _get_ds(self, zone: str):
+        with TRACER.span('get ds', 'dns', zone=zone) as span:
+            if self.cache:
+                cached = self.cache.get_ds(zone)
+                span.set(cache='hit' if cached else 'miss')
+                if cached:
+                    return cached
+
+            zone_to_query = DNS.get_parent_zone(zone)
+            addresses = await self._get_addresses(await self._get_delegation(zone_to_query))
+            query_request = DNS.make_query(zone, dns.rdatatype.DS)
+            try:
+                (response, ns) = await self._query_hedged(query_request, addresses, self.tcp)
+            except (dns.exception.DNSException, OSError, EOFError) as exc:
+                raise DsQueryError(zone, zone_to_query, exc) from exc
+            if response.rcode() not in (dns.rcode.NOERROR, dns.rcode.NXDOMAIN):
+                # SERVFAIL or REFUSED doesn't tell whether there are DS-records
+                error = Exception('%s from %s' % (dns.rcode.to_text(response.rcode()), ns))
+                raise DsQueryError(zone, zone_to_query, error)
+            answers = response.answer[0] if response.answer else None
+            ds = DNS._ds_result(answers)
+            if ds:
+                self.ds_ttls[zone] = answers.ttl
+            if self.cache and ds:
+                self.cache.put_ds(zone, ns, ds, answers.ttl)
+
+            return ns, ds
+
+    async def get_ds_propagation(self, zone: str):
+        """
+        Query DS-records of a zone from all nameservers of the parent zone, all addresses, in parallel.
+        :return: PropagationReport
+        """
+        if self.child:
+            (result, _) = await asyncio.gather(self._get_ds_propagation(zone), self.get_child_keys(zone))
+            return result
+
+        return await self._get_ds_propagation(zone)
+
+    async def _get_ds_propagation(self, zone: str):
+        with TRACER.span('get ds propagation', 'dns', zone=zone):
+            zone_to_query = DNS.get_parent_zone(zone)
+            delegation = await self._get_delegation(zone_to_query)
+            await self._resolve_all_addresses(delegation)
+
+            queries = []
+            unresolved = []
+            for host in delegation.nameservers:
+                if not delegation.nameservers[host]:
+                    # Not checked, can't claim the servers agree
+                    unresolved.append(ServerDsResult(Host=host.to_text(), Address=None, Error='no address'))
+                for address in delegation.nameservers[host]:
+                    queries.append(self._query_ds_server(zone, host.to_text(), address))
+            servers = await asyncio.gather(*queries)
+
+            return PropagationReport(Zone=zone, Parent=delegation.zone.to_text(), Servers=servers + unresolved)
+
+    async def get_child_keys(self, zone: str):
+        """
+        Query DNSKEY-, CDS- and CDNSKEY-records of a zone from its own nameservers, concurrently.
+        The zone's delegation is learned from the parent once, then cached like any other.
+        A failure doesn't fail the zone, it is recorded in the result.
+        :return: ChildKeys, also stored into child_keys
+        """
+        with TRACER.span('get child keys', 'dns', zone=zone) as span:
+            try:
+                # Share the walk to the parent with the DS-lookup running alongside, then it's one hop more
+                await self._get_delegation(DNS.get_parent_zone(zone))
+                delegation = await self._get_delegation(zone)
+                if delegation.zone != dns.name.from_text(zone):
+                    raise Exception('Zone %s is not delegated' % zone)
+                addresses = await self._get_addresses(delegation)
+                queries = [self._query_child(zone, rdtype, addresses)
+                           for rdtype in (dns.rdatatype.DNSKEY, dns.rdatatype.CDS, dns.rdatatype.CDNSKEY)]
+                ((dnskeys, address), (cds, _), (cdnskeys, _)) = await asyncio.gather(*queries)
+                child_keys = ChildKeys.from_answers(zone, address, dnskeys, cds, cdnskeys)
+            except Exception as exc:
+                span.set(error=str(exc))
+                child_keys = ChildKeys(Zone=zone, Error=str(exc) or exc.__class__.__name__)
+        self.child_keys[zone] = child_keys
+
+        return child_keys
+
+    async def _query_child(self, zone: str, rdtype: dns.rdatatype.RdataType, addresses: list):
+        query_request = DNS.make_query(zone, rdtype)
+        (response, address) = await self._query_hedged(query_request, addresses, self.tcp)
+        if response.rcode() != dns.rcode.NOERROR:
+            raise Exception('%s query of %s failed at %s: %s' % (
+                dns.rdatatype.to_text(rdtype), zone, address, dns.rcode.to_text(response.rcode())))
+
+        return response.get_rrset(response.answer, query_request.question[0].name, dns.rdataclass.IN, rdtype), \
+            address
+
+    async def _query_ds_server(self, zone: str, host: str, address: str):
+        query_request = DNS.make_query(zone, dns.rdatatype.DS)
+        start = time.monotonic()
+        try:
+            # Every server gets the full timeout, a slow one is not a failing one
+            (resp, _) = await self._timed_query(query_request, address, self.tcp, self.DEFAULT_DNS_TIMEOUT)
+        except dns.exception.Timeout:
+            return ServerDsResult(Host=host, Address=address, Error='timeout')
+        except OSError as exc:
+            # Typically no IPv6-connectivity. Anything else, eg. refused connection, is a failing server.
+            return ServerDsResult(Host=host, Address=address, Error=str(exc) or exc.__class__.__name__,
+                                  Unreachable=exc.errno in self.UNREACHABLE_ERRNOS)
+        except (EOFError, dns.exception.DNSException) as exc:
+            # Connection closed in middle of response, garbled response
+            return ServerDsResult(Host=host, Address=address, Error=str(exc) or exc.__class__.__name__)
+        rtt = time.monotonic() - start
+
+        if resp.rcode() != dns.rcode.NOERROR:
+            return ServerDsResult(Host=host, Address=address, Rtt=rtt, Error=dns.rcode.to_text(resp.rcode()))
+
+        answers = resp.answer[0] if resp.answer else None
+        ds = DNS._ds_result(answers)
+        if ds is None:
+            ds = {}
+        else:
+            self.ds_ttls[zone] = answers.ttl
+
+        return ServerDsResult(Host=host, Address=address, Ds=ds, Rtt=rtt)
+
+    async def _get_ns(self, zone: str):
+        addresses = await self._get_addresses(await self._get_delegation(zone))
+
+        # Pick the fastest one
+        return self.server_stats.order(addresses)[0]
+
+    async def _get_delegation(self, zone: str):
+        # Zones sharing a parent walk the tree only once, even when looked up concurrently.
+        # The walk runs in a task of its own, this span is the time waiting for it.
+        with TRACER.span('delegation wait', 'dns', zone=zone) as span:
+            if zone not in self._ns_lookups:
+                self._ns_lookups[zone] = asyncio.ensure_future(self._walk_ns(zone))
+            else:
+                # Another zone with the same parent is walking the tree already
+                span.set(shared=True)
+            try:
+                return await asyncio.shield(self._ns_lookups[zone])
+            finally:
+                if zone in self._ns_lookups and self._ns_lookups[zone].done():
+                    del self._ns_lookups[zone]
+
+    async def _walk_ns(self, zone: str):
+        target = dns.name.from_text(zone)
+        delegation = self.delegations.get_authoritative(target)
+        with TRACER.span('delegation walk', 'dns', zone=zone) as span:
+            if delegation:
+                # Zone cut serving the name is known, no walk needed
+                span.set(cache='hit', closest=delegation.zone)
+                target = delegation.zone
+            else:
+                # Deepest zone cut known
+                delegation = self.delegations.get_closest(target)
+                span.set(cache='miss', closest=delegation.zone if delegation else None)
+                if not delegation:
+                    delegation = await self._get_root()
+
+            while delegation.zone != target:
+                query_rr = DelegationCache.make_ns_query(target)
+                with TRACER.span('delegation hop', 'dns', zone=delegation.zone, target=target):
+                    (response, _) = await self._query_hedged(query_rr, await self._get_addresses(delegation))
+                next_delegation = self.delegations.process_referral(delegation, target, response)
+                if next_delegation is delegation:
+                    break
+                delegation = next_delegation
+
+            await self._get_addresses(delegation)
+
+        return delegation
+
+    async def _get_root(self):
+        query_rr = DelegationCache.make_ns_query(dns.name.root)
+        (response, nameserver_to_use) = await self._query_hedged(query_rr, self.resolver.nameservers)
+        delegation = DelegationCache.delegation_from_response(response, dns.name.root)
+        if not delegation:
+            raise Exception('No root nameservers from %s' % nameserver_to_use)
+        self.delegations.put(delegation)
+
+        return delegation
+
+    async def _get_addresses(self, delegation: Delegation):
+        if not delegation.get_addresses():
+            # No glue for any of the nameservers, resolve them.
+            for host in delegation.get_unresolved_hosts():
+                try:
+                    with TRACER.span('resolve nameserver', 'dns', host=host, rdtype='A'):
+                        answer = await self.resolver.resolve(host, 'A')
+                except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.exception.Timeout):
+                    continue
+                delegation.set_addresses(host, [rr.to_text() for rr in answer.rrset], answer.rrset.ttl)
+            self.delegations.put(delegation)
+
+        addresses = delegation.get_addresses()
+        if not addresses:
+            raise Exception('No address for any of nameservers of %s' % delegation.zone)
+
+        return addresses
+
+    async def close(self):
+        await self.tcp_pool.close()
+
+    async def _query_hedged(self, query_request: dns.message.Message, addresses: list, tcp: bool = False):
+        """
+        Send a query to the fastest of given servers. If there is no answer by the hedging deadline,
+        send the same query to the next fastest server too. First answer wins.
+        :return: tuple (response, address of the server answering)
+        """
+        error = dns.exception.Timeout()
+        tasks = set()
+
+        def _answer(done: set):
+            nonlocal error
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+            return None
+
+        try:
+            for address in self.server_stats.order(addresses)[:self.MAX_TRIES]:
+                tasks.add(asyncio.ensure_future(self._timed_query(query_request, address, tcp)))
+                (done, tasks) = await asyncio.wait(tasks, timeout=self.server_stats.get_hedge_delay(),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                result = _answer(done)
+                if result:
+                    return result
+
+            # No more servers to try, wait for the ones still running
+            while tasks:
+                (done, tasks) = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                result = _answer(done)
+                if result:
+                    return result
+
+            raise error
+        finally:
+            # Queries still running lost, or the caller was cancelled. Don't leave them behind.
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _timed_query(self, query_request: dns.message.Message, address: str, tcp: bool = False,
+                           timeout: float = None):
+        """
+        Query a server, keeping track of its RTT.
+        Truncated UDP-responses are queried again over a pooled TCP-connection.
+        """
+        if timeout is None:
+            timeout = self.server_stats.get_timeout(address)
+        with TRACER.span('dns query', 'dns', server=address, question=query_request.question[0],
+                         timeout=timeout) as span:
+            async with self._server_limit(address):
+                start = time.monotonic()
+                try:
+                    if tcp:
+                        response = await self.tcp_pool.query(query_request, address, timeout)
+                        span.set(transport='tcp')
+                    else:
+                        response = await dns.asyncquery.udp(query_request, address, timeout=timeout)
+                        span.set(transport='udp')
+                        if DNS.needs_retry_without_edns(query_request, response):
+                            response = await dns.asyncquery.udp(DNS.without_edns(query_request), address,
+                                                                timeout=timeout)
+                            span.set(retry='no-edns')
+                        if response.flags & dns.flags.TC:
+                            response = await self.tcp_pool.query(query_request, address, timeout)
+                            span.set(retry='tcp')
+                except dns.exception.Timeout:
+                    self.server_stats.record_timeout(address)
+                    span.set(rcode='timeout')
+                    raise
+                except (OSError, EOFError, dns.exception.FormError):
+                    # Refused or reset TCP-connection, garbled response. Back off like on timeout.
+                    # _query_hedged() goes on with the next server.
+                    self.server_stats.record_timeout(address)
+                    span.set(rcode='error')
+                    raise
+                self.server_stats.record_rtt(address, time.monotonic() - start)
+            span.set(rcode=dns.rcode.to_text(response.rcode()))
+
+        return response, address
+
+    async def _resolve_all_addresses(self, delegation: Delegation):
+        # Both IPv4 and IPv6 of every nameserver, whichever the glue lacks
+        missing = delegation.get_missing_families()
+        if not missing:
+            return
+
+        async def _resolve(host: dns.name.Name, rr_type: str):
+            try:
+                with TRACER.span('resolve nameserver', 'dns', host=host, rdtype=rr_type):
+                    answer = await self.resolver.resolve(host, rr_type)
+            except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.exception.Timeout):
+                return [], None
+            return [rr.to_text() for rr in answer.rrset], answer.rrset.ttl
+
+        async def _resolve_host(host: dns.name.Name, rr_types: list):
+            results = await asyncio.gather(*[_resolve(host, rr_type) for rr_type in rr_types])
+            addresses = [address for (resolved, _) in results for address in resolved]
+            ttls = [ttl for (_, ttl) in results if ttl is not None]
+            if addresses:
+                delegation.set_addresses(host, delegation.nameservers[host] + addresses, min(ttls))
+
+        await asyncio.gather(*[_resolve_host(host, missing[host]) for host in missing])
+        self.delegations.put(delegation)
+
+    def _server_limit(self, server: str):
+        # Don't hammer a single server, parents of many zones are likely to be the same.
+        if server not in self._server_limits:
+            self._server_limits[server] = asyncio.Semaphore(self.max_per_server)
+
+        return self._server_limits[server]
@@ -0,0 +1,97 @@
+import dns.dnssec
+import dns.exception
+import dns.name
+import dns.rdtypes.dnskeybase
+
+
+class ChildKeys:
+    """
+    DNSKEY-, CDS- and CDNSKEY-records served by the authoritative nameservers of a zone.
+    DS-digests of the DNSKEYs are computed once, when the records are received. The rest is plain data,
+    picklable and JSON-serializable.
+    """
+    # SHA-1, SHA-256, SHA-384
+    DIGEST_TYPES = [1, 2, 4]
+
+    def __init__(self, Zone: str, Address: str = None, Dnskeys: dict = None, Cds: dict = None,
+                 Cdnskeys: dict = None, Error: str = None):
+        self.zone = Zone
+        # Child nameserver answering
+        self.address = Address
+        # KSK keytag -> {"flags": int, "algorithm": int, "digests": {digest type: hex}}
+        self.dnskeys = Dnskeys if Dnskeys is not None else {}
+        # keytag -> DS-information like in DNS.get_ds(). Algorithm 0 is a request to delete the DS, see RFC 8078.
+        self.cds = Cds if Cds is not None else {}
+        # keytag -> True, if the same key is served as DNSKEY
+        self.cdnskeys = Cdnskeys if Cdnskeys is not None else {}
+        self.error = Error
+
+    def get_keytags(self):
+        return set(self.dnskeys.keys())
+
+    def get_digest(self, keytag: int, digest_type: int):
+        """
+        :return: str, DS-digest in hex computed from the served DNSKEY, None if not served or type not supported
+        """
+        if keytag not in self.dnskeys:
+            return None
+
+        return self.dnskeys[keytag]["digests"].get(digest_type)
+
+    def to_json(self):
+        return {
+            "address": self.address,
+            "error": self.error,
+            "dnskey_tags": sorted(self.dnskeys.keys()),
+            "cds": [self.cds[keytag] for keytag in sorted(self.cds)],
+            "cdnskey_tags": sorted(self.cdnskeys.keys())
+        }
+
+    @staticmethod
+    def from_answers(zone: str, address: str, dnskeys, cds, cdnskeys):
+        """
+        :param dnskeys: DNSKEY RRset or None
+        :param cds: CDS RRset or None
+        :param cdnskeys: CDNSKEY RRset or None
+        :return: ChildKeys
+        """
+        name = dns.name.from_text(zone)
+        served = {}
+        for dnskey in dnskeys or []:
+            # Only keys with SEP-flag can have a DS at parent
+            if not dnskey.flags & dns.rdtypes.dnskeybase.Flag.SEP:
+                continue
+            digests = {}
+            for digest_type in ChildKeys.DIGEST_TYPES:
+                try:
+                    ds = dns.dnssec.make_ds(name, dnskey, digest_type, validating=True)
+                except (dns.exception.DNSException, ValueError):
+                    continue
+                digests[digest_type] = ds.digest.hex()
+            keytag = dns.dnssec.key_id(dnskey)
+            served[keytag] = {"flags": dnskey.flags, "algorithm": int(dnskey.algorithm), "digests": digests,
+                              "key": dnskey.key}
+
+        cdnskey_result = {}
+        for cdnskey in cdnskeys or []:
+            if cdnskey.algorithm == 0:
+                # Delete DS, see RFC 8078
+                continue
+            keytag = dns.dnssec.key_id(cdnskey)
+            cdnskey_result[keytag] = keytag in served and served[keytag]["key"] == cdnskey.key
+
+        cds_result = {}
+        for ds in cds or []:
+            cds_result[ds.key_tag] = {
+                "keytag": ds.key_tag,
+                "keyalgo": int(ds.algorithm),
+                "keylabels": int(ds.digest_type),
+                "key": ds.digest.hex()
+            }
+
+        for keytag in served:
+            # Key material is needed only for matching CDNSKEYs
+            del served[keytag]["key"]
+
+        return ChildKeys(Zone=zone, Address=address, Dnskeys=served, Cds=cds_result,
+                         Cdnskeys=cdnskey_result)
@@ -0,0 +1,224 @@
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdatatype
+import random
+import time
+from .disk_cache import DiskCache
+
+# EDNS buffer size avoiding IP fragmentation, as recommended by DNS Flag Day 2020.
+# Anything larger gets truncated and will be queried again over TCP.
+EDNS_PAYLOAD = 1232
+
+
+class Delegation:
+    """
+    Nameservers of a zone cut.
+    """
+
+    def __init__(self, Zone: dns.name.Name, Nameservers: dict, Expires: float):
+        self.zone = Zone
+        # NS host name -> list of addresses. Empty list, if address is not known (yet).
+        self.nameservers = Nameservers
+        self.expires = Expires
+
+    def is_expired(self, now: float = None):
+        if now is None:
+            now = time.time()
+
+        return self.expires <= now
+
+    def get_addresses(self, ipv6: bool = False):
+        addresses = []
+        for host in self.nameservers:
+            for address in self.nameservers[host]:
+                if ipv6 or ':' not in address:
+                    addresses.append(address)
+
+        return addresses
+
+    def get_unresolved_hosts(self):
+        return [host for host in self.nameservers if not self.nameservers[host]]
+
+    def get_missing_families(self):
+        """
+        Address families not known for the nameservers. Glue is often given for IPv4 or IPv6 only.
+        :return: dict, NS host name -> list of record types missing, 'A' and/or 'AAAA'
+        """
+        missing = {}
+        for host in self.nameservers:
+            has_ipv6 = [':' in address for address in self.nameservers[host]]
+            rr_types = []
+            if all(has_ipv6):
+                rr_types.append('A')
+            if not any(has_ipv6):
+                rr_types.append('AAAA')
+            if rr_types:
+                missing[host] = rr_types
+
+        return missing
+
+    def set_addresses(self, host: dns.name.Name, addresses: list, ttl: int):
+        self.nameservers[host] = addresses
+        self.expires = min(self.expires, time.time() + ttl)
+
+    def pick_address(self):
+        addresses = self.get_addresses()
+        if not addresses:
+            return None
+
+        # In DNS the answers are already randomized. We do the 2nd random regardless.
+        return random.choice(addresses)
+
+    def to_json(self):
+        return {host.to_text(): self.nameservers[host] for host in self.nameservers}
+
+    @staticmethod
+    def from_json(zone: dns.name.Name, nameservers: dict, expires: float):
+        return Delegation(Zone=zone,
+                          Nameservers={dns.name.from_text(host): nameservers[host] for host in nameservers},
+                          Expires=expires)
+
+
+class DelegationCache:
+    """
+    Zone cuts found while walking the DNS-tree from the root down.
+    Keyed by zone cut, honoring the TTLs of NS-records and glue.
+    Zones sharing a parent will walk the tree only once.
+    Names found not to be zone cuts are mapped to the zone cut serving them, they don't need a walk either.
+    Optionally backed by a DiskCache to share the zone cuts across invocations.
+    """
+
+    def __init__(self, Storage: DiskCache = None):
+        self._delegations = {}
+        # Name, which is not a zone cut -> name of the enclosing zone cut
+        self._enclosing = {}
+        self.storage = Storage
+
+    def get(self, zone: dns.name.Name):
+        if zone not in self._delegations:
+            if not self.storage:
+                return None
+            cached = self.storage.get('ns:%s' % zone.to_text())
+            if not cached:
+                return None
+            self._delegations[zone] = Delegation.from_json(zone, cached[0], cached[1])
+
+        delegation = self._delegations[zone]
+        if delegation.is_expired():
+            del self._delegations[zone]
+            return None
+
+        return delegation
+
+    def get_enclosing(self, name: dns.name.Name):
+        """
+        Get zone cut known to be authoritative for given name, which is not a zone cut of its own.
+        """
+        if name not in self._enclosing:
+            if not self.storage:
+                return None
+            cached = self.storage.get('nocut:%s' % name.to_text())
+            if not cached:
+                return None
+            self._enclosing[name] = dns.name.from_text(cached[0])
+
+        delegation = self.get(self._enclosing[name])
+        if not delegation:
+            # Expires with the enclosing zone cut
+            del self._enclosing[name]
+
+        return delegation
+
+    def get_authoritative(self, name: dns.name.Name):
+        """
+        Get zone cut serving given name, if it is known without walking the tree.
+        :return: Delegation of the name itself or of the enclosing zone cut, None if not known.
+        """
+        return self.get(name) or self.get_enclosing(name)
+
+    def get_closest(self, name: dns.name.Name):
+        """
+        Get deepest known zone cut enclosing given name.
+        """
+        while True:
+            delegation = self.get(name)
+            if delegation:
+                return delegation
+            if name == dns.name.root:
+                return None
+            name = name.parent()
+
+    def put(self, delegation: Delegation):
+        self._delegations[delegation.zone] = delegation
+        if self.storage:
+            self.storage.put('ns:%s' % delegation.zone.to_text(), delegation.to_json(),
+                             delegation.expires - time.time())
+
+    def put_enclosing(self, name: dns.name.Name, delegation: Delegation):
+        self._enclosing[name] = delegation.zone
+        if self.storage:
+            self.storage.put('nocut:%s' % name.to_text(), delegation.zone.to_text(),
+                             delegation.expires - time.time())
+
+    def __len__(self):
+        return len(self._delegations)
+
+    @staticmethod
+    def make_ns_query(zone: dns.name.Name):
+        return dns.message.make_query(zone, dns.rdatatype.NS, use_edns=0, payload=EDNS_PAYLOAD)
+
+    @staticmethod
+    def delegation_from_response(response: dns.message.Message, zone: dns.name.Name = None):
+        """
+        Pick up NS-records for a zone cut either from answer or authority section.
+        Glue from additional section is used for addresses.
+        :return: Delegation or None, if response doesn't have any NS-records
+        """
+        ns_rrset = None
+        for rrset in response.answer + response.authority:
+            if rrset.rdtype != dns.rdatatype.NS:
+                continue
+            if zone is not None and rrset.name != zone:
+                continue
+            ns_rrset = rrset
+            break
+        if not ns_rrset:
+            return None
+
+        ttl = ns_rrset.ttl
+        nameservers = {}
+        for rr in ns_rrset:
+            nameservers[rr.target] = []
+        for rrset in response.additional:
+            if rrset.name not in nameservers or rrset.rdtype not in (dns.rdatatype.A, dns.rdatatype.AAAA):
+                continue
+            nameservers[rrset.name].extend([rr.to_text() for rr in rrset])
+            ttl = min(ttl, rrset.ttl)
+
+        return Delegation(Zone=ns_rrset.name, Nameservers=nameservers, Expires=time.time() + ttl)
+
+    def process_referral(self, current: Delegation, zone: dns.name.Name, response: dns.message.Message):
+        """
+        Interpret a NS-query response received from a nameserver of current delegation.
+        :return: Delegation to continue the walk with. Same as current, if the walk is done.
+        """
+        rcode = response.rcode()
+        if rcode != dns.rcode.NOERROR:
+            if rcode == dns.rcode.NXDOMAIN:
+                raise Exception('%s does not exist.' % zone)
+            else:
+                raise Exception('Error %s' % dns.rcode.to_text(rcode))
+
+        delegation = self.delegation_from_response(response)
+        if not delegation or not delegation.zone.is_subdomain(current.zone) or delegation.zone == current.zone:
+            # Same server is authoritative for the zone
+            if zone != current.zone:
+                self.put_enclosing(zone, current)
+            return current
+        if not zone.is_subdomain(delegation.zone):
+            raise Exception('Bogus referral to %s while looking for %s' % (delegation.zone, zone))
+
+        self.put(delegation)
+
+        return delegation
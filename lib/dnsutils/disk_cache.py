@@ -0,0 +1,129 @@
+import json
+import sqlite3
+import time
+
+
+class DiskCache:
+    """
+    Persistent TTL-aware cache for DNS-data, shared across invocations.
+    Stored into a SQLite-file. Least recently used entries are dropped when the cache grows too big.
+    """
+    DEFAULT_MAX_ENTRIES = 100000
+    # Drop stale and least recently used entries every this many writes, not only at close.
+    # A long-running --serve might never close the cache.
+    PRUNE_INTERVAL = 1000
+    # Serve-stale: RFC 8767 suggests 30 seconds as TTL for stale data
+    STALE_TTL = 30
+    # Access time of an entry is updated on a hit only if older than this many seconds.
+    # LRU doesn't need it exact, and a read shouldn't cost a write every time.
+    ACCESS_RESOLUTION = 600
+
+    def __init__(self, Filename: str, MaxStale: int = 0, MaxEntries: int = DEFAULT_MAX_ENTRIES,
+                 Refresh: bool = False, Prune: bool = True):
+        """
+        :param Prune: drop stale and least recently used entries. Off for worker processes sharing the file,
+                      the main process does it.
+        """
+        self.max_stale = MaxStale
+        self.max_entries = MaxEntries
+        # On refresh, nothing is read from the cache. Fresh data will be stored.
+        self.refresh = Refresh
+        self.hits = 0
+        self.misses = 0
+        self.prune_interval = DiskCache.PRUNE_INTERVAL if Prune else 0
+        self._writes = 0
+
+        # Autocommit: every write is committed right away and no lock is held between writes.
+        # Other processes sharing the file, eg. workers or a cron-run, see the writes immediately.
+        self.db = sqlite3.connect(Filename, timeout=10.0, isolation_level=None)
+        # Readers and a writer don't block each other
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # With WAL, no fsync on every commit. A crash may lose the latest writes, but not corrupt the cache.
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS dns_cache ("
+                        "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS dns_cache_accessed ON dns_cache (accessed)")
+
+    def get(self, key: str):
+        """
+        Get cached value.
+        :param key: cache key
+        :return: tuple (value, expires) or None if not found or too stale.
+                 For stale entries expires is in the near future, see STALE_TTL.
+        """
+        if self.refresh:
+            self.misses += 1
+            return None
+
+        now = time.time()
+        try:
+            row = self.db.execute("SELECT value, expires, accessed FROM dns_cache WHERE key = ?",
+                                  (key,)).fetchone()
+            if row and row[1] + self.max_stale > now and row[2] < now - DiskCache.ACCESS_RESOLUTION:
+                self.db.execute("UPDATE dns_cache SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.OperationalError:
+            # Eg. locked by another process for too long. A cache failure is a miss, not a failed zone.
+            row = None
+        if not row or row[1] + self.max_stale <= now:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        value = json.loads(row[0])
+        expires = row[1]
+        if expires <= now:
+            expires = now + DiskCache.STALE_TTL
+
+        return value, expires
+
+    def put(self, key: str, value, ttl: float):
+        if ttl <= 0:
+            return
+
+        now = time.time()
+        try:
+            self.db.execute("INSERT OR REPLACE INTO dns_cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                            (key, json.dumps(value), now + ttl, now))
+            self._writes += 1
+            if self.prune_interval and self._writes % self.prune_interval == 0:
+                self.prune()
+        except sqlite3.OperationalError:
+            # Not cached this time
+            if self.db.in_transaction:
+                self.db.execute("ROLLBACK")
+
+    def get_ds(self, zone: str):
+        """
+        Get cached DS-result as returned by DNS.get_ds()
+        """
+        cached = self.get('ds:%s' % zone)
+        if not cached:
+            return None
+
+        (ns, ds_json) = cached[0]
+        # JSON has only string keys, keytags are integers
+        ds = {int(keytag): ds_json[keytag] for keytag in ds_json}
+
+        return ns, ds
+
+    def put_ds(self, zone: str, ns: str, ds: dict, ttl: int):
+        self.put('ds:%s' % zone, [ns, ds], ttl)
+
+    def prune(self):
+        # Drop entries too stale to be served, then
+        # LRU: Keep only most recently used entries
+        self.db.execute("BEGIN IMMEDIATE")
+        self.db.execute("DELETE FROM dns_cache WHERE expires + ? <= ?", (self.max_stale, time.time()))
+        self.db.execute("DELETE FROM dns_cache WHERE key NOT IN "
+                        "(SELECT key FROM dns_cache ORDER BY accessed DESC LIMIT ?)", (self.max_entries,))
+        self.db.execute("COMMIT")
+
+    def close(self):
+        if self.prune_interval:
+            try:
+                self.prune()
+            except sqlite3.OperationalError:
+                # Busy, eg. another process writing. Pruned next time.
+                if self.db.in_transaction:
+                    self.db.execute("ROLLBACK")
+        self.db.close()
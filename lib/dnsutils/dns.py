@@ -1,39 +1,107 @@
+import dns.query
 import dns.resolver
 import random
-import tldextract
-import re
+import time
+from .delegation import Delegation, DelegationCache, EDNS_PAYLOAD
+from .disk_cache import DiskCache
+from .server_stats import ServerStats
+from ..traceutils import TRACER
+
+
+class DsQueryError(Exception):
+    """
+    None of parent nameservers answered a DS-query.
+    """
+
+    def __init__(self, zone: str, parent: str, error: Exception):
+        super().__init__("No answer to DS-query of %s from nameservers of %s: %s" % (
+            zone, parent, str(error) or error.__class__.__name__))
+        self.zone = zone
+        self.error = error
 
 
 class DNS:
     DEFAULT_DNS_TIMEOUT = 5.0
+    # Number of servers to try, if query times out
+    MAX_TRIES = 3
 
-    def __init__(self):
+    def __init__(self, Delegations: DelegationCache = None, Cache: DiskCache = None, Stats: ServerStats = None,
+                 Tcp: bool = False):
         self.resolver = dns.resolver.Resolver()
+        if Delegations is None:
+            Delegations = DelegationCache(Storage=Cache)
+        self.delegations = Delegations
+        self.cache = Cache
+        if Stats is None:
+            Stats = ServerStats(Timeout=DNS.DEFAULT_DNS_TIMEOUT)
+        self.server_stats = Stats
+        # Query DS-records over TCP right away, don't wait for a truncated UDP-response
+        self.tcp = Tcp
 
     def get_ds(self, zone: str):
-        # Note:
-        # Some top-level-domains have dots in them. Example: co.uk
-        # First figure out what CAN be stripped. Then go for parent.
-        initial_tld_info = tldextract.extract(zone)
-        stripped_zone = re.sub(r'\.%s$' % initial_tld_info.suffix, '', zone)
-        if '.' in stripped_zone:
-            # Remove the subdomain and go for the parent domain
-            zone_to_query = '.'.join(zone.split('.')[1:])
-        else:
-            # Nothing left to strip. Use the TLD
-            zone_to_query = initial_tld_info.suffix
-
-        ns = self._get_ns(zone_to_query)
-        answers = self._udp_query(zone, 'DS', ns)
-        # Need to make the DNS-query directly to the parent.
-        # Our local server is likely to host the same zone, but won't have the DS-record in it.
-        #else:
-        #    ns = None
-        #    print("DEBUG: Query DS for %s" % zone)
-        #    answer = self._standard_query(zone, 'DS')
+        """
+        Query DS-records of a zone from its parent. No answer is not the same as no DS-records:
+        if none of parent's nameservers answers, DsQueryError is raised.
+        :return: tuple (address of parent nameserver answering, DS-records or None if there are none)
+        """
+        with TRACER.span('get ds', 'dns', zone=zone) as span:
+            if self.cache:
+                cached = self.cache.get_ds(zone)
+                span.set(cache='hit' if cached else 'miss')
+                if cached:
+                    return cached
+
+            zone_to_query = self.get_parent_zone(zone)
+            addresses = self._get_addresses(self._get_delegation(zone_to_query))
+            # Need to make the DNS-query directly to the parent.
+            # Our local server is likely to host the same zone, but won't have the DS-record in it.
+            query_request = self.make_query(zone, dns.rdatatype.DS)
+            try:
+                (response, ns) = self._query(query_request, addresses, self.tcp)
+            except (dns.exception.DNSException, OSError, EOFError) as exc:
+                raise DsQueryError(zone, zone_to_query, exc) from exc
+            if response.rcode() not in (dns.rcode.NOERROR, dns.rcode.NXDOMAIN):
+                # SERVFAIL or REFUSED doesn't tell whether there are DS-records
+                error = Exception('%s from %s' % (dns.rcode.to_text(response.rcode()), ns))
+                raise DsQueryError(zone, zone_to_query, error)
+            answers = response.answer[0] if response.answer else None
+
+            ds = self._ds_result(answers)
+            if self.cache and ds:
+                self.cache.put_ds(zone, ns, ds, answers.ttl)
+
+            return ns, ds
 
+    @staticmethod
+    def get_parent_zone(zone: str):
+        """
+        Name one label up: co.uk for example.co.uk, example.com for sub.example.com, root for a TLD.
+        Whether the name is a zone of its own doesn't matter. The delegation walk heading there
+        stops at the deepest zone cut the parent's nameservers refer to, see _get_delegation().
+        """
+        labels = zone.rstrip('.').split('.', 1)
+        if len(labels) < 2:
+            return '.'
+
+        return labels[1]
+
+    @staticmethod
+    def make_query(name, rdtype: dns.rdatatype.RdataType):
+        return dns.message.make_query(name, rdtype, use_edns=0, payload=EDNS_PAYLOAD)
+
+    @staticmethod
+    def without_edns(query_request: dns.message.Message):
+        # For servers responding FORMERR to EDNS
+        return dns.message.make_query(query_request.question[0].name, query_request.question[0].rdtype)
+
+    @staticmethod
+    def needs_retry_without_edns(query_request: dns.message.Message, response: dns.message.Message):
+        return query_request.edns >= 0 and response.rcode() == dns.rcode.FORMERR
+
+    @staticmethod
+    def _ds_result(answers):
         if not answers:
-            return (ns, None)
+            return None
 
         ret = {}
         for answer in answers:
@@ -48,56 +116,125 @@ class DNS:
                 "key": answer.digest.hex()
             }
 
-        return ns, ret
+        return ret
 
     def _get_ns(self, zone: str):
-        verbose = False
-        initial_query_rr = dns.message.make_query(zone, dns.rdatatype.NS)
-        depth = len(initial_query_rr.question[0].name)
-        nameserver_to_use = random.choice(self.resolver.nameservers)
-        query_rr = initial_query_rr
+        return self._get_address(self._get_delegation(zone))
 
-        last = False
-        while not last:
-            query = query_rr.question[0].name
-            s = query.split(depth)
+    def _get_delegation(self, zone: str):
+        with TRACER.span('delegation', 'dns', zone=zone) as span:
+            return self._walk_ns(zone, span)
 
-            last = s[0].to_unicode() == u'@'
-            sub = s[1]
+    def _walk_ns(self, zone: str, span):
+        verbose = False
+        target = dns.name.from_text(zone)
+        delegation = self.delegations.get_authoritative(target)
+        if delegation:
+            # Zone cut serving the name is known, no walk needed
+            span.set(cache='hit', closest=delegation.zone)
+            return delegation
+        # Deepest zone cut known
+        delegation = self.delegations.get_closest(target)
+        span.set(cache='miss', closest=delegation.zone if delegation else None)
+        if not delegation:
+            delegation = self._get_root()
 
+        # Walk down from the deepest known zone cut. Every zone cut found is cached.
+        while delegation.zone != target:
+            query_rr = DelegationCache.make_ns_query(target)
+            with TRACER.span('delegation hop', 'dns', zone=delegation.zone, target=target):
+                (response, nameserver_to_use) = self._query(query_rr, self._get_addresses(delegation))
+            if verbose:
+                print('_get_ns() Looked up %s on %s' % (target, nameserver_to_use))
+            next_delegation = self.delegations.process_referral(delegation, target, response)
+            if next_delegation is delegation:
+                if verbose:
+                    print('_get_ns() Same server is authoritative for %s' % target)
+                break
+            delegation = next_delegation
             if verbose:
-                print('_get_ns() Looking up %s on %s' % (sub, nameserver_to_use))
-            query_rr = dns.message.make_query(sub, dns.rdatatype.NS)
-            response = dns.query.udp(query_rr, nameserver_to_use)
-
-            rcode = response.rcode()
-            if rcode != dns.rcode.NOERROR:
-                if rcode == dns.rcode.NXDOMAIN:
-                    raise Exception('%s does not exist.' % sub)
-                else:
-                    raise Exception('Error %s' % dns.rcode.to_text(rcode))
-
-            rrset = None
-            if len(response.authority) > 0:
-                rrset = response.authority[0]
-            else:
-                rrset = response.answer[0]
-
-            for rr in rrset:
-                if rr.rdtype == dns.rdatatype.SOA:
-                    if verbose:
-                        print('_get_ns() Same server is authoritative for %s' % sub)
-                else:
-                    authority = rr.target
-                    if verbose:
-                        print('_get_ns() %s is authoritative for %s' % (authority, sub))
-
-            # Pick a random nameserver and continue with that one
-            # In DNS the answers are already randomized. We do the 2nd random regardless.
-            nameserver_to_use = random.choice(self.resolver.query(authority).rrset).to_text()
-            depth += 1
-
-        return nameserver_to_use
+                print('_get_ns() %s is authoritative for %s' % (', '.join(
+                    [str(host) for host in delegation.nameservers]), delegation.zone))
+
+        return delegation
+
+    def _get_root(self):
+        query_rr = DelegationCache.make_ns_query(dns.name.root)
+        (response, nameserver_to_use) = self._query(query_rr, self.resolver.nameservers)
+        delegation = DelegationCache.delegation_from_response(response, dns.name.root)
+        if not delegation:
+            raise Exception('No root nameservers from %s' % nameserver_to_use)
+        self.delegations.put(delegation)
+
+        return delegation
+
+    def _get_address(self, delegation: Delegation):
+        # Pick the fastest one
+        return self.server_stats.order(self._get_addresses(delegation))[0]
+
+    def _get_addresses(self, delegation: Delegation):
+        addresses = delegation.get_addresses()
+        if addresses:
+            return addresses
+
+        # No glue for any of the nameservers, resolve them.
+        for host in delegation.get_unresolved_hosts():
+            try:
+                with TRACER.span('resolve nameserver', 'dns', host=host, rdtype='A'):
+                    answer = self.resolver.resolve(host, 'A')
+            except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.exception.Timeout):
+                continue
+            delegation.set_addresses(host, [rr.to_text() for rr in answer.rrset], answer.rrset.ttl)
+        self.delegations.put(delegation)
+
+        addresses = delegation.get_addresses()
+        if not addresses:
+            raise Exception('No address for any of nameservers of %s' % delegation.zone)
+
+        return addresses
+
+    def _query(self, query_request: dns.message.Message, addresses: list, tcp: bool = False):
+        """
+        Send a query to the fastest of given servers. On timeout or error, try the next fastest one.
+        Truncated UDP-responses are queried again over TCP.
+        :return: tuple (response, address of the server answering)
+        """
+        error = dns.exception.Timeout()
+        for (attempt, address) in enumerate(self.server_stats.order(addresses)[:DNS.MAX_TRIES]):
+            timeout = self.server_stats.get_timeout(address)
+            start = time.monotonic()
+            with TRACER.span('dns query', 'dns', server=address, question=query_request.question[0],
+                             attempt=attempt, timeout=timeout) as span:
+                try:
+                    if tcp:
+                        response = dns.query.tcp(query_request, address, timeout=timeout)
+                        span.set(transport='tcp')
+                    else:
+                        response = dns.query.udp(query_request, address, timeout=timeout)
+                        span.set(transport='udp')
+                        if self.needs_retry_without_edns(query_request, response):
+                            response = dns.query.udp(self.without_edns(query_request), address, timeout=timeout)
+                            span.set(retry='no-edns')
+                        if response.flags & dns.flags.TC:
+                            response = dns.query.tcp(query_request, address, timeout=timeout)
+                            span.set(retry='tcp')
+                except dns.exception.Timeout as exc:
+                    self.server_stats.record_timeout(address)
+                    span.set(rcode='timeout')
+                    error = exc
+                    continue
+                except (OSError, EOFError, dns.exception.FormError) as exc:
+                    # Refused or reset TCP-connection, garbled response. Back off like on timeout.
+                    self.server_stats.record_timeout(address)
+                    span.set(rcode='error')
+                    error = exc
+                    continue
+                span.set(rcode=dns.rcode.to_text(response.rcode()))
+            self.server_stats.record_rtt(address, time.monotonic() - start)
+
+            return response, address
+
+        raise error
 
     def _standard_query(self, name: str, rr_type: str):
         verbose = False
@@ -0,0 +1,87 @@
+class ServerDsResult:
+    """
+    DS-records of a zone as seen by one parent nameserver.
+    """
+
+    def __init__(self, Host: str, Address: str, Ds: dict = None, Rtt: float = None, Error: str = None,
+                 Unreachable: bool = False):
+        self.host = Host
+        # None, if no address was found for the host. Such a server counts as failed.
+        self.address = Address
+        # keytag -> DS-information, see DNS.get_ds(). Empty, if server has no DS-records for the zone.
+        self.ds = Ds
+        # Round-trip time in seconds
+        self.rtt = Rtt
+        self.error = Error
+        # Server address not usable from here, eg. IPv6 without IPv6-connectivity
+        self.unreachable = Unreachable
+
+    def get_keytags(self):
+        if self.ds is None:
+            return None
+
+        return set(self.ds.keys())
+
+    def to_json(self):
+        return {
+            "host": self.host,
+            "address": self.address,
+            "keytags": sorted(self.get_keytags()) if self.ds is not None else None,
+            "rtt": self.rtt,
+            "error": self.error,
+            "unreachable": self.unreachable
+        }
+
+
+class PropagationReport:
+    """
+    DS-records of a zone from all nameservers of the parent zone.
+    """
+
+    def __init__(self, Zone: str, Parent: str, Servers: list):
+        self.zone = Zone
+        self.parent = Parent
+        self.servers = Servers
+
+    def get_answered(self):
+        return [server for server in self.servers if server.ds is not None]
+
+    def get_failed(self):
+        return [server for server in self.servers if server.ds is None and not server.unreachable]
+
+    def is_consistent(self):
+        """
+        All reachable parent servers answered with the same set of DS keytags.
+        """
+        answered = self.get_answered()
+        if not answered or self.get_failed():
+            return False
+
+        keytags = answered[0].get_keytags()
+        for server in answered[1:]:
+            if server.get_keytags() != keytags:
+                return False
+
+        return True
+
+    def get_ds(self):
+        """
+        DS-records in a form of DNS.get_ds() result.
+        Union of all answers, if servers disagree.
+        :return: dict or None, if no DS-records found
+        """
+        ret = {}
+        for server in self.get_answered():
+            ret.update(server.ds)
+
+        if not ret:
+            return None
+
+        return ret
+
+    def to_json(self):
+        return {
+            "parent": self.parent,
+            "consistent": self.is_consistent(),
+            "servers": [server.to_json() for server in self.servers]
+        }
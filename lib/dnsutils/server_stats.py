@@ -0,0 +1,90 @@
+import random
+from collections import deque
+
+
+class ServerStats:
+    """
+    Smoothed round-trip times of nameservers, like recursive resolvers keep.
+    Fast servers are preferred. Servers not chosen get their SRTT decayed, so a server once
+    slow will be tried again eventually. Also a random server is probed every now and then.
+    """
+    # RFC 6298 smoothing factors
+    SRTT_ALPHA = 0.125
+    RTTVAR_BETA = 0.25
+    # Unknown servers get a small random SRTT, to have them tried early and in random order
+    INITIAL_SRTT_MAX = 0.032
+    # Decay of SRTT of a server not chosen
+    DECAY = 0.98
+    PROBE_PROBABILITY = 0.05
+    # Recent RTTs of all servers, for hedging deadline
+    RTT_SAMPLES = 256
+    DEFAULT_HEDGE_PERCENTILE = 0.9
+    MIN_HEDGE_DELAY = 0.05
+
+    def __init__(self, Timeout: float):
+        self.timeout = Timeout
+        self._srtt = {}
+        self._rttvar = {}
+        self._samples = deque(maxlen=ServerStats.RTT_SAMPLES)
+
+    def get_srtt(self, address: str):
+        if address not in self._srtt:
+            self._srtt[address] = random.uniform(0, ServerStats.INITIAL_SRTT_MAX)
+
+        return self._srtt[address]
+
+    def record_rtt(self, address: str, rtt: float):
+        if address not in self._rttvar:
+            self._srtt[address] = rtt
+            self._rttvar[address] = rtt / 2
+        else:
+            srtt = self._srtt[address]
+            self._rttvar[address] = (1 - ServerStats.RTTVAR_BETA) * self._rttvar[address] + \
+                ServerStats.RTTVAR_BETA * abs(srtt - rtt)
+            self._srtt[address] = (1 - ServerStats.SRTT_ALPHA) * srtt + ServerStats.SRTT_ALPHA * rtt
+        self._samples.append(rtt)
+
+    def record_timeout(self, address: str):
+        # Back off: Treat as if the server answered after full timeout, at least doubling the SRTT
+        srtt = max(self.get_srtt(address) * 2, self.timeout)
+        self._srtt[address] = min(srtt, self.timeout * 4)
+        self._rttvar.setdefault(address, self.timeout / 2)
+
+    def order(self, addresses: list):
+        """
+        Order addresses, best first.
+        """
+        ordered = sorted(addresses, key=self.get_srtt)
+        if len(ordered) > 1 and random.random() < ServerStats.PROBE_PROBABILITY:
+            # Probe one of the others
+            probe = ordered.pop(random.randrange(1, len(ordered)))
+            ordered.insert(0, probe)
+
+        # Decay the ones not chosen
+        for address in ordered[1:]:
+            self._srtt[address] = self.get_srtt(address) * ServerStats.DECAY
+
+        return ordered
+
+    def get_timeout(self, address: str):
+        """
+        Retransmission timeout for a server, RFC 6298: SRTT + 4 * RTTVAR
+        """
+        if address not in self._rttvar:
+            return self.timeout
+
+        rto = self._srtt[address] + 4 * self._rttvar[address]
+
+        return min(max(rto, ServerStats.MIN_HEDGE_DELAY * 4), self.timeout)
+
+    def get_hedge_delay(self, percentile: float = DEFAULT_HEDGE_PERCENTILE):
+        """
+        How long to wait for an answer before sending the same query to another server.
+        """
+        if not self._samples:
+            return self.timeout / 2
+
+        samples = sorted(self._samples)
+        delay = samples[min(int(len(samples) * percentile), len(samples) - 1)]
+
+        return min(max(delay, ServerStats.MIN_HEDGE_DELAY), self.timeout / 2)
@@ -0,0 +1,174 @@
+import asyncio
+import dns.exception
+import dns.message
+import random
+import struct
+
+
+class TcpConnection:
+    """
+    Persistent DNS over TCP connection to a single server.
+    Queries are pipelined as in RFC 7766: many queries can be outstanding at once,
+    responses are matched to queries by query id, in whatever order they arrive.
+    """
+
+    def __init__(self, Address: str, Port: int = 53):
+        self.address = Address
+        self.port = Port
+        self.queries_sent = 0
+        self.in_flight = 0
+        self.closed = False
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._connect_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        # query id -> future of response
+        self._pending = {}
+
+    def get_in_flight(self):
+        return self.in_flight
+
+    async def query(self, query_request: dns.message.Message, timeout: float):
+        """
+        Send a query and wait for its response.
+        :return: dns.message.Message
+        """
+        self.in_flight += 1
+        query_id = None
+        try:
+            await self._connect(timeout)
+
+            query_id = self._next_id()
+            # Query message may be shared with other servers, don't touch it. Use our own id on the wire.
+            wire = struct.pack('!H', query_id) + query_request.to_wire()[2:]
+            response = asyncio.get_running_loop().create_future()
+            self._pending[query_id] = response
+            self.queries_sent += 1
+            async with self._write_lock:
+                self._writer.write(struct.pack('!H', len(wire)) + wire)
+                await self._writer.drain()
+            return await asyncio.wait_for(asyncio.shield(response), timeout)
+        except asyncio.TimeoutError:
+            raise dns.exception.Timeout(timeout=timeout)
+        finally:
+            self.in_flight -= 1
+            self._pending.pop(query_id, None)
+
+    async def close(self):
+        self.closed = True
+        if self._reader_task:
+            self._reader_task.cancel()
+        if self._writer:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+        self._fail_pending(ConnectionResetError('Connection to %s closed' % self.address))
+
+    async def _connect(self, timeout: float):
+        async with self._connect_lock:
+            if self.closed:
+                raise ConnectionResetError('Connection to %s closed' % self.address)
+            if self._writer:
+                return
+
+            try:
+                (self._reader, self._writer) = await asyncio.wait_for(
+                    asyncio.open_connection(self.address, self.port), timeout)
+            except asyncio.TimeoutError:
+                self.closed = True
+                raise dns.exception.Timeout(timeout=timeout)
+            except OSError:
+                self.closed = True
+                raise
+            self._reader_task = asyncio.ensure_future(self._read_responses())
+
+    def _next_id(self):
+        while True:
+            query_id = random.randrange(0, 65536)
+            if query_id not in self._pending:
+                return query_id
+
+    async def _read_responses(self):
+        try:
+            while True:
+                (length,) = struct.unpack('!H', await self._reader.readexactly(2))
+                wire = await self._reader.readexactly(length)
+                (query_id,) = struct.unpack('!H', wire[:2])
+                response = self._pending.get(query_id)
+                if not response or response.done():
+                    # Answer to a query timed out already
+                    continue
+                try:
+                    response.set_result(dns.message.from_wire(wire))
+                except dns.exception.DNSException as exc:
+                    response.set_exception(exc)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # Server closed the connection, eg. idle timeout
+            pass
+        self.closed = True
+        self._fail_pending(ConnectionResetError('Connection to %s closed by server' % self.address))
+
+    def _fail_pending(self, exc: Exception):
+        for response in self._pending.values():
+            if not response.done():
+                response.set_exception(exc)
+
+
+class TcpConnectionPool:
+    """
+    A small pool of persistent TCP connections per DNS server.
+    Zones sharing a parent will have their queries pipelined over the same connections
+    instead of opening a new one for every query.
+    """
+    DEFAULT_MAX_CONNECTIONS = 2
+    # Open another connection, if existing ones have this many queries outstanding
+    DEFAULT_MAX_PIPELINED = 16
+
+    def __init__(self, MaxConnections: int = DEFAULT_MAX_CONNECTIONS, MaxPipelined: int = DEFAULT_MAX_PIPELINED,
+                 Port: int = 53):
+        self.max_connections = MaxConnections
+        self.max_pipelined = MaxPipelined
+        self.port = Port
+        # address -> list of TcpConnection
+        self._connections = {}
+
+    async def query(self, query_request: dns.message.Message, address: str, timeout: float):
+        """
+        Send a query over one of pooled connections to given server.
+        :return: dns.message.Message
+        """
+        connection = self._get_connection(address)
+        reused = connection.queries_sent > 0
+        try:
+            return await connection.query(query_request, timeout)
+        except ConnectionError:
+            if not reused:
+                raise
+        # Server closed an idle connection. Try once more with a fresh one.
+        return await self._get_connection(address).query(query_request, timeout)
+
+    def get_connection_count(self):
+        return sum([len(connections) for connections in self._connections.values()])
+
+    async def close(self):
+        connections = [connection for connections in self._connections.values() for connection in connections]
+        self._connections = {}
+        await asyncio.gather(*[connection.close() for connection in connections])
+
+    def _get_connection(self, address: str):
+        connections = [connection for connection in self._connections.get(address, []) if not connection.closed]
+        self._connections[address] = connections
+
+        # Least busy one
+        connection = min(connections, key=TcpConnection.get_in_flight, default=None)
+        if connection and (connection.get_in_flight() < self.max_pipelined or
+                           len(connections) >= self.max_connections):
+            return connection
+
+        connection = TcpConnection(Address=address, Port=self.port)
+        connections.append(connection)
+
+        return connection
@@ -1,2 +1,7 @@
 from .opendnssec_cmd import *
-from .key import *
\ No newline at end of file
+from .key import *
+from .key_store import *
+from .zone_scheduler import *
+from .zone_inventory import *
+from .zone_shard import *
+from .action_queue import *
@@ -0,0 +1,141 @@
+# vim: autoindent tabstop=4 shiftwidth=4 expandtab softtabstop=4 filetype=python
+
+from .opendnssec_cmd import ODS
+from ..traceutils import TRACER
+
+
+class EnforcerAction:
+    """
+    A ds-seen or ds-gone to run for a key of a zone, and how it went.
+    """
+    DS_SEEN = 'ds-seen'
+    DS_GONE = 'ds-gone'
+    COMMANDS = [DS_SEEN, DS_GONE]
+
+    # Not run yet
+    STATUS_QUEUED = 'queued'
+    # Not run, --dry-run
+    STATUS_DRY_RUN = 'dry-run'
+    # Run, not verified yet
+    STATUS_RUN = 'run'
+    # Run, enforcer state changed as expected
+    STATUS_APPLIED = 'applied'
+    # Run, but enforcer state didn't change
+    STATUS_NOT_EFFECTIVE = 'not-effective'
+    # Running the command failed
+    STATUS_FAILED = 'failed'
+
+    def __init__(self, Zone: str, Command: str, Keytag: int):
+        if Command not in EnforcerAction.COMMANDS:
+            raise ValueError("Need a command of %s! Got '%s'" % (', '.join(EnforcerAction.COMMANDS), Command))
+
+        self.zone = Zone
+        self.command = Command
+        self.keytag = Keytag
+        self.status = EnforcerAction.STATUS_QUEUED
+        # Output of the enforcer
+        self.output = None
+
+    def get_cmd_args(self):
+        return ['key %s' % self.command, '--zone', self.zone, '--keytag', str(self.keytag)]
+
+    def get_command_line(self):
+        return "ods-enforcer %s" % ' '.join(self.get_cmd_args())
+
+    def to_json(self):
+        return {
+            "command": self.command,
+            "keytag": self.keytag,
+            "command_line": self.get_command_line(),
+            "status": self.status,
+            "output": self.output
+        }
+
+
+class ActionQueue:
+    """
+    Enforcer actions collected from many zones, run in one go.
+    With the enforcer socket, commands are pipelined over a single connection, max_concurrent at a time.
+    With ods-enforcer, at most max_concurrent processes run at a time.
+    """
+    DEFAULT_MAX_CONCURRENT = 4
+    # Enforcer changes key states asynchronously. Check this many times, waiting a bit longer each time,
+    # before calling an action not effective.
+    VERIFY_TRIES = 4
+    VERIFY_DELAY = 1.0
+
+    def __init__(self, MaxConcurrent: int = DEFAULT_MAX_CONCURRENT, DryRun: bool = False):
+        self.max_concurrent = MaxConcurrent
+        self.dry_run = DryRun
+        self.actions = []
+
+    def __len__(self):
+        return len(self.actions)
+
+    def add(self, zone: str, command: str, keytag: int):
+        """
+        :return: EnforcerAction queued
+        """
+        action = EnforcerAction(Zone=zone, Command=command, Keytag=keytag)
+        self.actions.append(action)
+
+        return action
+
+    def get_zones(self):
+        """
+        :return: list of names of the zones having actions, in order of the queue
+        """
+        zones = []
+        for action in self.actions:
+            if action.zone not in zones:
+                zones.append(action.zone)
+
+        return zones
+
+    def get_zone_actions(self, zone: str):
+        return [action for action in self.actions if action.zone == zone]
+
+    def get_unverified(self):
+        """
+        :return: list of actions run, but not verified yet
+        """
+        return [action for action in self.actions if action.status == EnforcerAction.STATUS_RUN]
+
+    def run(self):
+        """
+        Run all queued actions. With dry-run, only mark them.
+        Whether an action had the desired effect is up to the caller to verify, see set_verified().
+        """
+        queued = [action for action in self.actions if action.status == EnforcerAction.STATUS_QUEUED]
+        if self.dry_run:
+            for action in queued:
+                action.status = EnforcerAction.STATUS_DRY_RUN
+            return
+
+        cmds = [action.get_cmd_args() for action in queued]
+        with TRACER.span('enforcer apply', 'enforcer', count=len(cmds), max_concurrent=self.max_concurrent,
+                         backend=type(ODS.backend).__name__):
+            try:
+                outputs = ODS.backend.run_many_checked(cmds, self.max_concurrent)
+            except OSError as exc:
+                for action in queued:
+                    action.status = EnforcerAction.STATUS_FAILED
+                    action.output = str(exc)
+                return
+
+        for (action, (exit_code, output)) in zip(queued, outputs):
+            action.output = output.strip()
+            if exit_code != 0:
+                action.status = EnforcerAction.STATUS_FAILED
+                if not action.output:
+                    action.output = "Exit code %d" % exit_code
+            else:
+                action.status = EnforcerAction.STATUS_RUN
+
+    def set_verified(self, action: EnforcerAction, effective: bool):
+        """
+        Record the outcome of a run action, as seen from enforcer's state after the run.
+        """
+        if action.status != EnforcerAction.STATUS_RUN:
+            return
+        action.status = EnforcerAction.STATUS_APPLIED if effective else EnforcerAction.STATUS_NOT_EFFECTIVE
@@ -0,0 +1,259 @@
+# vim: autoindent tabstop=4 shiftwidth=4 expandtab softtabstop=4 filetype=python
+
+import concurrent.futures
+import socket
+import struct
+import subprocess
+
+
+class OdsEnforcerCli:
+    """
+    Run enforcer commands by forking the ods-enforcer -command.
+    """
+
+    def run(self, cmd_args: list):
+        result = subprocess.run(['ods-enforcer'] + cmd_args, stdout=subprocess.PIPE)
+
+        return result.stdout.decode('utf-8')
+
+    def run_lines(self, cmd_args: list):
+        """
+        Stream output lines of a command as they arrive.
+        """
+        with subprocess.Popen(['ods-enforcer'] + cmd_args, stdout=subprocess.PIPE) as process:
+            for line in process.stdout:
+                yield line.decode('utf-8')
+
+    def run_checked(self, cmd_args: list):
+        """
+        :return: tuple (exit code, output). Output of a failed command has its stderr too.
+        """
+        result = subprocess.run(['ods-enforcer'] + cmd_args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output = result.stdout.decode('utf-8')
+        if result.returncode != 0:
+            output += result.stderr.decode('utf-8')
+
+        return result.returncode, output
+
+    def run_many(self, cmds: list, max_concurrent: int = None):
+        """
+        :param max_concurrent: run this many ods-enforcer processes at a time, one by one by default
+        """
+        return self._run_many(self.run, cmds, max_concurrent)
+
+    def run_many_checked(self, cmds: list, max_concurrent: int = None):
+        """
+        Like run_many(), with exit codes.
+        :return: list of tuples (exit code, output), see run_checked()
+        """
+        return self._run_many(self.run_checked, cmds, max_concurrent)
+
+    @staticmethod
+    def _run_many(run, cmds: list, max_concurrent: int = None):
+        if not max_concurrent or max_concurrent <= 1 or len(cmds) <= 1:
+            return [run(cmd_args) for cmd_args in cmds]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrent) as pool:
+            return list(pool.map(run, cmds))
+
+    def close(self):
+        pass
+
+
+class OdsEnforcerSocket:
+    """
+    Talk to the enforcer daemon via its control socket, like ods-enforcer -command does.
+    A single connection is kept open for the whole run and commands are pipelined over it.
+    Any failure to talk to the daemon falls back to forking ods-enforcer.
+    """
+    DEFAULT_SOCKET = '/var/run/opendnssec/enforcer.sock'
+    # Seconds to wait for the daemon to answer, before giving up the connection
+    DEFAULT_TIMEOUT = 60.0
+
+    # Message opcodes, see OpenDNSSEC common/clientpipe.h
+    OPC_STDOUT = 0
+    OPC_STDERR = 1
+    OPC_STDIN = 2
+    OPC_PROMPT = 3
+    OPC_EXIT = 4
+
+    def __init__(self, Path: str = DEFAULT_SOCKET, Timeout: float = DEFAULT_TIMEOUT):
+        self.path = Path
+        self.timeout = Timeout
+        self.sock = None
+        self._buffer = b''
+        # Daemon can close the connection after each command. If that happens, don't pipeline.
+        self.pipelining = True
+        self.fallback = OdsEnforcerCli()
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        try:
+            self.sock.connect(self.path)
+        except OSError:
+            self.sock.close()
+            self.sock = None
+            raise
+        self._buffer = b''
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def run(self, cmd_args: list):
+        return self.run_many([cmd_args])[0]
+
+    def run_lines(self, cmd_args: list):
+        """
+        Stream output lines of a command as they arrive.
+        """
+        try:
+            reused = self.sock is not None
+            if not reused:
+                self.connect()
+            self._send_commands([cmd_args])
+            message = self._receive_message()
+        except OSError:
+            message = None
+        if message is None:
+            # Nothing received, let the buffered path deal with reconnecting or falling back
+            self.close()
+            yield from self.run(cmd_args).splitlines()
+            return
+
+        pending = b''
+        while True:
+            (opcode, data) = message
+            if opcode == OdsEnforcerSocket.OPC_EXIT:
+                break
+            if opcode == OdsEnforcerSocket.OPC_STDOUT:
+                lines = (pending + data).split(b'\n')
+                pending = lines.pop()
+                for line in lines:
+                    yield line.decode('utf-8')
+            message = self._receive_message()
+            if message is None:
+                self.close()
+                raise ConnectionResetError("Enforcer closed connection at %s in middle of output" % self.path)
+        if pending:
+            yield pending.decode('utf-8')
+
+    def run_many(self, cmds: list, max_concurrent: int = None):
+        """
+        :param max_concurrent: have at most this many commands in the pipeline at a time, all by default
+        """
+        return [output for (_, output) in self.run_many_checked(cmds, max_concurrent)]
+
+    def run_many_checked(self, cmds: list, max_concurrent: int = None):
+        """
+        Like run_many(), with exit codes the daemon sends along with the exit message.
+        :return: list of tuples (exit code, output). Output of a failed command has its stderr too.
+        """
+        results = []
+        while len(results) < len(cmds):
+            pending = cmds[len(results):]
+            if not self.pipelining:
+                pending = pending[:1]
+            elif max_concurrent:
+                pending = pending[:max_concurrent]
+            try:
+                results.extend(self._run_pipelined(pending))
+            except OSError:
+                # Daemon not reachable via socket, try the command-line tool
+                self.close()
+                results.extend(self.fallback.run_many_checked(cmds[len(results):], max_concurrent))
+
+        return results
+
+    def _run_pipelined(self, cmds: list):
+        reused = self.sock is not None
+        if not reused:
+            self.connect()
+
+        try:
+            self._send_commands(cmds)
+        except OSError:
+            if not reused:
+                raise
+            # Daemon closed the idle connection. Reconnect.
+            self.close()
+            self.connect()
+            reused = False
+            self._send_commands(cmds)
+
+        results = []
+        for _ in cmds:
+            output = self._receive_output()
+            if output is None:
+                # Connection closed before all results were received.
+                # Redo the rest with a new connection, one command at a time.
+                self.close()
+                if not results and not reused:
+                    raise ConnectionResetError("Enforcer closed connection at %s" % self.path)
+                self.pipelining = False
+                break
+            results.append(output)
+
+        return results
+
+    def _send_commands(self, cmds: list):
+        for cmd_args in cmds:
+            self._send(OdsEnforcerSocket.OPC_STDIN, ' '.join(cmd_args).encode('utf-8'))
+
+    def _send(self, opcode: int, data: bytes):
+        self.sock.sendall(struct.pack('!BH', opcode, len(data)) + data)
+
+    def _receive_output(self):
+        """
+        Collect output of a command up to its exit message.
+        :return: tuple (exit code, output), None if connection was closed first
+        """
+        output = []
+        errors = []
+        while True:
+            message = self._receive_message()
+            if message is None:
+                return None
+            (opcode, data) = message
+            if opcode == OdsEnforcerSocket.OPC_STDOUT:
+                output.append(data)
+            elif opcode == OdsEnforcerSocket.OPC_STDERR:
+                errors.append(data)
+            elif opcode == OdsEnforcerSocket.OPC_EXIT:
+                # Exit code is the first byte of the message
+                exit_code = data[0] if data else 0
+                if exit_code != 0:
+                    output.extend(errors)
+                return exit_code, b''.join(output).decode('utf-8')
+            # Prompts are ignored
+
+    def _receive_message(self):
+        header = self._receive_bytes(3)
+        if header is None:
+            return None
+        (opcode, length) = struct.unpack('!BH', header)
+        data = self._receive_bytes(length)
+        if data is None:
+            return None
+
+        return opcode, data
+
+    def _receive_bytes(self, length: int):
+        while len(self._buffer) < length:
+            try:
+                data = self.sock.recv(65536)
+            except ConnectionResetError:
+                data = None
+            except socket.timeout:
+                # Rest of the answer could arrive later, connection is of no use anymore
+                self.close()
+                raise
+            if not data:
+                return None
+            self._buffer += data
+        data = self._buffer[:length]
+        self._buffer = self._buffer[length:]
+
+        return data
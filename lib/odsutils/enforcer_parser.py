@@ -0,0 +1,119 @@
+# vim: autoindent tabstop=4 shiftwidth=4 expandtab softtabstop=4 filetype=python
+
+import re
+from datetime import datetime
+from functools import lru_cache
+from .key import *
+
+# ods-enforcer key list --verbose:
+# Zone: Keytype: State: Date of next transition: Size: Algorithm: CKA_ID: Repository: KeyTag:
+# Date of next transition is either a timestamp or a text like "waiting for ds-seen".
+LIST_KEYS_LINE = re.compile(r'(?P<zone>\S+)\s+KSK\s+(?P<state>\S+)\s+'
+                            r'(?:(?P<transition>\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)|[^\d\s]\S*(?:\s+[^\d\s]\S*)*)\s+'
+                            r'(?P<bits>\d+)\s+(?P<algorithm>\d+)\s+\S+\s+\S+\s+(?P<keytag>\d+)\s*$')
+
+# ods-enforcer key export --ds:
+# example.com.	3600	IN	DS	12345 8 2 0123abcd...
+KEY_EXPORT_LINE = re.compile(r'(?P<zone>\S+)\.\s+\d+\s+IN\s+DS\s+'
+                             r'(?P<keytag>\d+)\s+(?P<algorithm>\d+)\s+(?P<digest_type>\d+)\s+(?P<digest>[0-9a-fA-F]+)\s*$')
+
+# ods-enforcer key list --verbose --debug:
+# Zone: Key role: DS: DNSKEY: RRSIGDNSKEY: RRSIG: Pub: Act: Id:
+LIST_KEYS_DEBUG_LINE = re.compile(r'(?P<zone>\S+)\s+KSK\s+(?P<ds>\S+)\s+(?P<dnskey>\S+)\s+(?P<rrsigdnskey>\S+)\s+'
+                                  r'(?P<rrsig>\S+)\s+(?P<pub>\d+)\s+(?P<act>\d+)\s+(?P<id>\S+)\s*$')
+
+
+def _lines(output):
+    """
+    Accept both a complete output and an iterable of lines, eg. a stream from enforcer.
+    """
+    if isinstance(output, str):
+        return output.splitlines()
+
+    return output
+
+
+@lru_cache(maxsize=4096)
+def _parse_transition(transition: str):
+    # Lots of keys share the same timestamp, don't parse them over and over again
+    return datetime.fromisoformat(transition)
+
+
+def iter_list_keys(output, zone: str = None):
+    """
+    Parse output of ods-enforcer key list --verbose incrementally.
+    Lines not having a KSK are skipped, so are keys in states not tracked, see OdsKey.ODS_ZONE_STATUS.
+    :param output: str or iterable of lines
+    :param zone: only keys of this zone
+    :return: generator of tuples (zone, OdsKey)
+    """
+    match = LIST_KEYS_LINE.match
+    for line in _lines(output):
+        if zone and not line.startswith(zone):
+            continue
+        m = match(line)
+        if not m:
+            continue
+        zone_name = m.group('zone')
+        if zone and zone_name != zone:
+            continue
+        if m.group('state') not in OdsKey.STATE_CODES:
+            # Eg. generate, dead or mixed: nothing to do at parent for those
+            continue
+
+        transition = m.group('transition')
+        # Note: This output does NOT display the key digest algorithm.
+        key = OdsKey(Type='KSK', Tag=int(m.group('keytag')), State=m.group('state'), Bits=int(m.group('bits')),
+                     Algorithm=int(m.group('algorithm')),
+                     NextTransition=_parse_transition(transition) if transition else None)
+
+        yield zone_name, key
+
+
+def iter_key_export(output, zone: str = None):
+    """
+    Parse output of ods-enforcer key export --ds incrementally.
+    :param output: str or iterable of lines
+    :param zone: only DS-records of this zone
+    :return: generator of tuples (zone, keytag, [algorithm, digest type, digest])
+    """
+    match = KEY_EXPORT_LINE.match
+    for line in _lines(output):
+        m = match(line)
+        if not m:
+            continue
+        zone_name = m.group('zone')
+        if zone and zone_name != zone:
+            continue
+
+        yield zone_name, int(m.group('keytag')), [int(m.group('algorithm')), int(m.group('digest_type')),
+                                                  m.group('digest')]
+
+
+def iter_list_keys_debug(output, zone: str = None):
+    """
+    Parse output of ods-enforcer key list --verbose --debug incrementally.
+    :param output: str or iterable of lines
+    :param zone: only keys of this zone
+    :return: generator of tuples (zone, key id, [ds state, dnskey, rrsigdnskey, rrsig, pub, act])
+    """
+    match = LIST_KEYS_DEBUG_LINE.match
+    for line in _lines(output):
+        m = match(line)
+        if not m:
+            continue
+        zone_name = m.group('zone')
+        if zone and zone_name != zone:
+            continue
+
+        # Note: ZSKs don't have DS, only KSKs do
+        ds_state = m.group('ds')
+        if ds_state == 'NA':
+            ds_state = None
+        # Note: KSKs don't have RRSIG, only ZSK do
+        rrsig = m.group('rrsig')
+        if rrsig == 'NA':
+            rrsig = None
+
+        yield zone_name, m.group('id'), [ds_state, m.group('dnskey'), m.group('rrsigdnskey'), rrsig,
+                                         int(m.group('pub')), int(m.group('act'))]
@@ -9,6 +9,9 @@ class OdsKey:
     ODS_ZONE_STATUS_READY = 'ready'
     ODS_ZONE_STATUS = [ODS_ZONE_STATUS_ACTIVE, ODS_ZONE_STATUS_RETIRE, ODS_ZONE_STATUS_PUBLISH, ODS_ZONE_STATUS_READY]
 
+    # DS-states at parent in ODS enforcer
+    ODS_DS_AT_PARENT = ['unsubmitted', 'submit', 'submitted', 'seen', 'retract', 'retracted']
+
     # Algorithm numbers:
     # https://www.iana.org/assignments/dns-sec-alg-numbers/dns-sec-alg-numbers.xhtml
     DNSSEC_KEY_ALGORITHMS = {
@@ -43,26 +46,43 @@ class OdsKey:
         4: "SHA-384"
     }
 
-    def __init__(self, Type: str, Tag: str, State: str, Bits: int, Algorithm: int, NextTransition: datetime,
-                 DSDigest: int = None):
-        if not (Type == 'KSK' or Type == 'ZSK'):
+    # Canonical string of each code. All keys refer to these, not to a copy parsed from each output line.
+    KEY_TYPES = {'KSK': 'KSK', 'ZSK': 'ZSK'}
+    STATE_CODES = {state: state for state in ODS_ZONE_STATUS}
+    DS_AT_PARENT_CODES = {ds_state: ds_state for ds_state in ODS_DS_AT_PARENT}
+
+    # Fleet-wide inventories hold lots of keys, no __dict__ for each one
+    __slots__ = ('type', 'tag', 'state', 'algorithm', 'bits', 'next_transition', 'ds_at_parent', 'ds_digest')
+
+    def __init__(self, Type: str, Tag: int, State: str, Bits: int, Algorithm: int, NextTransition: datetime,
+                 DSDigest: int = None, DSAtParent: str = None):
+        key_type = OdsKey.KEY_TYPES.get(Type)
+        if key_type is None:
             raise ValueError("Key type needs to be either KSK or ZSK!")
-        if State not in OdsKey.ODS_ZONE_STATUS:
+        state = OdsKey.STATE_CODES.get(State)
+        if state is None:
             raise ValueError("Need valid zone status! Got '%s'" % State)
-        if Algorithm not in OdsKey.DNSSEC_KEY_ALGORITHMS.keys():
+        if Algorithm not in OdsKey.DNSSEC_KEY_ALGORITHMS:
             raise ValueError("Unknown key algorithm %d!" % Algorithm)
-        if Type == 'KSK' and DSDigest:
-            if DSDigest not in OdsKey.DNSSEC_DS_DIGEST.keys():
+        if key_type == 'KSK' and DSDigest:
+            if DSDigest not in OdsKey.DNSSEC_DS_DIGEST:
                 raise ValueError("Unknown key algorithm %d!" % DSDigest)
+        ds_at_parent = None
+        if DSAtParent:
+            ds_at_parent = OdsKey.DS_AT_PARENT_CODES.get(DSAtParent)
+            if ds_at_parent is None:
+                raise ValueError("Need valid DS-state at parent! Got '%s'" % DSAtParent)
 
-        self.type = Type
-        self.tag = Tag
-        self.state = State
+        self.type = key_type
+        # Keytags are always integers
+        self.tag = int(Tag)
+        self.state = state
         self.algorithm = Algorithm
         self.bits = Bits
         self.next_transition = NextTransition
+        self.ds_at_parent = ds_at_parent
 
-        if Type == 'KSK':
+        if key_type == 'KSK':
             self.ds_digest = DSDigest
         else:
             self.ds_digest = None
@@ -75,3 +95,30 @@ class OdsKey:
             return None
 
         return OdsKey.DNSSEC_DS_DIGEST[self.ds_digest]
+
+    def to_json(self):
+        return {
+            "type": self.type,
+            "tag": self.tag,
+            "state": self.state,
+            "algorithm": self.algorithm,
+            "algorithm_name": self.get_key_name(),
+            "bits": self.bits,
+            "ds_digest": self.ds_digest,
+            "ds_at_parent": self.ds_at_parent,
+            "next_transition": self.next_transition.isoformat() if self.next_transition else None
+        }
+
+    @staticmethod
+    def from_json(data: dict):
+        """
+        :param data: dict as returned by to_json()
+        :return: OdsKey
+        """
+        next_transition = data["next_transition"]
+        if next_transition:
+            next_transition = datetime.fromisoformat(next_transition)
+
+        return OdsKey(Type=data["type"], Tag=data["tag"], State=data["state"], Bits=data["bits"],
+                      Algorithm=data["algorithm"], NextTransition=next_transition, DSDigest=data["ds_digest"],
+                      DSAtParent=data["ds_at_parent"])
@@ -0,0 +1,106 @@
+# vim: autoindent tabstop=4 shiftwidth=4 expandtab softtabstop=4 filetype=python
+
+from .key import *
+
+
+class KeyStore:
+    """
+    KSKs of many zones, indexed by zone and by (zone, key state).
+    Keys of a zone are kept in a small tuple, not in a dict per zone: in a fleet most zones have one or two keys
+    and a dict would take more memory than the keys in it. When all keys of a zone are in the same state,
+    both indexes share the same tuple. Single keys are found by (zone, keytag) without scanning.
+    """
+
+    def __init__(self):
+        # zone name -> tuple of OdsKey
+        self._zones = {}
+        # key state -> {zone name -> tuple of OdsKey}
+        self._states = {state: {} for state in OdsKey.ODS_ZONE_STATUS}
+        # (zone name, keytag) -> OdsKey
+        self._tags = {}
+
+    def __len__(self):
+        """
+        :return: int, number of keys in all zones
+        """
+        return len(self._tags)
+
+    def __contains__(self, zone: str):
+        return zone in self._zones
+
+    def add(self, zone: str, key: OdsKey):
+        """
+        Add a key of a zone. A key with the same keytag in the zone is replaced.
+        """
+        if (zone, key.tag) in self._tags:
+            # Rare, re-index the zone. The key may be in another state now.
+            keys = [zone_key for zone_key in self._zones[zone] if zone_key.tag != key.tag]
+            self._remove_zone(zone)
+            for zone_key in keys:
+                self.add(zone, zone_key)
+
+        zone_keys = self._zones.get(zone, ()) + (key,)
+        self._zones[zone] = zone_keys
+        self._tags[(zone, key.tag)] = key
+        state_zones = self._states[key.state]
+        state_keys = state_zones.get(zone, ()) + (key,)
+        state_zones[zone] = zone_keys if len(state_keys) == len(zone_keys) else state_keys
+
+    def get_zones(self):
+        """
+        :return: list of zone names, sorted
+        """
+        return sorted(self._zones)
+
+    def get_keys(self, zone: str):
+        """
+        :return: dict, keytag -> OdsKey, empty if no such zone. A new dict on every call,
+                 see get_zone_keys() for the keys as stored.
+        """
+        return {key.tag: key for key in self._zones.get(zone, ())}
+
+    def get_zone_keys(self, zone: str):
+        """
+        :return: tuple of OdsKey, empty if no such zone
+        """
+        return self._zones.get(zone, ())
+
+    def get_key(self, zone: str, tag: int):
+        """
+        :return: OdsKey, None if zone has no key with the tag
+        """
+        return self._tags.get((zone, tag))
+
+    def get_keys_with_state(self, zone: str, state: str):
+        """
+        :return: tuple of OdsKey, empty if zone has no keys in the state
+        """
+        return self._states[state].get(zone, ())
+
+    def get_states(self, zone: str, states=None):
+        """
+        :param states: only these states, all by default
+        :return: set of key states the zone has keys in
+        """
+        index = self._states
+        if states is None:
+            states = index
+
+        return {state for state in states if zone in index[state]}
+
+    def _remove_zone(self, zone: str):
+        for key in self._zones.pop(zone, ()):
+            del self._tags[(zone, key.tag)]
+        for state in self._states:
+            self._states[state].pop(zone, None)
+
+    @staticmethod
+    def from_keys(zone: str, keys: dict):
+        """
+        :param keys: dict, keytag -> OdsKey
+        """
+        store = KeyStore()
+        for keytag in keys:
+            store.add(zone, keys[keytag])
+
+        return store
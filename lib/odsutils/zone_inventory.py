@@ -0,0 +1,72 @@
+# vim: autoindent tabstop=4 shiftwidth=4 expandtab softtabstop=4 filetype=python
+
+import json
+import os
+from datetime import datetime
+from .key import *
+from .key_store import *
+from .opendnssec_cmd import *
+
+
+class ZoneInventory:
+    """
+    Snapshot of the keys and exported DS-information of zones, taken once from the enforcer.
+    Worker processes and other hosts read the snapshot from a file instead of asking the enforcer again.
+    """
+    VERSION = 1
+
+    @staticmethod
+    def save(zones: list, filename: str):
+        """
+        :param zones: list of ODS, with DS-information prefetched, see ODS.prefetch_zones_ds()
+        """
+        data = {
+            "version": ZoneInventory.VERSION,
+            "created": datetime.now().isoformat(timespec='seconds'),
+            "zones": {}
+        }
+        for zone in zones:
+            ds_info = zone.ds_info if zone.ds_info is not None else {}
+            data["zones"][zone.zone] = {
+                "keys": [zone.keys[keytag].to_json() for keytag in sorted(zone.keys)],
+                "ds_info": {str(keytag): ds_info[keytag] for keytag in ds_info}
+            }
+
+        # Replace atomically, a reader never sees a partial snapshot
+        tmp_filename = '%s.%d.tmp' % (filename, os.getpid())
+        with open(tmp_filename, 'w') as inventory_file:
+            json.dump(data, inventory_file)
+        os.replace(tmp_filename, filename)
+
+    @staticmethod
+    def load(filename: str, zones: list = None):
+        """
+        :param zones: names of the zones to return, None for all zones
+        :return: dict, zone name -> ODS
+        """
+        with open(filename) as inventory_file:
+            data = json.load(inventory_file)
+        if data.get("version") != ZoneInventory.VERSION:
+            raise ValueError("Zone inventory %s has unknown version %s" % (filename, data.get("version")))
+
+        zones_data = data["zones"]
+        if zones is None:
+            zones = sorted(zones_data.keys())
+
+        # One store for keys of all zones
+        store = KeyStore()
+        for zone_name in zones:
+            if zone_name not in zones_data:
+                raise ValueError("Zone %s doesn't exist!" % zone_name)
+            for key_data in zones_data[zone_name]["keys"]:
+                store.add(zone_name, OdsKey.from_json(key_data))
+
+        ret = {}
+        for zone_name in zones:
+            zone_data = zones_data[zone_name]
+            zone = ODS(ZoneName=zone_name, Store=store)
+            # JSON has only string keys, keytags are integers
+            zone.ds_info = {int(keytag): zone_data["ds_info"][keytag] for keytag in zone_data["ds_info"]}
+            ret[zone_name] = zone
+
+        return ret
@@ -0,0 +1,124 @@
+# vim: autoindent tabstop=4 shiftwidth=4 expandtab softtabstop=4 filetype=python
+
+import heapq
+import time
+from .key import *
+
+
+class ZoneScheduler:
+    """
+    Priority queue of zones, ordered by the time their next check is due.
+    Zones in the middle of a KSK rollover are checked often, zones in steady state hardly ever.
+    """
+    # Seconds
+    MIN_INTERVAL = 60
+    DEFAULT_ROLLOVER_INTERVAL = 600
+    DEFAULT_STEADY_INTERVAL = 86400
+    # Zones due this close to each other are checked together, with the same enforcer calls
+    BATCH_WINDOW = 30
+
+    ROLLOVER_STATES = [OdsKey.ODS_ZONE_STATUS_PUBLISH, OdsKey.ODS_ZONE_STATUS_READY, OdsKey.ODS_ZONE_STATUS_RETIRE]
+
+    def __init__(self, RolloverInterval: int = DEFAULT_ROLLOVER_INTERVAL,
+                 SteadyInterval: int = DEFAULT_STEADY_INTERVAL):
+        self.rollover_interval = RolloverInterval
+        self.steady_interval = SteadyInterval
+        # Heap of (due, zone name). Rescheduled zones leave their old entry behind, see _due.
+        self._queue = []
+        # zone name -> due, the valid entry in queue
+        self._due = {}
+
+    def __len__(self):
+        return len(self._due)
+
+    def __contains__(self, zone: str):
+        return zone in self._due
+
+    def schedule(self, zone: str, due: float):
+        self._due[zone] = due
+        heapq.heappush(self._queue, (due, zone))
+
+    def remove(self, zone: str):
+        self._due.pop(zone, None)
+
+    def get_next_due(self):
+        """
+        :return: time of the next check, None if no zones are scheduled
+        """
+        while self._queue:
+            (due, zone) = self._queue[0]
+            if self._due.get(zone) == due:
+                return due
+            heapq.heappop(self._queue)
+
+        return None
+
+    def pop_due(self, now: float = None):
+        """
+        Zones due for a check. If any, zones due within BATCH_WINDOW are included.
+        :return: list of zone names
+        """
+        if now is None:
+            now = time.time()
+
+        next_due = self.get_next_due()
+        if next_due is None or next_due > now:
+            return []
+
+        zones = []
+        while self._queue and self._queue[0][0] <= now + ZoneScheduler.BATCH_WINDOW:
+            (due, zone) = heapq.heappop(self._queue)
+            if self._due.get(zone) != due:
+                continue
+            del self._due[zone]
+            zones.append(zone)
+
+        return zones
+
+    def get_next_check(self, zone, dns_result: dict, ds_ttl: int = None, propagated: bool = True,
+                       now: float = None):
+        """
+        When to check given zone again.
+        :param zone: ODS
+        :param dns_result: DS-records at parent, see DNS.get_ds()
+        :param ds_ttl: TTL of the DS-records at parent, if known
+        :param propagated: servers of the parent zone agree on the DS-records
+        :return: time of the next check
+        """
+        if now is None:
+            now = time.time()
+
+        keys = zone.keys.values()
+        active_key = zone.get_active_key()
+        if not propagated:
+            # Changes are propagating between the servers of the parent zone
+            interval = ZoneScheduler.MIN_INTERVAL
+        elif [key for key in keys if key.state in ZoneScheduler.ROLLOVER_STATES]:
+            # Waiting for DS-records to appear or disappear. No point checking more often than their TTL.
+            interval = self.rollover_interval
+            if ds_ttl:
+                interval = min(max(ds_ttl, ZoneScheduler.MIN_INTERVAL), self.rollover_interval)
+        elif active_key and dns_result and active_key.tag in dns_result:
+            interval = self.steady_interval
+        else:
+            # DS-records don't match, someone is likely fixing it
+            interval = self.rollover_interval
+        due = now + interval
+
+        # Enforcer moves the keys on its own at next transition. If a transition has passed without
+        # the enforcer acting on it, the interval above applies instead of re-checking every MIN_INTERVAL.
+        transitions = [key.next_transition.timestamp() for key in keys if key.next_transition]
+        transitions = [transition for transition in transitions if transition > now]
+        if transitions:
+            due = min(due, max(min(transitions), now + ZoneScheduler.MIN_INTERVAL))
+
+        return due
+
+    def get_retry(self, now: float = None):
+        """
+        When to check a zone again, after a failed check.
+        """
+        if now is None:
+            now = time.time()
+
+        return now + self.rollover_interval
@@ -0,0 +1,73 @@
+# vim: autoindent tabstop=4 shiftwidth=4 expandtab softtabstop=4 filetype=python
+
+import zlib
+
+
+class ZoneShard:
+    """
+    Deterministic partitioning of zones: the same on every host and in every process.
+    Shards are numbered from 1 to count.
+    """
+    # Spread zones evenly
+    BY_ZONE = 'zone'
+    # Keep zones sharing a parent in the same shard, nameservers of the parent are looked up only once.
+    # Shards are as uneven as the parents of the zones are.
+    BY_PARENT = 'parent'
+    BY = [BY_ZONE, BY_PARENT]
+
+    def __init__(self, Index: int, Count: int, By: str = BY_ZONE):
+        if Count < 1 or not 1 <= Index <= Count:
+            raise ValueError("Shard %d/%d doesn't exist!" % (Index, Count))
+        if By not in ZoneShard.BY:
+            raise ValueError("Unknown sharding '%s'!" % By)
+        self.index = Index
+        self.count = Count
+        self.by = By
+
+    def __contains__(self, zone: str):
+        return ZoneShard.get_shard(zone, self.count, self.by) == self.index
+
+    def select(self, zones: list):
+        """
+        :param zones: list of zone names
+        :return: list of zone names in this shard
+        """
+        return [zone for zone in zones if zone in self]
+
+    @staticmethod
+    def parse(value: str, by: str = BY_ZONE):
+        """
+        :param value: 'index/count', eg. 2/4
+        :return: ZoneShard
+        """
+        try:
+            (index, count) = [int(part) for part in value.split('/')]
+        except ValueError:
+            raise ValueError("Shard needs to be given as INDEX/COUNT, eg. 2/4. Got '%s'" % value)
+
+        return ZoneShard(Index=index, Count=count, By=by)
+
+    @staticmethod
+    def get_shard(zone: str, count: int, by: str = BY_ZONE):
+        """
+        :return: int, shard of a zone, from 1 to count
+        """
+        zone = zone.rstrip('.').lower()
+        if by == ZoneShard.BY_PARENT:
+            # Parent zone, see DNS.get_parent_zone()
+            zone = zone.split('.', 1)[-1]
+
+        # Unlike hash(), CRC32 is the same in every process
+        return zlib.crc32(zone.encode('utf-8')) % count + 1
+
+    @staticmethod
+    def partition(zones: list, count: int, by: str = BY_ZONE):
+        """
+        :param zones: list of zone names
+        :return: list of count lists of zone names
+        """
+        shards = [[] for _ in range(count)]
+        for zone in zones:
+            shards[ZoneShard.get_shard(zone, count, by) - 1].append(zone)
+
+        return shards
@@ -0,0 +1,5 @@
+from .zone_report import *
+from .zone_states import *
+from .renderers import *
+from .metrics import *
+from .results import *
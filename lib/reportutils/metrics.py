@@ -0,0 +1,179 @@
+import contextlib
+import os
+import threading
+import time
+from .zone_report import ZoneReport
+
+
+class Histogram:
+    """
+    Cumulative histogram in OpenMetrics style.
+    """
+    DEFAULT_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0]
+
+    def __init__(self, Buckets: list = None):
+        self.buckets = Buckets if Buckets is not None else Histogram.DEFAULT_BUCKETS
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for idx, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                self.counts[idx] += 1
+        self.count += 1
+        self.sum += value
+
+    def get_lines(self, name: str, labels: str):
+        lines = []
+        for idx, bucket in enumerate(self.buckets):
+            lines.append('%s_bucket{%s,le="%s"} %d' % (name, labels, bucket, self.counts[idx]))
+        lines.append('%s_bucket{%s,le="+Inf"} %d' % (name, labels, self.count))
+        lines.append('%s_count{%s} %d' % (name, labels, self.count))
+        lines.append('%s_sum{%s} %f' % (name, labels, self.sum))
+
+        return lines
+
+
+class ZoneMetrics:
+    """
+    KSK rollover state of zones in OpenMetrics text format, for Prometheus.
+    Each zone's metrics are formatted when the zone is updated, a scrape only joins them together.
+    Only seconds until next transition are calculated at scrape time.
+    """
+    CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+    # name, type, help
+    FAMILIES = [
+        ('ods_ksk_keys', 'gauge', 'Number of KSKs of a zone in enforcer, by key state'),
+        ('ods_ksk_next_transition_seconds', 'gauge',
+         'Seconds until next transition of a key in enforcer, negative if overdue'),
+        ('ods_parent_ds', 'gauge',
+         'DS-record of a key at parent, 1 if present, 0 if not. key_state is "none" for DS unknown to enforcer'),
+        ('ods_zone_phase', 'gauge', 'Rollover phase of a zone, as analyzed. Value is always 1'),
+        ('ods_zone_last_check_timestamp_seconds', 'gauge', 'When the zone was last checked'),
+    ]
+    STAGES = ['enforcer', 'dns']
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # zone -> {family name: [lines]}
+        self._zones = {}
+        # zone -> [(labels, next transition timestamp)]
+        self._transitions = {}
+        self._durations = {stage: Histogram() for stage in ZoneMetrics.STAGES}
+
+    def __len__(self):
+        return len(self._zones)
+
+    def update(self, report: ZoneReport, now: float = None):
+        if now is None:
+            now = time.time()
+
+        zone_label = 'zone="%s"' % ZoneMetrics.escape(report.zone)
+        families = {name: [] for (name, _, _) in ZoneMetrics.FAMILIES}
+        transitions = []
+
+        states = {}
+        for keytag in report.keys:
+            key = report.keys[keytag]
+            states[key.state] = states.get(key.state, 0) + 1
+            if key.next_transition:
+                labels = '%s,keytag="%s",key_state="%s"' % (zone_label, key.tag, key.state)
+                transitions.append((labels, key.next_transition.timestamp()))
+        for state in sorted(states):
+            families['ods_ksk_keys'].append('ods_ksk_keys{%s,key_state="%s"} %d' % (zone_label, state, states[state]))
+
+        if not report.error:
+            ds_tags = set(report.get_ds_tags())
+            for keytag in sorted(report.keys):
+                key = report.keys[keytag]
+                families['ods_parent_ds'].append('ods_parent_ds{%s,keytag="%s",key_state="%s"} %d' % (
+                    zone_label, key.tag, key.state, 1 if key.tag in ds_tags else 0))
+            for keytag in sorted(ds_tags.difference(report.keys)):
+                families['ods_parent_ds'].append('ods_parent_ds{%s,keytag="%s",key_state="none"} 1' % (
+                    zone_label, keytag))
+
+        families['ods_zone_phase'].append('ods_zone_phase{%s,phase="%s"} 1' % (zone_label, report.phase))
+        families['ods_zone_last_check_timestamp_seconds'].append(
+            'ods_zone_last_check_timestamp_seconds{%s} %d' % (zone_label, now))
+
+        with self._lock:
+            self._zones[report.zone] = families
+            self._transitions[report.zone] = transitions
+
+    def retain(self, zones: list):
+        """
+        Forget zones not in given list, eg. removed from enforcer.
+        """
+        zones = set(zones)
+        with self._lock:
+            for zone in [zone for zone in self._zones if zone not in zones]:
+                del self._zones[zone]
+                del self._transitions[zone]
+
+    def observe(self, stage: str, seconds: float):
+        """
+        Record duration of a collection stage: enforcer or dns.
+        """
+        with self._lock:
+            self._durations[stage].observe(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, stage: str):
+        """
+        Time a collection stage: with metrics.timer('dns'): ...
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.monotonic() - start)
+
+    def render(self, now: float = None):
+        """
+        :return: str, OpenMetrics text exposition
+        """
+        if now is None:
+            now = time.time()
+
+        out = []
+        with self._lock:
+            zones = sorted(self._zones)
+            for (name, metric_type, help_text) in ZoneMetrics.FAMILIES:
+                out.append('# TYPE %s %s' % (name, metric_type))
+                out.append('# HELP %s %s' % (name, ZoneMetrics.escape(help_text)))
+                if name == 'ods_ksk_next_transition_seconds':
+                    for zone in zones:
+                        for (labels, transition) in self._transitions[zone]:
+                            out.append('%s{%s} %d' % (name, labels, transition - now))
+                    continue
+                for zone in zones:
+                    out.extend(self._zones[zone][name])
+
+            name = 'ods_collection_duration_seconds'
+            out.append('# TYPE %s histogram' % name)
+            out.append('# HELP %s Duration of collecting zone statuses, by stage' % name)
+            for stage in ZoneMetrics.STAGES:
+                out.extend(self._durations[stage].get_lines(name, 'stage="%s"' % stage))
+        out.append('# EOF')
+        out.append('')
+
+        return "\n".join(out)
+
+    def write_textfile(self, filename: str):
+        """
+        Write metrics for node_exporter's textfile collector.
+        File is replaced atomically, a collector never sees a partial file.
+        """
+        tmp_filename = '%s.%d.tmp' % (filename, os.getpid())
+        with open(tmp_filename, 'w') as metrics_file:
+            metrics_file.write(self.render())
+        os.replace(tmp_filename, filename)
+
+    @staticmethod
+    def escape(value: str):
+        """
+        Escape a label value or HELP text: backslash, double quote and newline.
+        """
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,308 @@
+import json
+import sys
+from datetime import datetime
+from .zone_report import DsCheck, ZoneAction, ZoneReport
+from .zone_states import ZoneStates
+from ..odsutils import EnforcerAction
+
+
+class Renderer:
+    """
+    Writes ZoneReports out as they arrive: begin(), zone() for each zone, end().
+    """
+
+    def __init__(self, Output=None):
+        self.output = Output if Output is not None else sys.stdout
+        self.count = 0
+
+    def begin(self):
+        pass
+
+    def zone(self, report: ZoneReport):
+        self._write_zone(report)
+        self.count += 1
+        self.output.flush()
+
+    def record(self, record: dict):
+        """
+        Write a zone already in JSON, eg. read from a result file, see merge_results()
+        """
+        self._write_record(record)
+        self.count += 1
+        self.output.flush()
+
+    def end(self):
+        self.output.flush()
+
+    def _write_zone(self, report: ZoneReport):
+        raise NotImplementedError()
+
+    def _write_record(self, record: dict):
+        raise NotImplementedError()
+
+
+class NdjsonRenderer(Renderer):
+    """
+    A JSON-object per line, per zone.
+    """
+
+    def _write_zone(self, report: ZoneReport):
+        self._write_record(report.to_json())
+
+    def _write_record(self, record: dict):
+        self.output.write(json.dumps(record))
+        self.output.write("\n")
+
+
+class JsonRenderer(Renderer):
+    """
+    A single JSON-document {"zones": [...]}. Zones are written out as they arrive.
+    """
+
+    def begin(self):
+        self.output.write('{"zones": [')
+
+    def _write_zone(self, report: ZoneReport):
+        self._write_record(report.to_json())
+
+    def _write_record(self, record: dict):
+        if self.count:
+            self.output.write(",")
+        self.output.write("\n")
+        self.output.write(json.dumps(record))
+
+    def end(self):
+        self.output.write("\n]}\n")
+        super().end()
+
+
+class TextRenderer(Renderer):
+    """
+    Human readable report with instructions.
+    """
+    DS_CHECK_PROBLEMS = {
+        DsCheck.NO_DNSKEY: "DS-record at parent, but no such DNSKEY-record in zone",
+        DsCheck.PARENT_DIGEST: "digest of DS-record at parent doesn't match the DNSKEY-record",
+        DsCheck.ENFORCER_DIGEST: "digest exported by enforcer doesn't match the DNSKEY-record",
+        DsCheck.PARENT_ENFORCER: "digest of DS-record at parent differs from the one exported by enforcer",
+        DsCheck.CDS_DIGEST: "CDS-record doesn't match any DNSKEY-record",
+        DsCheck.CDNSKEY_UNKNOWN: "CDNSKEY-record isn't one of the DNSKEY-records",
+    }
+
+    def _write_zone(self, report: ZoneReport):
+        if self.count:
+            self.output.write("\n")
+        for line in TextRenderer.format(report):
+            self.output.write(line)
+            self.output.write("\n")
+
+    @staticmethod
+    def format(report: ZoneReport):
+        """
+        :return: list of lines
+        """
+        lines = ["OpenDNSSEC zone %s information:" % report.zone]
+        if report.error:
+            lines.append("  Failed to query DS-records: %s" % report.error)
+            TextRenderer._format_next_check(report, lines)
+            return lines
+
+        zone = report.zone
+        propagated = report.is_propagated()
+        active_key = report.active_key
+        if active_key:
+            lines.append("  Zone has active %s (%d bits) key with tag %s" % (active_key.get_key_name(),
+                                                                             active_key.bits, active_key.tag))
+        else:
+            lines.append("  Zone has no active keys")
+
+        for action in report.actions:
+            key = action.key
+            if action.kind in (ZoneAction.ROLLED_OVER, ZoneAction.RETIRE):
+                if action.kind == ZoneAction.ROLLED_OVER:
+                    lines.append("  Zone has performed a KSK rollover")
+                else:
+                    lines.append("  Zone is waiting for KSK rollover")
+                lines.append("    Suggest: To perform KSK rollover to the end, do following:")
+                lines.append("      To get old key retired:")
+                lines.append("      0) Make sure your DNS-changes are full propagated.")
+                lines.append("         This message will display as long as changes can not be detected.")
+                lines.append("      1) (optional) If your Domain name registrar supports multiple keys, "
+                             "remove key with tag %d" % key.tag)
+                lines.append(TextRenderer._ds_command('2) ', 'ds-gone', zone, key.tag, propagated))
+
+            elif action.kind in (ZoneAction.PUBLISH_SEEN, ZoneAction.PUBLISH_SUBMIT):
+                lines.append("  Zone is waiting for a %s (%d bits) key with tag %s to be published" % (
+                    key.get_key_name(), key.bits, key.tag))
+                if action.kind == ZoneAction.PUBLISH_SEEN:
+                    lines.append("    Suggest: To publish the key, run following:")
+                    lines.append(TextRenderer._ds_command('', 'ds-seen', zone, key.tag, propagated))
+                else:
+                    commands = action.get_commands(zone)
+                    lines.append("    Suggest: To publish the key, do following:")
+                    lines.append("      1) %s" % commands[0])
+                    lines.append("      2) %s" % commands[1])
+                    lines.append("      3) In your Domain name registrar's user interface:")
+                    lines.append("         upload information from step 2) into zone %s DNSSEC setup "
+                                 "with following details:" % zone)
+                    TextRenderer._format_key_details(key, lines)
+                    lines.append("      4) %s" % commands[2])
+                    lines.append("      5) Wait. Eventually the key will be propagated according to chosen key policy.")
+
+            elif action.kind == ZoneAction.READY_SEEN:
+                lines.append("  Zone is waiting for a %s (%d bits) key with tag %s to be DS-seen" % (
+                    key.get_key_name(), key.bits, key.tag))
+                lines.append("    Suggest: To confirm key setup, run following:")
+                lines.append(TextRenderer._ds_command('', 'ds-seen', zone, key.tag, propagated))
+
+            elif action.kind in (ZoneAction.ROLLOVER_SEEN, ZoneAction.ROLLOVER_UPLOAD):
+                lines.append("  Zone is waiting for KSK rollover")
+                lines.append("    Suggest: To perform KSK rollover, do following:")
+                lines.append("      To get new key published:")
+                if action.kind == ZoneAction.ROLLOVER_SEEN:
+                    lines.append(TextRenderer._ds_command('1) ', 'ds-seen', zone, key.tag, propagated))
+                else:
+                    commands = action.get_commands(zone)
+                    lines.append("      1) %s" % commands[0])
+                    lines.append("      2) In your Domain name registrar's user interface:")
+                    lines.append("         upload information from step 1) into zone %s DNSSEC setup "
+                                 "with following details:" % zone)
+                    TextRenderer._format_key_details(key, lines)
+                    lines.append("      3) Wait. Keep running this command until you see a "
+                                 "'Zone has DS-record with tag %d in DNS'" % key.tag)
+                    lines.append("      4) %s" % commands[1])
+
+            elif action.kind == ZoneAction.ROLLOVER_RETIRE:
+                lines.append("")
+                lines.append("      To get old key retired:")
+                lines.append("      0) Important: Do this only after new key steps have been completed!")
+                lines.append("      1) (optional) If your Domain name registrar supports multiple keys, "
+                             "remove key with tag %d" % key.tag)
+                lines.append(TextRenderer._ds_command('2) ', 'ds-gone', zone, key.tag, propagated))
+
+            elif action.kind == ZoneAction.GONE_SEEN:
+                lines.append("  DS-record of retired key with tag %s is gone from parent" % key.tag)
+                lines.append("    Suggest: To confirm it, run following:")
+                lines.append(TextRenderer._ds_command('', 'ds-gone', zone, key.tag, propagated))
+
+            elif action.kind == ZoneAction.BROKEN:
+                lines.append("  Zone is royally messed up!")
+
+            elif action.kind == ZoneAction.DS_MISMATCH:
+                lines.append("  DS-record with tag %s at parent doesn't match the key served by the zone" % key.tag)
+                lines.append("    Suggest: Don't run ds-seen. To fix the DS-record, do following:")
+                lines.append("      1) %s" % action.get_commands(zone)[0])
+                lines.append("      2) In your Domain name registrar's user interface:")
+                lines.append("         replace DS-record with tag %d with information from step 1)" % key.tag)
+                lines.append("      3) Wait. Keep running this command until the DS-record matches.")
+
+        resolver = ', '.join(report.dns_servers)
+        if report.ds:
+            for keytag in report.ds:
+                lines.append("  Zone has DS-record with tag %s in DNS server %s" % (report.ds[keytag]["keytag"],
+                                                                                 resolver))
+            if active_key and active_key.tag in report.ds:
+                lines.append("  Found tags in active key and DS-record. Tags match. All good. Nothing to do.")
+        else:
+            lines.append("  Zone has no DS-records in DNS %s" % resolver)
+
+        propagation = report.propagation
+        if propagation:
+            lines.append("  Parent zone %s servers %s:" % (propagation.parent,
+                                                         "agree" if propagated else
+                                                         "don't agree, changes are propagating"))
+            for server in propagation.servers:
+                if server.ds is not None:
+                    tags = ', '.join([str(keytag) for keytag in sorted(server.get_keytags())])
+                    lines.append("    %s (%s): %s in %.1f ms" % (server.host, server.address,
+                                                                 tags if tags else "no DS-records", server.rtt * 1000))
+                elif server.address is None:
+                    lines.append("    %s: %s" % (server.host, server.error))
+                else:
+                    lines.append("    %s (%s): %s" % (server.host, server.address, server.error))
+
+        child = report.child
+        if child:
+            if child.error:
+                lines.append("  Failed to query DNSKEY-records from nameservers of the zone: %s" % child.error)
+            else:
+                tags = ', '.join([str(keytag) for keytag in sorted(child.get_keytags())])
+                lines.append("  Zone has KSK DNSKEY-records with tags %s in DNS server %s" % (
+                    tags if tags else "none", child.address))
+                for check in report.ds_checks:
+                    lines.append("    Tag %s: %s" % (check.keytag, TextRenderer.DS_CHECK_PROBLEMS[check.problem]))
+                if not report.ds_checks:
+                    lines.append("    Digests of DS-records at parent and in enforcer match the DNSKEY-records")
+
+        for action in report.applied:
+            lines.append("  Applied: %s: %s" % (action.get_command_line(), action.status))
+            if action.output and action.status != EnforcerAction.STATUS_APPLIED:
+                for output_line in action.output.splitlines():
+                    lines.append("    %s" % output_line)
+
+        lines.append("")
+        lines.append("Hint: Verify the status by visiting https://dnssec-analyzer.verisignlabs.com/%s" % zone)
+        TextRenderer._format_next_check(report, lines)
+
+        return lines
+
+    @staticmethod
+    def _ds_command(step: str, command: str, zone: str, keytag: int, propagated: bool):
+        if propagated:
+            return "      %s%s" % (step, ZoneAction.ds_command(command, zone, keytag))
+
+        return "      %sWait. DS-records differ between servers of the parent zone, " \
+               "changes are still propagating." % step
+
+    @staticmethod
+    def _format_key_details(key, lines: list):
+        lines.append("         - Key tag: %s" % key.tag)
+        lines.append("         - Key algorithm: %d (%s)" % (key.algorithm, key.get_key_name()))
+        lines.append("         - Key digest type: %s (%s)" % (key.ds_digest, key.get_key_digest_name()))
+        lines.append("         - Key digest: (see key export output)")
+
+    @staticmethod
+    def _format_next_check(report: ZoneReport, lines: list):
+        if report.next_check:
+            lines.append("Next check of zone %s at %s" % (
+                report.zone, datetime.fromtimestamp(report.next_check).strftime('%Y-%m-%d %H:%M:%S')))
+
+
+class StateRenderer(Renderer):
+    """
+    Records the state of each zone, see ZoneStates, and passes the zone on to another renderer.
+    With ChangedOnly, only zones whose state changed since the previous run are passed on.
+    """
+
+    def __init__(self, Renderer: Renderer, States: ZoneStates, ChangedOnly: bool = False):
+        super().__init__(Output=Renderer.output)
+        self.renderer = Renderer
+        self.states = States
+        self.changed_only = ChangedOnly
+
+    def begin(self):
+        self.renderer.begin()
+
+    def zone(self, report: ZoneReport):
+        changed = self.states.update(report)
+        if changed or not self.changed_only:
+            self.renderer.zone(report)
+            self.count += 1
+
+    def end(self):
+        self.renderer.end()
+
+
+RENDERERS = {
+    'text': TextRenderer,
+    'json': JsonRenderer,
+    'ndjson': NdjsonRenderer,
+}
+
+
+def get_renderer(name: str, output=None):
+    """
+    :param name: one of RENDERERS
+    :return: Renderer
+    """
+    return RENDERERS[name](Output=output)
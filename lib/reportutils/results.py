@@ -0,0 +1,43 @@
+import json
+
+
+def read_results(filename: str):
+    """
+    Read zones from a result file written with --output json or --output ndjson.
+    :return: list of dicts, see ZoneReport.to_json()
+    """
+    with open(filename) as results_file:
+        content = results_file.read()
+
+    try:
+        data = json.loads(content)
+    except ValueError:
+        data = None
+    if isinstance(data, dict) and "zones" in data:
+        return data["zones"]
+
+    # NDJSON, a zone per line. A single-zone NDJSON-file parses as JSON too.
+    records = []
+    for (line_number, line) in enumerate(content.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError as exc:
+            raise ValueError("%s line %d: %s" % (filename, line_number, exc))
+
+    return records
+
+
+def merge_results(filenames: list):
+    """
+    Combine result files of shards into one.
+    If a zone is in multiple files, the last one wins.
+    :return: list of dicts, ordered by zone name
+    """
+    zones = {}
+    for filename in filenames:
+        for record in read_results(filename):
+            zones[record["zone"]] = record
+
+    return [zones[zone] for zone in sorted(zones.keys())]
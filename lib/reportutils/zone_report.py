@@ -0,0 +1,378 @@
+from datetime import datetime
+from ..dnsutils import ChildKeys, PropagationReport
+from ..odsutils import EnforcerAction, ODS, OdsKey
+
+
+class ZoneAction:
+    """
+    A step the operator is suggested to take for a zone.
+    """
+    # Active key, DS of the retired key still at parent
+    ROLLED_OVER = 'rolled-over'
+    # Key waiting to be published, its DS already at parent
+    PUBLISH_SEEN = 'publish-seen'
+    # Key waiting to be published, DS needs to be submitted to parent
+    PUBLISH_SUBMIT = 'publish-submit'
+    # Key waiting for ds-seen
+    READY_SEEN = 'ready-seen'
+    # KSK rollover: DS of the new key at parent
+    ROLLOVER_SEEN = 'rollover-seen'
+    # KSK rollover: DS of the new key needs to be uploaded to parent
+    ROLLOVER_UPLOAD = 'rollover-upload'
+    # KSK rollover: DS of the old key still at parent
+    ROLLOVER_RETIRE = 'rollover-retire'
+    # No active key, retired key's DS still at parent
+    RETIRE = 'retire'
+    # Retired key waiting for ds-gone, its DS already gone from parent
+    GONE_SEEN = 'gone-seen'
+    # Ready and retired keys, no DS-records at parent
+    BROKEN = 'broken'
+    # DS-record at parent doesn't match the key, instead of ds-seen. Export the DS again and upload it.
+    DS_MISMATCH = 'ds-mismatch'
+
+    def __init__(self, Kind: str, Key: OdsKey = None):
+        self.kind = Kind
+        self.key = Key
+
+    def get_commands(self, zone: str, propagated: bool = True):
+        """
+        ods-enforcer commands to run for this step.
+        ds-seen and ds-gone are suggested only after all parent servers agree on the DS-records.
+        :return: list of str
+        """
+        if self.kind in (ZoneAction.ROLLED_OVER, ZoneAction.ROLLOVER_RETIRE, ZoneAction.RETIRE,
+                         ZoneAction.GONE_SEEN):
+            return [ZoneAction.ds_command('ds-gone', zone, self.key.tag)] if propagated else []
+        if self.kind in (ZoneAction.PUBLISH_SEEN, ZoneAction.READY_SEEN, ZoneAction.ROLLOVER_SEEN):
+            return [ZoneAction.ds_command('ds-seen', zone, self.key.tag)] if propagated else []
+        if self.kind == ZoneAction.PUBLISH_SUBMIT:
+            return [ZoneAction.ds_command('ds-submit', zone, self.key.tag),
+                    ZoneAction.export_command(zone, OdsKey.ODS_ZONE_STATUS_PUBLISH),
+                    ZoneAction.ds_command('ds-publish', zone, self.key.tag)]
+        if self.kind == ZoneAction.DS_MISMATCH:
+            return [ZoneAction.export_command(zone, self.key.state)]
+        if self.kind == ZoneAction.ROLLOVER_UPLOAD:
+            return [ZoneAction.export_command(zone, OdsKey.ODS_ZONE_STATUS_READY),
+                    ZoneAction.ds_command('ds-seen', zone, self.key.tag)]
+
+        return []
+
+    def to_json(self):
+        return {
+            "action": self.kind,
+            "keytag": self.key.tag if self.key else None
+        }
+
+    def get_safe_command(self, ds_tags: set):
+        """
+        Command safe to run unattended, if the DS-records at parent confirm this step: ds-seen for a key
+        having its DS at parent, ds-gone for a key not having it.
+        :return: str, EnforcerAction command or None
+        """
+        if self.kind in (ZoneAction.PUBLISH_SEEN, ZoneAction.READY_SEEN, ZoneAction.ROLLOVER_SEEN):
+            if self.key.tag in ds_tags:
+                return EnforcerAction.DS_SEEN
+        elif self.kind == ZoneAction.GONE_SEEN:
+            if self.key.tag not in ds_tags:
+                return EnforcerAction.DS_GONE
+
+        return None
+
+    @staticmethod
+    def ds_command(command: str, zone: str, keytag: int):
+        return "ods-enforcer key %s --zone %s --keytag %s" % (command, zone, keytag)
+
+    @staticmethod
+    def export_command(zone: str, state: str):
+        return "ods-enforcer key export --zone %s --keytype ksk --keystate %s --ds" % (zone, state)
+
+
+class DsCheck:
+    """
+    A DS-record not matching the DNSKEY it refers to.
+    Digests are computed from the DNSKEYs served by the zone's own nameservers, see ChildKeys.
+    """
+    # DS at parent, no such DNSKEY served by the zone
+    NO_DNSKEY = 'no-dnskey'
+    # DS at parent has a wrong digest
+    PARENT_DIGEST = 'parent-digest'
+    # Digest exported by enforcer doesn't match the served DNSKEY
+    ENFORCER_DIGEST = 'enforcer-digest'
+    # DS at parent differs from the one exported by enforcer
+    PARENT_ENFORCER = 'parent-enforcer'
+    # CDS has a wrong digest or no such DNSKEY is served
+    CDS_DIGEST = 'cds-digest'
+    # CDNSKEY isn't one of the served DNSKEYs
+    CDNSKEY_UNKNOWN = 'cdnskey-unknown'
+
+    # Problems with the DS-record at parent
+    PARENT_PROBLEMS = (NO_DNSKEY, PARENT_DIGEST, PARENT_ENFORCER)
+
+    def __init__(self, Keytag: int, Problem: str):
+        self.keytag = Keytag
+        self.problem = Problem
+
+    def to_json(self):
+        return {
+            "keytag": self.keytag,
+            "problem": self.problem
+        }
+
+    @staticmethod
+    def check(ds: dict, ds_info: dict, child: ChildKeys):
+        """
+        :param ds: DS-records at parent, see DNS.get_ds()
+        :param ds_info: DS-information exported by enforcer, keytag -> [algorithm, digest type, digest]
+        :param child: ChildKeys
+        :return: list of DsCheck, only the failed ones
+        """
+        checks = []
+        ds = ds if ds else {}
+        for keytag in sorted(ds):
+            parent_ds = ds[keytag]
+            if keytag not in child.dnskeys:
+                checks.append(DsCheck(Keytag=keytag, Problem=DsCheck.NO_DNSKEY))
+                continue
+            digest = child.get_digest(keytag, parent_ds["keylabels"])
+            if digest is not None and digest != parent_ds["key"].lower():
+                checks.append(DsCheck(Keytag=keytag, Problem=DsCheck.PARENT_DIGEST))
+                continue
+            if keytag in ds_info:
+                (_, digest_type, enforcer_digest) = ds_info[keytag]
+                if digest_type == parent_ds["keylabels"] and enforcer_digest.lower() != parent_ds["key"].lower():
+                    checks.append(DsCheck(Keytag=keytag, Problem=DsCheck.PARENT_ENFORCER))
+
+        for keytag in sorted(ds_info):
+            (_, digest_type, enforcer_digest) = ds_info[keytag]
+            digest = child.get_digest(keytag, digest_type)
+            if digest is not None and digest != enforcer_digest.lower():
+                checks.append(DsCheck(Keytag=keytag, Problem=DsCheck.ENFORCER_DIGEST))
+
+        for keytag in sorted(child.cds):
+            cds = child.cds[keytag]
+            if cds["keyalgo"] == 0:
+                # Delete DS
+                continue
+            digest = child.get_digest(keytag, cds["keylabels"])
+            if keytag not in child.dnskeys or (digest is not None and digest != cds["key"]):
+                checks.append(DsCheck(Keytag=keytag, Problem=DsCheck.CDS_DIGEST))
+
+        for keytag in sorted(child.cdnskeys):
+            if not child.cdnskeys[keytag]:
+                checks.append(DsCheck(Keytag=keytag, Problem=DsCheck.CDNSKEY_UNKNOWN))
+
+        return checks
+
+
+class ZoneReport:
+    """
+    Status of a zone: keys in the enforcer compared with DS-records at parent, and the suggested steps.
+    Result of analyze(), see renderers for output.
+    """
+    PHASE_ACTIVE = 'active'
+    PHASE_ACTIVE_NO_DS = 'active-no-ds'
+    PHASE_SUBMIT = 'submit'
+    PHASE_DS_SEEN = 'ds-seen'
+    PHASE_ROLLOVER = 'rollover'
+    PHASE_DS_GONE = 'ds-gone'
+    PHASE_BROKEN = 'broken'
+    PHASE_DS_MISMATCH = 'ds-mismatch'
+    PHASE_WAITING = 'waiting'
+    PHASE_ERROR = 'error'
+
+    # Phase of a zone by its first action
+    ACTION_PHASES = {
+        ZoneAction.ROLLED_OVER: PHASE_DS_GONE,
+        ZoneAction.PUBLISH_SEEN: PHASE_DS_SEEN,
+        ZoneAction.PUBLISH_SUBMIT: PHASE_SUBMIT,
+        ZoneAction.READY_SEEN: PHASE_DS_SEEN,
+        ZoneAction.ROLLOVER_SEEN: PHASE_ROLLOVER,
+        ZoneAction.ROLLOVER_UPLOAD: PHASE_ROLLOVER,
+        ZoneAction.ROLLOVER_RETIRE: PHASE_ROLLOVER,
+        ZoneAction.RETIRE: PHASE_DS_GONE,
+        ZoneAction.GONE_SEEN: PHASE_DS_GONE,
+        ZoneAction.BROKEN: PHASE_BROKEN,
+        ZoneAction.DS_MISMATCH: PHASE_DS_MISMATCH,
+    }
+    # Suggesting these would tell enforcer a DS is at parent
+    SEEN_ACTIONS = (ZoneAction.PUBLISH_SEEN, ZoneAction.READY_SEEN, ZoneAction.ROLLOVER_SEEN)
+
+    def __init__(self, Zone: str, Phase: str, Keys: dict = None, ActiveKey: OdsKey = None, DnsServers: list = None,
+                 Ds: dict = None, Propagation: PropagationReport = None, Actions: list = None, Error: str = None,
+                 Child: ChildKeys = None, DsChecks: list = None):
+        self.zone = Zone
+        self.phase = Phase
+        # keytag -> OdsKey
+        self.keys = Keys if Keys is not None else {}
+        self.active_key = ActiveKey
+        self.dns_servers = DnsServers if DnsServers is not None else []
+        # DS-records at parent, see DNS.get_ds()
+        self.ds = Ds
+        self.propagation = Propagation
+        self.actions = Actions if Actions is not None else []
+        self.error = Error
+        # Keys served by the zone itself and DS-records not matching them, if verified
+        self.child = Child
+        self.ds_checks = DsChecks if DsChecks is not None else []
+        # Apply mode: EnforcerActions run for this zone
+        self.applied = []
+        # Watch mode: time of the next check
+        self.next_check = None
+
+    def is_propagated(self):
+        # Without a propagation report, trust the single parent server queried
+        return self.propagation is None or self.propagation.is_consistent()
+
+    def get_commands(self):
+        """
+        :return: list of ods-enforcer commands suggested, in order
+        """
+        commands = []
+        for action in self.actions:
+            commands.extend(action.get_commands(self.zone, self.is_propagated()))
+
+        return commands
+
+    def get_safe_actions(self):
+        """
+        Apply mode: actions safe to run unattended. All servers of the parent zone need to agree on
+        the DS-records and the DS-records need to be verified against the keys served by the zone.
+        Keys having any DS-problem are left for the operator.
+        :return: list of tuples (EnforcerAction command, keytag)
+        """
+        if self.error or not self.propagation or not self.propagation.is_consistent():
+            return []
+        if not self.child or self.child.error:
+            return []
+
+        ds_tags = set(self.get_ds_tags())
+        problem_tags = set([check.keytag for check in self.ds_checks])
+        safe = []
+        for action in self.actions:
+            command = action.get_safe_command(ds_tags)
+            if command and action.key.tag not in problem_tags:
+                safe.append((command, action.key.tag))
+
+        return safe
+
+    def get_ds_tags(self):
+        if not self.ds:
+            return []
+
+        return sorted(self.ds.keys())
+
+    def to_json(self):
+        next_check = None
+        if self.next_check:
+            next_check = datetime.fromtimestamp(self.next_check).isoformat(timespec='seconds')
+
+        return {
+            "zone": self.zone,
+            "phase": self.phase,
+            "error": self.error,
+            "keys": [self.keys[keytag].to_json() for keytag in sorted(self.keys)],
+            "dns_servers": self.dns_servers,
+            "ds_tags": self.get_ds_tags(),
+            "ds": [self.ds[keytag] for keytag in self.get_ds_tags()],
+            "propagation": self.propagation.to_json() if self.propagation else None,
+            "child": self.child.to_json() if self.child else None,
+            "ds_checks": [check.to_json() for check in self.ds_checks],
+            "actions": [action.to_json() for action in self.actions],
+            "commands": self.get_commands(),
+            "applied": [action.to_json() for action in self.applied],
+            "next_check": next_check
+        }
+
+    @staticmethod
+    def failed(zone: str, error: str, keys: dict = None):
+        return ZoneReport(Zone=zone, Phase=ZoneReport.PHASE_ERROR, Keys=keys, Error=error)
+
+    @staticmethod
+    def analyze(zone: ODS, dns_query_result: tuple = None, propagation: PropagationReport = None,
+                child: ChildKeys = None):
+        """
+        Compare keys of a zone in the enforcer with DS-records at parent.
+        :param zone: ODS
+        :param dns_query_result: tuple (parent nameserver, DS-records) as returned by DNS.get_ds()
+        :param propagation: PropagationReport, instead of dns_query_result
+        :param child: ChildKeys, to verify digests of DS-records at parent and in enforcer
+        :return: ZoneReport
+        """
+        if propagation:
+            dns_servers = [server.address for server in propagation.get_answered()]
+            dns_result = propagation.get_ds()
+        else:
+            (resolver, dns_result) = dns_query_result
+            dns_servers = [resolver]
+        ds_tags = set(dns_result.keys()) if dns_result else set()
+
+        # ODS-enforcer status
+        active_key = zone.get_active_key()
+        retired_keys = zone.get_retired_keys()
+
+        def _retired_key_in_dns():
+            intersect = ds_tags.intersection(set(retired_keys))
+            if not intersect:
+                return None
+            return retired_keys[intersect.pop()]
+
+        def _retired_keys_gone():
+            # Keys waiting for ds-gone, DS already gone. No DS-records at all may as well be a failed query.
+            if not dns_result:
+                return []
+            return [retired_keys[keytag] for keytag in sorted(retired_keys)
+                    if keytag not in ds_tags and retired_keys[keytag].next_transition is None and
+                    retired_keys[keytag].ds_at_parent in (None, 'retract')]
+
+        # Interpret the results
+        actions = []
+        if active_key:
+            if retired_keys:
+                retired_key = _retired_key_in_dns()
+                if retired_key:
+                    actions.append(ZoneAction(Kind=ZoneAction.ROLLED_OVER, Key=retired_key))
+                for retired_key in _retired_keys_gone():
+                    actions.append(ZoneAction(Kind=ZoneAction.GONE_SEEN, Key=retired_key))
+        else:
+            publish_key = zone.get_key_to_publish()
+            if publish_key:
+                kind = ZoneAction.PUBLISH_SEEN if dns_result else ZoneAction.PUBLISH_SUBMIT
+                actions.append(ZoneAction(Kind=kind, Key=publish_key))
+
+            ready_key = zone.get_ready_key()
+            if ready_key:
+                if not retired_keys:
+                    actions.append(ZoneAction(Kind=ZoneAction.READY_SEEN, Key=ready_key))
+                elif dns_result:
+                    if ready_key.tag in ds_tags:
+                        actions.append(ZoneAction(Kind=ZoneAction.ROLLOVER_SEEN, Key=ready_key))
+                    else:
+                        actions.append(ZoneAction(Kind=ZoneAction.ROLLOVER_UPLOAD, Key=ready_key))
+                    retired_key = _retired_key_in_dns()
+                    if retired_key:
+                        actions.append(ZoneAction(Kind=ZoneAction.ROLLOVER_RETIRE, Key=retired_key))
+                else:
+                    actions.append(ZoneAction(Kind=ZoneAction.BROKEN))
+            elif retired_keys:
+                retired_key = _retired_key_in_dns()
+                if retired_key:
+                    actions.append(ZoneAction(Kind=ZoneAction.RETIRE, Key=retired_key))
+
+        ds_checks = []
+        if child and not child.error:
+            ds_checks = DsCheck.check(dns_result, zone.ds_info or {}, child)
+            mismatched = set([check.keytag for check in ds_checks if check.problem in DsCheck.PARENT_PROBLEMS])
+            for idx, action in enumerate(actions):
+                # Don't suggest ds-seen for a DS not matching its key
+                if action.kind in ZoneReport.SEEN_ACTIONS and action.key.tag in mismatched:
+                    actions[idx] = ZoneAction(Kind=ZoneAction.DS_MISMATCH, Key=action.key)
+
+        if actions:
+            phase = ZoneReport.ACTION_PHASES[actions[0].kind]
+        elif active_key:
+            phase = ZoneReport.PHASE_ACTIVE if active_key.tag in ds_tags else ZoneReport.PHASE_ACTIVE_NO_DS
+        else:
+            phase = ZoneReport.PHASE_WAITING
+
+        return ZoneReport(Zone=zone.zone, Phase=phase, Keys=zone.keys, ActiveKey=active_key, DnsServers=dns_servers,
+                          Ds=dns_result, Propagation=propagation, Actions=actions, Child=child, DsChecks=ds_checks)
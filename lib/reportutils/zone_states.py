@@ -0,0 +1,117 @@
+import json
+import os
+import time
+from datetime import datetime
+from .zone_report import ZoneReport
+from ..odsutils import ODS
+
+
+class ZoneStates:
+    """
+    Compact KSK/DS-state of zones from the previous run, kept in a file between runs.
+    Per zone: keytags with their states and next transitions, keytags of DS-records at parent, phase and
+    when DNS was last checked. Used to output only the zones whose state changed, see --changed-only.
+    """
+    VERSION = 1
+    # Zones in these phases need nothing from the operator. If their keys haven't changed in the enforcer,
+    # their DNS-check can be skipped for a while.
+    STEADY_PHASES = (ZoneReport.PHASE_ACTIVE, ZoneReport.PHASE_WAITING)
+
+    def __init__(self, Filename: str = None):
+        self.filename = Filename
+        # zone name -> state of the previous run
+        self.previous = {}
+        # zone name -> state of this run
+        self.current = {}
+        if Filename and os.path.exists(Filename):
+            self.load()
+
+    def load(self):
+        with open(self.filename) as state_file:
+            data = json.load(state_file)
+        if data.get("version") != ZoneStates.VERSION:
+            raise ValueError("State file %s has unknown version %s" % (self.filename, data.get("version")))
+        self.previous = data["zones"]
+
+    def save(self, complete: bool = True):
+        """
+        Write states of this run.
+        :param complete: this run covered all zones, drop zones not seen. Otherwise keep their previous states.
+        """
+        zones = dict(self.current)
+        if not complete:
+            for zone in self.previous:
+                zones.setdefault(zone, self.previous[zone])
+        data = {
+            "version": ZoneStates.VERSION,
+            "created": datetime.now().isoformat(timespec='seconds'),
+            "zones": {zone: zones[zone] for zone in sorted(zones)}
+        }
+        # Replace atomically, a crashed run leaves the previous states in place
+        tmp_filename = '%s.%d.tmp' % (self.filename, os.getpid())
+        with open(tmp_filename, 'w') as state_file:
+            json.dump(data, state_file, separators=(',', ':'))
+        os.replace(tmp_filename, self.filename)
+
+    def update(self, report: ZoneReport, now: float = None):
+        """
+        Record the state of a zone in this run.
+        :return: bool, True if the state differs from the previous run or the zone is new
+        """
+        if now is None:
+            now = time.time()
+        state = {
+            "keys": ZoneStates.get_keys(report.keys),
+            "ds_tags": report.get_ds_tags(),
+            "phase": report.phase,
+            "checked": int(now)
+        }
+        self.current[report.zone] = state
+
+        previous = self.previous.get(report.zone)
+        if previous is None:
+            return True
+
+        return (previous["keys"], previous["ds_tags"], previous["phase"]) != \
+            (state["keys"], state["ds_tags"], state["phase"])
+
+    def keep(self, zone: ODS, max_age: float, now: float = None):
+        """
+        Carry the previous state of a zone over to this run without checking it again, if that is safe:
+        the zone was steady, its keys haven't changed in the enforcer and DNS was checked at most
+        max_age seconds ago.
+        :return: bool, True if the state was kept and the zone needs no checking
+        """
+        if now is None:
+            now = time.time()
+        previous = self.previous.get(zone.zone)
+        if previous is None or previous["phase"] not in ZoneStates.STEADY_PHASES:
+            return False
+        if previous["checked"] + max_age < now:
+            return False
+        if previous["keys"] != ZoneStates.get_keys(zone.keys):
+            return False
+
+        self.current[zone.zone] = previous
+
+        return True
+
+    def get_removed(self):
+        """
+        :return: list of zone names in the previous run, but not in this one
+        """
+        return sorted([zone for zone in self.previous if zone not in self.current])
+
+    @staticmethod
+    def get_keys(keys: dict):
+        """
+        :param keys: dict, keytag -> OdsKey
+        :return: list of [keytag, state, next transition], JSON-friendly
+        """
+        ret = []
+        for keytag in sorted(keys):
+            key = keys[keytag]
+            next_transition = key.next_transition.isoformat() if key.next_transition else None
+            ret.append([key.tag, key.state, next_transition])
+
+        return ret
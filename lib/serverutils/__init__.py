@@ -0,0 +1 @@
+from .status_server import *
@@ -0,0 +1,164 @@
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+
+class ZoneStatusStore:
+    """
+    Latest status of every zone, ready to be served.
+    Statuses are serialized into JSON once when stored, not on every request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # zone name -> JSON bytes
+        self._zones = {}
+        self._all_zones = None
+        self.updated = None
+
+    def replace(self, statuses: dict):
+        """
+        Replace statuses of all zones at once.
+        :param statuses: dict, zone name -> JSON-serializable status
+        """
+        updated = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        zones = {}
+        for zone in sorted(statuses.keys()):
+            zones[ZoneStatusStore.normalize(zone)] = json.dumps(statuses[zone]).encode('utf-8')
+        all_zones = b''.join([('{"updated": "%s", "zones": [' % updated).encode('utf-8'),
+                              b', '.join(zones.values()),
+                              b']}'])
+
+        with self._lock:
+            self._zones = zones
+            self._all_zones = all_zones
+            self.updated = updated
+
+    def get(self, zone: str):
+        """
+        :return: JSON bytes or None, if zone is not known
+        """
+        with self._lock:
+            return self._zones.get(ZoneStatusStore.normalize(zone))
+
+    def get_all(self):
+        with self._lock:
+            return self._all_zones
+
+    @staticmethod
+    def normalize(zone: str):
+        return zone.rstrip('.').lower()
+
+
+class StatusRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET /zones and GET /zones/<name>. Everything is answered from ZoneStatusStore.
+    GET /metrics, if the server has metrics.
+    """
+    server_version = 'dnssec-ods-ksk-helper'
+
+    def do_GET(self):
+        store = self.server.store
+        path = self.path.split('?', 1)[0].rstrip('/')
+        if path == '/zones':
+            body = store.get_all()
+            if body is None:
+                return self._send_error(503, 'Zone statuses not available yet')
+            return self._send_json(200, body)
+
+        if path == '/metrics' and self.server.metrics:
+            return self._send(200, self.server.metrics.CONTENT_TYPE, self.server.metrics.render().encode('utf-8'))
+
+        if path.startswith('/zones/'):
+            zone = unquote(path[len('/zones/'):])
+            body = store.get(zone)
+            if body is None:
+                if store.updated is None:
+                    return self._send_error(503, 'Zone statuses not available yet')
+                return self._send_error(404, "Zone %s doesn't exist!" % zone)
+            return self._send_json(200, body)
+
+        self._send_error(404, 'Not found. Use /zones, /zones/<name> or /metrics')
+
+    def log_message(self, format: str, *args):
+        # Monitoring polls a lot, don't log every request
+        pass
+
+    def _send_error(self, status: int, message: str):
+        self._send_json(status, json.dumps({'error': message}).encode('utf-8'))
+
+    def _send_json(self, status: int, body: bytes):
+        self._send(status, 'application/json', body)
+
+    def _send(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StatusServer:
+    """
+    Long-running daemon mode: statuses of zones are refreshed periodically and
+    served over HTTP from memory.
+    HTTP-requests are answered in threads, refresh runs in the thread calling serve().
+    """
+    DEFAULT_PORT = 8053
+    DEFAULT_ADDRESS = '127.0.0.1'
+    DEFAULT_INTERVAL = 300
+
+    def __init__(self, Refresh, Address: str = DEFAULT_ADDRESS, Port: int = DEFAULT_PORT,
+                 Interval: float = DEFAULT_INTERVAL, Metrics=None):
+        """
+        :param Refresh: callable returning dict, zone name -> JSON-serializable status
+        :param Metrics: ZoneMetrics to serve at /metrics, kept up-to-date by Refresh
+        """
+        self.refresh = Refresh
+        self.address = Address
+        self.port = Port
+        self.interval = Interval
+        self.store = ZoneStatusStore()
+        self.metrics = Metrics
+        self.httpd = None
+        self._stop = threading.Event()
+
+    def serve(self):
+        """
+        Serve until interrupted.
+        """
+        self.httpd = ThreadingHTTPServer((self.address, self.port), StatusRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.store = self.store
+        self.httpd.metrics = self.metrics
+        http_thread = threading.Thread(target=self.httpd.serve_forever, name='http', daemon=True)
+        http_thread.start()
+        print("Serving zone statuses at http://%s:%d/zones" % self.httpd.server_address[:2])
+
+        try:
+            while not self._stop.is_set():
+                self._refresh()
+                self._stop.wait(self.interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+    def stop(self):
+        self._stop.set()
+
+    def _refresh(self):
+        start = time.monotonic()
+        try:
+            statuses = self.refresh()
+        except Exception as exc:
+            # Keep serving the previous statuses
+            print("Warning: Refreshing zone statuses failed: %s" % exc)
+            return
+
+        self.store.replace(statuses)
+        print("Refreshed status of %d zones in %.1f seconds" % (len(statuses), time.monotonic() - start))
@@ -0,0 +1,268 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+
+# Span being run in the current thread or asyncio-task. Tasks inherit it from the code creating them.
+_CURRENT_SPAN = contextvars.ContextVar('current_span', default=None)
+_SPAN_IDS = itertools.count(1)
+
+
+class Span:
+    """
+    A timed operation. Attributes can be added while it runs: span.set(rcode='NOERROR')
+    """
+
+    def __init__(self, Tracer, Name: str, Category: str, Args: dict):
+        self.tracer = Tracer
+        self.name = Name
+        self.category = Category
+        self.args = Args
+        self.start = None
+        self.lane = None
+        self.id = next(_SPAN_IDS)
+        self.parent_id = None
+        self._token = None
+
+    def __enter__(self):
+        parent = _CURRENT_SPAN.get()
+        if parent is not None:
+            self.parent_id = parent.id
+        self._token = _CURRENT_SPAN.set(self)
+        # Taken when the span starts. Tasks running meanwhile can't get the same lane, even if they finish first.
+        self.lane = self.tracer._get_lane()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        try:
+            _CURRENT_SPAN.reset(self._token)
+        except ValueError:
+            # Exited in another context than entered
+            pass
+        self.tracer.record(self, end)
+
+        return False
+
+    def set(self, **args):
+        self.args.update(args)
+
+
+class NullSpan:
+    """
+    What a disabled tracer hands out. Does nothing.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Tracer:
+    """
+    Timed spans of enforcer commands, parsing and DNS-queries of a run.
+    Written out in Chrome trace event format, viewable in chrome://tracing or https://ui.perfetto.dev
+    Disabled by default. When disabled, span() returns a shared NullSpan and nothing is recorded.
+    Each thread and each running asyncio-task gets its own lane (tid) in the trace, so spans in a lane nest
+    properly. Lanes of finished tasks are reused, the trace has as many lanes as tasks ever ran at the same time.
+    Spans know their parent span, also when run in an asyncio-task created within the parent.
+    """
+    DEFAULT_MAX_SPANS = 1000000
+
+    def __init__(self):
+        self.enabled = False
+        self.max_spans = Tracer.DEFAULT_MAX_SPANS
+        self.dropped = 0
+        self._origin = time.perf_counter()
+        # (name, category, lane, start, end, args, span id, parent span id)
+        self._spans = []
+        # Running task or id of thread -> lane
+        self._lanes = {}
+        # lane -> name of lane, name of the first thread or task in it
+        self._lane_names = {}
+        # Lanes of finished tasks, lowest reused first
+        self._free_lanes = []
+        self._lock = threading.Lock()
+
+    def enable(self, max_spans: int = DEFAULT_MAX_SPANS):
+        self.max_spans = max_spans
+        self._origin = time.perf_counter()
+        self.enabled = True
+
+    def span(self, name: str, category: str, **args):
+        """
+        with TRACER.span('dns query', 'dns', server=address) as span: ...
+        Arguments are converted to text only when the trace is written out.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+
+        return Span(self, name, category, args)
+
+    def record(self, span: Span, end: float):
+        if len(self._spans) >= self.max_spans:
+            self.dropped += 1
+            return
+        self._spans.append((span.name, span.category, span.lane, span.start, end, span.args, span.id,
+                            span.parent_id))
+
+    def iter_timed(self, iterable, span):
+        """
+        Pass items of iterable through, adding time spent waiting for them into span as wait_ms.
+        Time spent by the consumer, eg. parsing a streamed output, is the rest of the span.
+        """
+        if not self.enabled:
+            yield from iterable
+            return
+
+        waited = 0.0
+        items = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(items)
+            except StopIteration:
+                break
+            finally:
+                waited += time.perf_counter() - start
+                span.set(wait_ms=round(waited * 1000, 3))
+            yield item
+
+    def __len__(self):
+        return len(self._spans)
+
+    def to_json(self):
+        """
+        :return: dict in Chrome trace event format
+        """
+        pid = os.getpid()
+        events = []
+        with self._lock:
+            lanes = sorted(self._lane_names.items())
+        for (lane, lane_name) in lanes:
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": lane, "args": {"name": lane_name}})
+        for (name, category, lane, start, end, args, _, _) in self._spans:
+            events.append({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round((start - self._origin) * 1000000, 1),
+                "dur": round((end - start) * 1000000, 1),
+                "pid": pid,
+                "tid": lane,
+                "args": args
+            })
+
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"dropped_spans": self.dropped}}
+
+    def write(self, filename: str):
+        with open(filename, 'w') as trace_file:
+            # Arguments can be anything, eg. dns.name.Name
+            json.dump(self.to_json(), trace_file, default=str)
+
+    def get_summary(self):
+        """
+        Time spent per span name. Self time excludes time when any child span was running.
+        Children can run concurrently, eg. hedged DNS-queries in asyncio-tasks of their own, their time is
+        subtracted only once.
+        :return: list of tuples (name, category, count, total seconds, self seconds, max seconds),
+                 largest self time first
+        """
+        # parent span id -> list of (start, end) of children
+        children = {}
+        for span in self._spans:
+            if span[7] is not None:
+                children.setdefault(span[7], []).append((span[3], span[4]))
+
+        totals = {}
+        for (name, category, _, start, end, _, span_id, _) in self._spans:
+            seconds = end - start
+            child_seconds = Tracer._get_covered(children.get(span_id, []), start, end)
+            if name not in totals:
+                totals[name] = [name, category, 0, 0.0, 0.0, 0.0]
+            total = totals[name]
+            total[2] += 1
+            total[3] += seconds
+            total[4] += max(seconds - child_seconds, 0.0)
+            total[5] = max(total[5], seconds)
+
+        return sorted([tuple(total) for total in totals.values()], key=lambda total: total[4], reverse=True)
+
+    def format_summary(self, top: int = 15):
+        """
+        :return: list of lines, table of the top time consumers
+        """
+        lines = ["%-32s %-10s %8s %10s %10s %10s %10s" % ('Span', 'Category', 'Count', 'Self ms', 'Total ms',
+                                                        'Mean ms', 'Max ms')]
+        for (name, category, count, total, self_total, longest) in self.get_summary()[:top]:
+            lines.append("%-32s %-10s %8d %10.1f %10.1f %10.2f %10.2f" % (name, category, count, self_total * 1000,
+                                                                        total * 1000, total * 1000 / count,
+                                                                        longest * 1000))
+        if self.dropped:
+            lines.append("%d spans dropped, more than %d recorded" % (self.dropped, self.max_spans))
+
+        return lines
+
+    @staticmethod
+    def _get_covered(intervals: list, start: float, end: float):
+        """
+        :return: seconds of start..end covered by any of the intervals
+        """
+        covered = 0.0
+        covered_end = start
+        for (interval_start, interval_end) in sorted(intervals):
+            interval_start = max(interval_start, covered_end)
+            interval_end = min(interval_end, end)
+            if interval_end > interval_start:
+                covered += interval_end - interval_start
+                covered_end = interval_end
+
+        return covered
+
+    def _get_lane(self):
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = task if task else threading.get_ident()
+
+        lane = self._lanes.get(key)
+        if lane is None:
+            with self._lock:
+                if key not in self._lanes:
+                    if self._free_lanes:
+                        lane = heapq.heappop(self._free_lanes)
+                    else:
+                        lane = len(self._lane_names) + 1
+                        self._lane_names[lane] = task.get_name() if task else threading.current_thread().name
+                    self._lanes[key] = lane
+                    if task:
+                        task.add_done_callback(self._release_lane)
+                lane = self._lanes[key]
+
+        return lane
+
+    def _release_lane(self, task: asyncio.Task):
+        with self._lock:
+            lane = self._lanes.pop(task, None)
+            if lane is not None:
+                heapq.heappush(self._free_lanes, lane)
+
+
+# The one tracer of a run, see Tracer.enable()
+TRACER = Tracer()
@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+from lib.odsutils import ActionQueue, EnforcerAction, ODS, OdsEnforcerCli
+
+# Stand-in for ods-enforcer: ds-seen succeeds, ds-gone fails like enforcer does for an unknown key
+FAKE_ENFORCER = '''#!/bin/sh
+case "$1" in
+    "key ds-seen") echo "1 KSK matches found." ;;
+    *) echo "No key matched" >&2; exit 1 ;;
+esac
+'''
+
+
+class ActionQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp_dir.name, 'ods-enforcer')
+        with open(path, 'w') as enforcer_file:
+            enforcer_file.write(FAKE_ENFORCER)
+        os.chmod(path, 0o755)
+        self.saved_path = os.environ.get('PATH', '')
+        os.environ['PATH'] = '%s:%s' % (self.tmp_dir.name, self.saved_path)
+        self.saved_backend = ODS.backend
+        ODS.backend = OdsEnforcerCli()
+
+    def tearDown(self):
+        ODS.backend = self.saved_backend
+        os.environ['PATH'] = self.saved_path
+        self.tmp_dir.cleanup()
+
+    def test_failed_command(self):
+        queue = ActionQueue(MaxConcurrent=2)
+        seen = queue.add('example.fi', EnforcerAction.DS_SEEN, 12345)
+        gone = queue.add('example.fi', EnforcerAction.DS_GONE, 54321)
+        queue.run()
+        self.assertEqual(EnforcerAction.STATUS_RUN, seen.status)
+        self.assertEqual("1 KSK matches found.", seen.output)
+        self.assertEqual(EnforcerAction.STATUS_FAILED, gone.status)
+        self.assertEqual("No key matched", gone.output)
+        self.assertEqual([seen], queue.get_unverified())
+
+
+if __name__ == '__main__':
+    unittest.main()
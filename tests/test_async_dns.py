@@ -0,0 +1,208 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+import dns.message
+import dns.name
+import dns.rdatatype
+import dns.rrset
+from lib.dnsutils import AsyncDNS, Delegation
+
+ROOT = '192.0.2.1'
+# Zone served by each address. ns3.fi has no glue, nor address.
+SERVERS = {ROOT: '.', '192.0.2.10': 'fi.', '192.0.2.11': 'fi.', '192.0.2.20': 'example.fi.'}
+NAMESERVERS = {
+    '.': [('a.root.test.', ROOT)],
+    'fi.': [('ns1.fi.', '192.0.2.10'), ('ns2.fi.', '192.0.2.11'), ('ns3.fi.', None)],
+    'example.fi.': [('ns.example.fi.', '192.0.2.20')]
+}
+DS = '12345 8 2 %064x' % 1
+
+
+def _add_nameservers(response: dns.message.Message, zone: str, section: list):
+    section.append(dns.rrset.from_text_list(zone, 3600, 'IN', 'NS', [host for (host, _) in NAMESERVERS[zone]]))
+    for (host, address) in NAMESERVERS[zone]:
+        if address:
+            response.additional.append(dns.rrset.from_text(host, 3600, 'IN', 'A', address))
+
+
+def answer(query: dns.message.Message, address: str):
+    """
+    Authoritative answer or referral of a server in the fake tree.
+    """
+    response = dns.message.make_response(query)
+    question = query.question[0]
+    served = dns.name.from_text(SERVERS[address])
+    if question.rdtype == dns.rdatatype.NS and question.name == served:
+        _add_nameservers(response, SERVERS[address], response.answer)
+        return response
+    for zone in NAMESERVERS:
+        cut = dns.name.from_text(zone)
+        if cut != served and cut.is_subdomain(served) and question.name.is_subdomain(cut):
+            if question.rdtype == dns.rdatatype.DS and question.name == cut:
+                response.answer.append(dns.rrset.from_text(cut, 3600, 'IN', 'DS', DS))
+            else:
+                _add_nameservers(response, zone, response.authority)
+            return response
+
+    return response
+
+
+class AsyncDnsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ns_queries = []
+
+    def _make_client(self, child: bool = False):
+        dns_client = AsyncDNS(Child=child)
+        dns_client.resolver.nameservers = [ROOT]
+
+        async def query_hedged(query: dns.message.Message, addresses: list, tcp: bool = False):
+            address = sorted(addresses)[0]
+            if query.question[0].rdtype == dns.rdatatype.NS:
+                self.ns_queries.append((query.question[0].name.to_text(), SERVERS[address]))
+            # Network latency, lookups running alongside get their turn
+            await asyncio.sleep(0.01)
+            return answer(query, address), address
+
+        async def timed_query(query: dns.message.Message, address: str, tcp: bool = False, timeout: float = None):
+            if address == '192.0.2.11':
+                # Connection closed in middle of the response
+                raise EOFError()
+            return answer(query, address), address
+
+        async def resolve_all_addresses(delegation):
+            pass
+
+        dns_client._query_hedged = query_hedged
+        dns_client._timed_query = timed_query
+        dns_client._resolve_all_addresses = resolve_all_addresses
+
+        return dns_client
+
+    def test_propagation_failed_servers(self):
+        async def get_propagation():
+            dns_client = self._make_client()
+            try:
+                return await dns_client.get_ds_propagation('example.fi')
+            finally:
+                await dns_client.close()
+
+        propagation = asyncio.run(get_propagation())
+        self.assertEqual([('ns1.fi.', {12345})], [(server.host, server.get_keytags())
+                                                  for server in propagation.get_answered()])
+        self.assertEqual([('ns2.fi.', '192.0.2.11'), ('ns3.fi.', None)],
+                         sorted([(server.host, server.address) for server in propagation.get_failed()]))
+        # Not all servers were checked
+        self.assertFalse(propagation.is_consistent())
+
+    def test_child_keys_reuse_parent_walk(self):
+        async def get_ds():
+            dns_client = self._make_client(child=True)
+            try:
+                return await dns_client.get_ds('example.fi'), dns_client.child_keys['example.fi']
+            finally:
+                await dns_client.close()
+
+        ((_, ds), child_keys) = asyncio.run(get_ds())
+        self.assertEqual({12345}, set(ds.keys()))
+        self.assertIsNone(child_keys.error)
+        # Root and fi are walked once, the zone itself is one hop from fi
+        self.assertEqual([('.', '.'), ('fi.', '.'), ('example.fi.', 'fi.')], self.ns_queries)
+
+
+class ResolveAddressesTest(unittest.TestCase):
+    ADDRESSES = {
+        ('ns1.fi.', 'A'): '192.0.2.10', ('ns1.fi.', 'AAAA'): '2001:db8::10',
+        ('ns2.fi.', 'A'): '192.0.2.11', ('ns2.fi.', 'AAAA'): '2001:db8::11',
+        ('ns3.fi.', 'A'): '192.0.2.12', ('ns3.fi.', 'AAAA'): '2001:db8::12',
+    }
+
+    def test_missing_family_resolved(self):
+        resolved = []
+
+        async def resolve(host: dns.name.Name, rr_type: str):
+            resolved.append((host.to_text(), rr_type))
+            address = self.ADDRESSES[(host.to_text(), rr_type)]
+            return mock.Mock(rrset=dns.rrset.from_text(host, 3600, 'IN', rr_type, address))
+
+        # Glue for IPv4 only, for IPv6 only, and none at all
+        delegation = Delegation(Zone=dns.name.from_text('fi'), Nameservers={
+            dns.name.from_text('ns1.fi'): ['192.0.2.10'],
+            dns.name.from_text('ns2.fi'): ['2001:db8::11'],
+            dns.name.from_text('ns3.fi'): [],
+        }, Expires=time.time() + 3600)
+
+        async def resolve_all():
+            dns_client = AsyncDNS()
+            try:
+                with mock.patch.object(dns_client.resolver, 'resolve', resolve):
+                    await dns_client._resolve_all_addresses(delegation)
+            finally:
+                await dns_client.close()
+
+        asyncio.run(resolve_all())
+        self.assertEqual([('ns1.fi.', 'AAAA'), ('ns2.fi.', 'A'), ('ns3.fi.', 'A'), ('ns3.fi.', 'AAAA')],
+                         sorted(resolved))
+        for host in delegation.nameservers:
+            expected = [self.ADDRESSES[(host.to_text(), rr_type)] for rr_type in ('A', 'AAAA')]
+            self.assertEqual(sorted(expected), sorted(delegation.nameservers[host]))
+        self.assertEqual({}, delegation.get_missing_families())
+
+
+class QueryHedgedTest(unittest.TestCase):
+    ADDRESSES = ['192.0.2.1', '192.0.2.2', '192.0.2.3']
+
+    def _run(self, answering: str = None, cancel: bool = False):
+        """
+        Hedged query to servers never answering but the one given.
+        :return: tuple (result or exception, addresses queried, addresses whose query still ran after the return)
+        """
+        queried = []
+        running = set()
+
+        async def timed_query(query: dns.message.Message, address: str, tcp: bool = False):
+            queried.append(address)
+            running.add(address)
+            try:
+                await asyncio.sleep(0.05 if address == answering else 60)
+                return dns.message.make_response(query), address
+            finally:
+                running.discard(address)
+
+        async def query_hedged():
+            dns_client = AsyncDNS()
+            dns_client._timed_query = timed_query
+            query = dns.message.make_query('example.fi', dns.rdatatype.DS)
+            try:
+                with mock.patch.object(dns_client.server_stats, 'get_hedge_delay', return_value=0.01):
+                    task = asyncio.ensure_future(dns_client._query_hedged(query, self.ADDRESSES))
+                    if cancel:
+                        await asyncio.sleep(0.1)
+                        task.cancel()
+                    try:
+                        result = await task
+                    except BaseException as exc:
+                        result = exc
+                    return result, sorted(queried), sorted(running)
+            finally:
+                await dns_client.close()
+
+        return asyncio.run(query_hedged())
+
+    def test_losers_cancelled(self):
+        (result, queried, running) = self._run(answering='192.0.2.3')
+        self.assertEqual('192.0.2.3', result[1])
+        self.assertEqual(self.ADDRESSES, queried)
+        self.assertEqual([], running)
+
+    def test_cancelled_caller_cancels_queries(self):
+        (result, queried, running) = self._run(cancel=True)
+        self.assertIsInstance(result, asyncio.CancelledError)
+        self.assertEqual(self.ADDRESSES, queried)
+        # Cancelled and finished by the time the caller sees the cancellation
+        self.assertEqual([], running)
+
+
+if __name__ == '__main__':
+    unittest.main()
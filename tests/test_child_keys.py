@@ -0,0 +1,123 @@
+import base64
+import unittest
+import dns.dnssec
+import dns.name
+import dns.rrset
+from lib.dnsutils import ChildKeys
+from lib.reportutils import DsCheck
+
+ZONE = 'example.fi'
+ADDRESS = '192.0.2.20'
+# Ed25519, any 32 bytes do for digests
+KSK = '257 3 15 %s' % base64.b64encode(bytes(range(32))).decode()
+OTHER_KSK = '257 3 15 %s' % base64.b64encode(bytes(range(1, 33))).decode()
+ZSK = '256 3 15 %s' % base64.b64encode(bytes(range(2, 34))).decode()
+WRONG_DIGEST = 'ab' * 32
+
+
+def make_rrset(rdtype: str, *rdatas):
+    return dns.rrset.from_text(ZONE + '.', 3600, 'IN', rdtype, *rdatas)
+
+
+def get_ds(dnskey: str, digest_type: int = 2):
+    """
+    :return: tuple (keytag, DS-digest in hex)
+    """
+    rdata = make_rrset('DNSKEY', dnskey)[0]
+    ds = dns.dnssec.make_ds(dns.name.from_text(ZONE), rdata, digest_type, validating=True)
+
+    return ds.key_tag, ds.digest.hex()
+
+
+KSK_TAG, KSK_DIGEST = get_ds(KSK)
+OTHER_TAG, OTHER_DIGEST = get_ds(OTHER_KSK)
+ZSK_TAG, _ = get_ds(ZSK)
+
+
+def make_parent_ds(keytag: int, digest: str, digest_type: int = 2):
+    # As returned by DNS.get_ds()
+    return {keytag: {"keytag": keytag, "keyalgo": 15, "keylabels": digest_type, "key": digest}}
+
+
+def make_child(cds: list = None, cdnskeys: list = None):
+    return ChildKeys.from_answers(ZONE, ADDRESS, make_rrset('DNSKEY', KSK, ZSK),
+                                  make_rrset('CDS', *cds) if cds else None,
+                                  make_rrset('CDNSKEY', *cdnskeys) if cdnskeys else None)
+
+
+class ChildKeysTest(unittest.TestCase):
+
+    def test_from_answers(self):
+        child = make_child(cds=['%d 15 2 %s' % (KSK_TAG, KSK_DIGEST)], cdnskeys=[KSK, OTHER_KSK])
+        self.assertEqual(ADDRESS, child.address)
+        # Only keys with SEP-flag can have a DS
+        self.assertEqual({KSK_TAG}, child.get_keytags())
+        self.assertEqual(KSK_DIGEST, child.get_digest(KSK_TAG, 2))
+        self.assertEqual(get_ds(KSK, 1)[1], child.get_digest(KSK_TAG, 1))
+        self.assertEqual(get_ds(KSK, 4)[1], child.get_digest(KSK_TAG, 4))
+        self.assertIsNone(child.get_digest(KSK_TAG, 3))
+        self.assertIsNone(child.get_digest(ZSK_TAG, 2))
+        self.assertEqual({KSK_TAG: True, OTHER_TAG: False}, child.cdnskeys)
+        self.assertEqual({KSK_TAG: {"keytag": KSK_TAG, "keyalgo": 15, "keylabels": 2, "key": KSK_DIGEST}}, child.cds)
+        self.assertEqual({
+            "address": ADDRESS,
+            "error": None,
+            "dnskey_tags": [KSK_TAG],
+            "cds": [child.cds[KSK_TAG]],
+            "cdnskey_tags": sorted([KSK_TAG, OTHER_TAG])
+        }, child.to_json())
+
+    def test_delete_requests(self):
+        # RFC 8078: CDS and CDNSKEY with algorithm 0 request deleting the DS
+        child = make_child(cds=['0 0 0 00'], cdnskeys=['0 3 0 AA=='])
+        self.assertEqual({}, child.cdnskeys)
+        self.assertEqual(0, child.cds[0]["keyalgo"])
+        self.assertEqual([], DsCheck.check(make_parent_ds(KSK_TAG, KSK_DIGEST), {}, child))
+
+    def test_no_answers(self):
+        child = ChildKeys.from_answers(ZONE, ADDRESS, None, None, None)
+        self.assertEqual(set(), child.get_keytags())
+        self.assertEqual(({}, {}), (child.cds, child.cdnskeys))
+
+
+class DsCheckTest(unittest.TestCase):
+
+    def test_check(self):
+        child = make_child()
+        # (description, DS at parent, DS exported by enforcer, child, problems as (keytag, problem))
+        cases = [
+            ('all match', make_parent_ds(KSK_TAG, KSK_DIGEST), {KSK_TAG: [15, 2, KSK_DIGEST]}, child, []),
+            ('digest case ignored', make_parent_ds(KSK_TAG, KSK_DIGEST.upper()),
+             {KSK_TAG: [15, 2, KSK_DIGEST.upper()]}, child, []),
+            ('SHA-1 at parent', make_parent_ds(KSK_TAG, get_ds(KSK, 1)[1], 1), {KSK_TAG: [15, 2, KSK_DIGEST]},
+             child, []),
+            ('no DS', None, {}, child, []),
+            ('no DNSKEY', make_parent_ds(OTHER_TAG, OTHER_DIGEST), {}, child, [(OTHER_TAG, DsCheck.NO_DNSKEY)]),
+            ('ZSK is no DNSKEY for DS', make_parent_ds(ZSK_TAG, WRONG_DIGEST), {}, child,
+             [(ZSK_TAG, DsCheck.NO_DNSKEY)]),
+            ('parent digest', make_parent_ds(KSK_TAG, WRONG_DIGEST), {KSK_TAG: [15, 2, KSK_DIGEST]}, child,
+             [(KSK_TAG, DsCheck.PARENT_DIGEST)]),
+            ('enforcer digest', make_parent_ds(KSK_TAG, KSK_DIGEST), {KSK_TAG: [15, 2, WRONG_DIGEST]}, child,
+             [(KSK_TAG, DsCheck.PARENT_ENFORCER), (KSK_TAG, DsCheck.ENFORCER_DIGEST)]),
+            ('enforcer digest, DS not at parent', None, {KSK_TAG: [15, 2, WRONG_DIGEST]}, child,
+             [(KSK_TAG, DsCheck.ENFORCER_DIGEST)]),
+            ('CDS digest', None, {}, make_child(cds=['%d 15 2 %s' % (KSK_TAG, WRONG_DIGEST)]),
+             [(KSK_TAG, DsCheck.CDS_DIGEST)]),
+            ('CDS without DNSKEY', None, {}, make_child(cds=['%d 15 2 %s' % (OTHER_TAG, OTHER_DIGEST)]),
+             [(OTHER_TAG, DsCheck.CDS_DIGEST)]),
+            ('CDS match', None, {}, make_child(cds=['%d 15 2 %s' % (KSK_TAG, KSK_DIGEST)]), []),
+            ('CDNSKEY unknown', None, {}, make_child(cdnskeys=[KSK, OTHER_KSK]),
+             [(OTHER_TAG, DsCheck.CDNSKEY_UNKNOWN)]),
+        ]
+        for (description, ds, ds_info, child_keys, problems) in cases:
+            with self.subTest(description):
+                checks = DsCheck.check(ds, ds_info, child_keys)
+                self.assertEqual(problems, [(check.keytag, check.problem) for check in checks])
+
+    def test_to_json(self):
+        self.assertEqual({"keytag": KSK_TAG, "problem": DsCheck.PARENT_DIGEST},
+                         DsCheck(Keytag=KSK_TAG, Problem=DsCheck.PARENT_DIGEST).to_json())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from lib.dnsutils import DiskCache
+
+
+class DiskCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp_dir.name, 'cache.db')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_write_visible_to_other_connection(self):
+        cache = DiskCache(Filename=self.filename)
+        try:
+            cache.put_ds('example.fi', '192.0.2.1', {12345: {"keytag": 12345}}, 3600)
+            # Another process sharing the file: no lock held, write already committed
+            other = sqlite3.connect(self.filename, timeout=0.1)
+            self.assertEqual(1, other.execute("SELECT COUNT(*) FROM dns_cache").fetchone()[0])
+            other.execute("INSERT INTO dns_cache VALUES ('other', '1', 1e12, 1)")
+            other.commit()
+            other.close()
+            self.assertEqual(('192.0.2.1', {12345: {"keytag": 12345}}), cache.get_ds('example.fi'))
+            self.assertEqual(1, cache.get('other')[0])
+        finally:
+            cache.close()
+
+    def test_pruned_while_open(self):
+        cache = DiskCache(Filename=self.filename, MaxEntries=5)
+        try:
+            for idx in range(DiskCache.PRUNE_INTERVAL):
+                cache.put('key%d' % idx, idx, 3600)
+            count = cache.db.execute("SELECT COUNT(*) FROM dns_cache").fetchone()[0]
+            self.assertEqual(5, count)
+        finally:
+            cache.close()
+
+    def test_hit_updates_access_time_rarely(self):
+        cache = DiskCache(Filename=self.filename)
+        try:
+            cache.put('key', 'value', 3600)
+            changes = cache.db.total_changes
+            self.assertEqual('value', cache.get('key')[0])
+            # Accessed just now, no write
+            self.assertEqual(changes, cache.db.total_changes)
+
+            accessed = time.time() - DiskCache.ACCESS_RESOLUTION - 1
+            cache.db.execute("UPDATE dns_cache SET accessed = ?", (accessed,))
+            changes = cache.db.total_changes
+            self.assertEqual('value', cache.get('key')[0])
+            self.assertEqual(changes + 1, cache.db.total_changes)
+            self.assertLess(accessed, cache.db.execute("SELECT accessed FROM dns_cache").fetchone()[0])
+        finally:
+            cache.close()
+
+    def test_synchronous_normal(self):
+        cache = DiskCache(Filename=self.filename)
+        try:
+            # 1 = NORMAL
+            self.assertEqual(1, cache.db.execute("PRAGMA synchronous").fetchone()[0])
+        finally:
+            cache.close()
+
+    def test_close_while_locked(self):
+        cache = DiskCache(Filename=self.filename)
+        cache.put('key', 'value', 3600)
+        cache.db.execute("PRAGMA busy_timeout=100")
+        other = sqlite3.connect(self.filename, isolation_level=None)
+        try:
+            other.execute("BEGIN IMMEDIATE")
+            # Pruning can't get the write lock, closing still works
+            cache.close()
+        finally:
+            other.execute("ROLLBACK")
+            other.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
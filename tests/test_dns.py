@@ -0,0 +1,186 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+import dns.exception
+import dns.flags
+import dns.message
+import dns.name
+import dns.query
+import dns.rcode
+import dns.rdataclass
+import dns.rdatatype
+from lib.dnsutils import AsyncDNS, Delegation, DelegationCache, DiskCache, DNS, DsQueryError
+
+
+class DnsQueryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dns_client = DNS()
+        self.query = DNS.make_query('example.fi', dns.rdatatype.DS)
+
+    def _truncated(self, query: dns.message.Message, address: str, timeout: float):
+        response = dns.message.make_response(query)
+        response.flags |= dns.flags.TC
+
+        return response
+
+    def test_tcp_error_tries_next_server(self):
+        def tcp(query: dns.message.Message, address: str, timeout: float):
+            if address == '192.0.2.1':
+                raise ConnectionRefusedError(111, 'Connection refused')
+            if address == '192.0.2.2':
+                raise EOFError()
+            return dns.message.make_response(query)
+
+        # Make servers be tried in the given order
+        for (idx, address) in enumerate(['192.0.2.1', '192.0.2.2', '192.0.2.3']):
+            self.dns_client.server_stats.record_rtt(address, 0.01 * (idx + 1))
+        with mock.patch('lib.dnsutils.server_stats.random.random', return_value=1.0), \
+                mock.patch.object(dns.query, 'udp', self._truncated), mock.patch.object(dns.query, 'tcp', tcp):
+            (response, address) = self.dns_client._query(self.query, ['192.0.2.1', '192.0.2.2', '192.0.2.3'])
+        self.assertEqual('192.0.2.3', address)
+        self.assertEqual(self.query.id, response.id)
+
+    def test_all_servers_failing(self):
+        def tcp(query: dns.message.Message, address: str, timeout: float):
+            raise ConnectionResetError(104, 'Connection reset by peer')
+
+        with mock.patch.object(dns.query, 'udp', self._truncated), mock.patch.object(dns.query, 'tcp', tcp):
+            with self.assertRaises(ConnectionResetError):
+                self.dns_client._query(self.query, ['192.0.2.1', '192.0.2.2'])
+
+
+class DelegationCacheTest(unittest.TestCase):
+    PARENT = dns.name.from_text('example.com')
+    NAME = dns.name.from_text('sub.example.com')
+
+    def _parent(self):
+        return Delegation(Zone=self.PARENT, Nameservers={dns.name.from_text('ns1.example.com'): ['192.0.2.1']},
+                          Expires=time.time() + 3600)
+
+    @staticmethod
+    def _no_referral(query: dns.message.Message, addresses: list):
+        # Parent's nameserver is authoritative for the name: no NS-records, SOA in authority
+        response = dns.message.make_response(query)
+        response.flags |= dns.flags.AA
+        response.find_rrset(response.authority, dns.name.from_text('example.com'), dns.rdataclass.IN,
+                            dns.rdatatype.SOA, create=True)
+
+        return response, addresses[0]
+
+    def test_no_zone_cut_walked_once(self):
+        dns_client = DNS()
+        dns_client.delegations.put(self._parent())
+        with mock.patch.object(dns_client, '_query', side_effect=self._no_referral) as query:
+            self.assertEqual(self.PARENT, dns_client._get_delegation('sub.example.com').zone)
+            self.assertEqual(self.PARENT, dns_client._get_delegation('sub.example.com').zone)
+        self.assertEqual(1, query.call_count)
+        self.assertIsNone(dns_client.delegations.get(self.NAME))
+        self.assertEqual(self.PARENT, dns_client.delegations.get_authoritative(self.NAME).zone)
+
+    def test_async_no_zone_cut_walked_once(self):
+        async def walk():
+            dns_client = AsyncDNS()
+            dns_client.delegations.put(self._parent())
+
+            async def query_hedged(query: dns.message.Message, addresses: list):
+                return self._no_referral(query, addresses)
+
+            try:
+                with mock.patch.object(dns_client, '_query_hedged', side_effect=query_hedged) as query:
+                    zones = [(await dns_client._get_delegation('sub.example.com')).zone for _ in range(2)]
+                return zones, query.call_count
+            finally:
+                await dns_client.close()
+
+        (zones, call_count) = asyncio.run(walk())
+        self.assertEqual([self.PARENT, self.PARENT], zones)
+        self.assertEqual(1, call_count)
+
+    def test_enclosing_expires_with_zone_cut(self):
+        cache = DelegationCache()
+        parent = self._parent()
+        cache.put(parent)
+        cache.put_enclosing(self.NAME, parent)
+        self.assertIs(parent, cache.get_authoritative(self.NAME))
+        parent.expires = time.time() - 1
+        self.assertIsNone(cache.get_authoritative(self.NAME))
+
+    def test_enclosing_stored(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            storage = DiskCache(Filename=os.path.join(tmp_dir, 'cache.db'))
+            try:
+                cache = DelegationCache(Storage=storage)
+                parent = self._parent()
+                cache.put(parent)
+                cache.put_enclosing(self.NAME, parent)
+                # Next invocation
+                cache = DelegationCache(Storage=storage)
+                self.assertEqual(self.PARENT, cache.get_authoritative(self.NAME).zone)
+                self.assertEqual(['192.0.2.1'], cache.get_authoritative(self.NAME).get_addresses())
+            finally:
+                storage.close()
+
+
+class DsQueryErrorTest(unittest.TestCase):
+    ADDRESSES = ['192.0.2.1', '192.0.2.2']
+
+    @staticmethod
+    def _timeout(query: dns.message.Message, address: str, timeout: float):
+        raise dns.exception.Timeout(timeout=timeout)
+
+    @staticmethod
+    def _servfail(query: dns.message.Message, address: str, timeout: float):
+        response = dns.message.make_response(query)
+        response.set_rcode(dns.rcode.SERVFAIL)
+
+        return response
+
+    def _get_ds(self, udp):
+        dns_client = DNS()
+        with mock.patch.object(dns_client, '_get_delegation'), \
+                mock.patch.object(dns_client, '_get_addresses', return_value=self.ADDRESSES), \
+                mock.patch.object(dns.query, 'udp', udp):
+            return dns_client.get_ds('example.fi')
+
+    def test_no_answer_is_not_no_ds(self):
+        with self.assertRaises(DsQueryError) as context:
+            self._get_ds(self._timeout)
+        self.assertEqual('example.fi', context.exception.zone)
+        self.assertIsInstance(context.exception.error, dns.exception.Timeout)
+
+    def test_servfail_is_not_no_ds(self):
+        with self.assertRaises(DsQueryError):
+            self._get_ds(self._servfail)
+
+    def test_async_no_answer_is_not_no_ds(self):
+        async def udp(query: dns.message.Message, address: str, timeout: float):
+            raise dns.exception.Timeout(timeout=timeout)
+
+        async def get_ds():
+            dns_client = AsyncDNS()
+            dns_client.server_stats.timeout = 0.1
+
+            async def get_delegation(zone: str):
+                return None
+
+            async def get_addresses(delegation):
+                return self.ADDRESSES
+
+            with mock.patch.object(dns_client, '_get_delegation', get_delegation), \
+                    mock.patch.object(dns_client, '_get_addresses', get_addresses), \
+                    mock.patch('dns.asyncquery.udp', udp):
+                try:
+                    return await dns_client.get_ds('example.fi')
+                finally:
+                    await dns_client.close()
+
+        with self.assertRaises(DsQueryError):
+            asyncio.run(get_ds())
+
+
+if __name__ == '__main__':
+    unittest.main()
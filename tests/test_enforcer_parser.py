@@ -0,0 +1,125 @@
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+from lib.odsutils import ODS, OdsKey, iter_key_export, iter_list_keys, iter_list_keys_debug
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+from fake_fleet import Fleet
+
+# Output of ods-enforcer key list --verbose --keytype ksk
+LIST_KEYS = """Keys:
+Zone:                           Keytype: State:    Date of next transition: Size: Algorithm: CKA_ID:                          Repository:                      KeyTag:
+example.com                     KSK      active    2030-05-01 10:00:00      2048  8          6a1d8d0a4f0c4c5e9a1b2c3d4e5f6a7b SoftHSM                          12345
+example.com                     KSK      ready     waiting for ds-seen      2048  8          7b2e9e1b5a1d5d6f0b2c3d4e5f6a7b8c SoftHSM                          23456
+example.com                     KSK      retire    waiting for ds-gone      2048  8          8c3f0f2c6b2e6e7a1c3d4e5f6a7b8c9d SoftHSM                          34567
+example.com                     ZSK      active    2030-05-01 10:00:00      1024  8          9d4a1a3d7c3f7f8b2d4e5f6a7b8c9d0e SoftHSM                          45678
+
+example.com.sub                 KSK      publish   2030-06-01 12:30:00      2048  13         0e5b2b4e8d4a8a9c3e5f6a7b8c9d0e1f SoftHSM                          56789
+example.org                     KSK      generate  2030-06-01 12:30:00      2048  8          1f6c3c5f9e5b9b0d4f6a7b8c9d0e1f2a SoftHSM                          67890
+"""
+
+# Output of ods-enforcer key export --keytype ksk --keystate ready --ds, SHA-1 and SHA-256 for each key
+KEY_EXPORT = """;ready KSK DS record (SHA1):
+example.com.	3600	IN	DS	23456 8 1 0123456789abcdef0123456789abcdef01234567
+;ready KSK DS record (SHA256):
+example.com.	3600	IN	DS	23456 8 2 0123456789ABCDEF0123456789ABCDEF0123456789ABCDEF0123456789ABCDEF
+
+;ready KSK DS record (SHA1):
+example.org.	3600	IN	DS	34567 13 1 89abcdef0123456789abcdef0123456789abcdef
+;ready KSK DS record (SHA256):
+example.org.	3600	IN	DS	34567 13 2 89abcdef0123456789abcdef0123456789abcdef0123456789abcdef01234567
+
+"""
+
+# Output of ods-enforcer key list --verbose --keytype ksk --debug
+LIST_KEYS_DEBUG = """Keys:
+Zone:                           Key role:     DS:          DNSKEY:      RRSIGDNSKEY: RRSIG:       Pub: Act: Id:
+example.com                     KSK           omnipresent  omnipresent  omnipresent  NA           1    1    6a1d8d0a4f0c4c5e9a1b2c3d4e5f6a7b
+example.com                     KSK           rumoured     omnipresent  omnipresent  NA           1    1    7b2e9e1b5a1d5d6f0b2c3d4e5f6a7b8c
+example.com                     ZSK           NA           omnipresent  NA           omnipresent  1    1    9d4a1a3d7c3f7f8b2d4e5f6a7b8c9d0e
+"""
+
+
+class EnforcerParserTest(unittest.TestCase):
+
+    def test_list_keys(self):
+        keys = list(iter_list_keys(LIST_KEYS))
+        self.assertEqual([('example.com', 12345), ('example.com', 23456), ('example.com', 34567),
+                          ('example.com.sub', 56789)], [(zone, key.tag) for (zone, key) in keys])
+        (_, active) = keys[0]
+        self.assertEqual(OdsKey.ODS_ZONE_STATUS_ACTIVE, active.state)
+        self.assertEqual(datetime(2030, 5, 1, 10, 0, 0), active.next_transition)
+        self.assertEqual((2048, 8), (active.bits, active.algorithm))
+        # Waiting for the user: no transition date
+        (_, ready) = keys[1]
+        self.assertEqual((OdsKey.ODS_ZONE_STATUS_READY, None), (ready.state, ready.next_transition))
+        (_, retired) = keys[2]
+        self.assertEqual((OdsKey.ODS_ZONE_STATUS_RETIRE, None), (retired.state, retired.next_transition))
+        (_, published) = keys[3]
+        self.assertEqual((OdsKey.ODS_ZONE_STATUS_PUBLISH, 13), (published.state, published.algorithm))
+
+    def test_list_keys_of_zone(self):
+        # example.com.sub starts like example.com
+        self.assertEqual([12345, 23456, 34567], [key.tag for (_, key) in iter_list_keys(LIST_KEYS, 'example.com')])
+        # Key in a state not tracked
+        self.assertEqual([], list(iter_list_keys(LIST_KEYS, 'example.org')))
+
+    def test_list_keys_streamed(self):
+        lines = iter(LIST_KEYS.splitlines())
+        self.assertEqual(4, len(list(iter_list_keys(lines))))
+
+    def test_key_export(self):
+        records = list(iter_key_export(KEY_EXPORT))
+        self.assertEqual([
+            ('example.com', 23456, [8, 1, '0123456789abcdef0123456789abcdef01234567']),
+            ('example.com', 23456, [8, 2, '0123456789ABCDEF0123456789ABCDEF0123456789ABCDEF0123456789ABCDEF']),
+            ('example.org', 34567, [13, 1, '89abcdef0123456789abcdef0123456789abcdef']),
+            ('example.org', 34567, [13, 2, '89abcdef0123456789abcdef0123456789abcdef0123456789abcdef01234567']),
+        ], records)
+        # Of multiple digests of a key, the last one is kept
+        info = ODS._ods_enforcer_cmd_key_export_result(KEY_EXPORT, 'example.com')
+        self.assertEqual({23456: [8, 2, '0123456789ABCDEF0123456789ABCDEF0123456789ABCDEF0123456789ABCDEF']}, info)
+        self.assertIsNone(ODS._ods_enforcer_cmd_key_export_result(KEY_EXPORT, 'example.net'))
+        self.assertEqual(['example.com', 'example.org'],
+                         sorted(ODS._ods_enforcer_cmd_key_export_all_result(KEY_EXPORT)))
+
+    def test_list_keys_debug(self):
+        self.assertEqual([
+            ('example.com', '6a1d8d0a4f0c4c5e9a1b2c3d4e5f6a7b',
+             ['omnipresent', 'omnipresent', 'omnipresent', None, 1, 1]),
+            ('example.com', '7b2e9e1b5a1d5d6f0b2c3d4e5f6a7b8c',
+             ['rumoured', 'omnipresent', 'omnipresent', None, 1, 1]),
+        ], list(iter_list_keys_debug(LIST_KEYS_DEBUG, 'example.com')))
+
+    def test_empty_output(self):
+        self.assertIsNone(ODS._ods_enforcer_cmd_list_all_keys_result("Keys:\n\n"))
+        self.assertEqual([], list(iter_key_export("")))
+
+    def test_fleet_outputs(self):
+        fleet = Fleet(Zones=50)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fleet.write_enforcer_outputs(tmp_dir)
+            with open(os.path.join(tmp_dir, 'key-list.txt')) as output_file:
+                store = ODS._ods_enforcer_cmd_list_all_keys_result(output_file.read())
+            exported = {}
+            for state in ('publish', 'ready', 'retire'):
+                with open(os.path.join(tmp_dir, 'export-%s.txt' % state)) as output_file:
+                    for (zone, keytag, info) in iter_key_export(output_file.read()):
+                        exported[(zone, keytag, info[1])] = info[2]
+
+        self.assertEqual(fleet.get_zone_names(), store.get_zones())
+        for zone in fleet.zones:
+            for fake_key in zone.keys:
+                key = store.get_key(zone.name, fake_key.tag)
+                self.assertEqual(fake_key.state, key.state)
+                waiting = fake_key.transition.startswith('waiting')
+                self.assertEqual(waiting, key.next_transition is None)
+                if fake_key.state != OdsKey.ODS_ZONE_STATUS_ACTIVE:
+                    self.assertEqual(zone.get_ds(fake_key, 'SHA256').digest.hex(),
+                                     exported[(zone.name, fake_key.tag, 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
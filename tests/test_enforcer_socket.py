@@ -0,0 +1,157 @@
+import contextlib
+import io
+import os
+import socket
+import struct
+import tempfile
+import threading
+import unittest
+from lib.odsutils import ODS, OdsEnforcerSocket
+
+KEY_LIST = "Keys:\nexample.fi KSK active\nexample.com KSK ready\n"
+
+# Stand-in for ods-enforcer, when the socket can't be used
+FAKE_ENFORCER = '''#!/bin/sh
+echo "cli: $*"
+'''
+
+
+class FakeEnforcerServer:
+    """
+    Enforcer daemon control socket, answering in a thread. Commands of a connection can be pipelined.
+    """
+
+    def __init__(self, Path: str):
+        self.path = Path
+        self.connections = 0
+        self.commands = []
+        # Commands to answer with output cut short by a closed connection
+        self.cut = set()
+        # Don't answer at all
+        self.silent = False
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(Path)
+        self.server.listen(4)
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.close()
+
+    def _serve(self):
+        while True:
+            try:
+                (conn, _) = self.server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def _serve_connection(self, conn: socket.socket):
+        with conn:
+            reader = conn.makefile('rb')
+            while True:
+                header = reader.read(3)
+                if len(header) < 3:
+                    return
+                (_, length) = struct.unpack('!BH', header)
+                command = reader.read(length).decode('utf-8')
+                self.commands.append(command)
+                if self.silent:
+                    continue
+                if command == 'key list':
+                    (output, exit_code) = (KEY_LIST, 0)
+                else:
+                    (output, exit_code) = ("Unknown command: %s\n" % command, 1)
+                output = output.encode('utf-8')
+                if command in self.cut:
+                    self.cut.remove(command)
+                    conn.sendall(struct.pack('!BH', OdsEnforcerSocket.OPC_STDOUT, 10) + output[:10])
+                    return
+                opcode = OdsEnforcerSocket.OPC_STDOUT if exit_code == 0 else OdsEnforcerSocket.OPC_STDERR
+                conn.sendall(struct.pack('!BH', opcode, len(output)) + output +
+                             struct.pack('!BHB', OdsEnforcerSocket.OPC_EXIT, 1, exit_code))
+
+
+class OdsEnforcerSocketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'enforcer.sock')
+        self.server = FakeEnforcerServer(Path=self.path)
+        self.backend = OdsEnforcerSocket(Path=self.path, Timeout=1.0)
+
+        enforcer = os.path.join(self.tmp_dir.name, 'ods-enforcer')
+        with open(enforcer, 'w') as enforcer_file:
+            enforcer_file.write(FAKE_ENFORCER)
+        os.chmod(enforcer, 0o755)
+        self.saved_path = os.environ.get('PATH', '')
+        os.environ['PATH'] = '%s:%s' % (self.tmp_dir.name, self.saved_path)
+
+    def tearDown(self):
+        os.environ['PATH'] = self.saved_path
+        self.backend.close()
+        self.server.close()
+        self.tmp_dir.cleanup()
+
+    def test_pipelined(self):
+        results = self.backend.run_many_checked([['key list'], ['key ds-seen', '--zone', 'example.com'],
+                                                 ['key list']])
+        self.assertEqual([(0, KEY_LIST), (1, "Unknown command: key ds-seen --zone example.com\n"), (0, KEY_LIST)],
+                         results)
+        self.assertEqual(KEY_LIST, self.backend.run(['key list']))
+        # All on the same connection
+        self.assertEqual(1, self.server.connections)
+        self.assertEqual(4, len(self.server.commands))
+
+    def test_run_lines(self):
+        self.assertEqual(KEY_LIST.splitlines(), list(self.backend.run_lines(['key list'])))
+
+    def test_run_lines_reset_mid_stream(self):
+        self.server.cut.add('key list')
+        lines = self.backend.run_lines(['key list'])
+        with self.assertRaises(ConnectionResetError):
+            list(lines)
+        self.assertIsNone(self.backend.sock)
+
+        # Next command reconnects
+        self.assertEqual(KEY_LIST.splitlines(), list(self.backend.run_lines(['key list'])))
+        self.assertEqual(2, self.server.connections)
+
+    def test_reset_while_pipelining(self):
+        self.server.cut.add('key export')
+        results = self.backend.run_many([['key list'], ['key export'], ['key list']])
+        # Command of the cut output is run again, pipelining is given up
+        self.assertEqual([KEY_LIST, "Unknown command: key export\n", KEY_LIST], results)
+        self.assertFalse(self.backend.pipelining)
+        self.assertEqual(2, self.server.connections)
+
+    def test_fallback_to_cli(self):
+        self.server.close()
+        os.unlink(self.path)
+        self.assertEqual([(0, "cli: key list\n")], self.backend.run_many_checked([['key list']]))
+        self.assertEqual(["cli: key list"], list(self.backend.run_lines(['key list'])))
+
+    def test_timeout(self):
+        self.server.silent = True
+        self.backend.timeout = 0.2
+        # Daemon not answering, try the command-line tool
+        self.assertEqual("cli: key list\n", self.backend.run(['key list']))
+        self.assertIsNone(self.backend.sock)
+
+    def test_use_socket_warning_to_stderr(self):
+        saved_backend = ODS.backend
+        (stdout, stderr) = (io.StringIO(), io.StringIO())
+        try:
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                self.assertFalse(ODS.use_socket(os.path.join(self.tmp_dir.name, 'missing.sock')))
+            self.assertIs(saved_backend, ODS.backend)
+        finally:
+            ODS.backend = saved_backend
+        # Output may be JSON, warnings stay out of it
+        self.assertEqual('', stdout.getvalue())
+        self.assertIn("Cannot connect to enforcer socket", stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from lib.odsutils import KeyStore, ODS, OdsKey
+
+
+def make_key(tag: int, state: str):
+    return OdsKey(Type='KSK', Tag=tag, State=state, Bits=2048, Algorithm=8, NextTransition=None)
+
+
+class KeyStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = KeyStore()
+        self.store.add('example.fi', make_key(11111, OdsKey.ODS_ZONE_STATUS_ACTIVE))
+        self.store.add('example.fi', make_key(22222, OdsKey.ODS_ZONE_STATUS_RETIRE))
+        self.store.add('example.com', make_key(33333, OdsKey.ODS_ZONE_STATUS_READY))
+
+    def test_add(self):
+        self.assertEqual(3, len(self.store))
+        self.assertEqual(['example.com', 'example.fi'], self.store.get_zones())
+        self.assertIn('example.fi', self.store)
+        self.assertNotIn('example.org', self.store)
+        self.assertEqual([11111, 22222], sorted(self.store.get_keys('example.fi')))
+        self.assertEqual([11111, 22222], [key.tag for key in self.store.get_zone_keys('example.fi')])
+        self.assertEqual(22222, self.store.get_key('example.fi', 22222).tag)
+        self.assertIsNone(self.store.get_key('example.fi', 33333))
+        self.assertIsNone(self.store.get_key('example.org', 11111))
+        self.assertEqual({}, self.store.get_keys('example.org'))
+
+    def test_get_keys_with_state(self):
+        self.assertEqual([11111], [key.tag for key in self.store.get_keys_with_state(
+            'example.fi', OdsKey.ODS_ZONE_STATUS_ACTIVE)])
+        self.assertEqual((), self.store.get_keys_with_state('example.fi', OdsKey.ODS_ZONE_STATUS_READY))
+        self.assertEqual((), self.store.get_keys_with_state('example.org', OdsKey.ODS_ZONE_STATUS_ACTIVE))
+        self.assertEqual({OdsKey.ODS_ZONE_STATUS_ACTIVE, OdsKey.ODS_ZONE_STATUS_RETIRE},
+                         self.store.get_states('example.fi'))
+        self.assertEqual({OdsKey.ODS_ZONE_STATUS_RETIRE},
+                         self.store.get_states('example.fi', [OdsKey.ODS_ZONE_STATUS_RETIRE,
+                                                              OdsKey.ODS_ZONE_STATUS_READY]))
+
+    def test_single_state_shares_tuple(self):
+        self.assertIs(self.store.get_zone_keys('example.com'),
+                      self.store.get_keys_with_state('example.com', OdsKey.ODS_ZONE_STATUS_READY))
+
+    def test_re_add_in_new_state(self):
+        # ds-gone done: the retired key is now active, the old active one retired
+        self.store.add('example.fi', make_key(22222, OdsKey.ODS_ZONE_STATUS_ACTIVE))
+        self.store.add('example.fi', make_key(11111, OdsKey.ODS_ZONE_STATUS_RETIRE))
+        self.assertEqual(3, len(self.store))
+        self.assertEqual([22222], [key.tag for key in self.store.get_keys_with_state(
+            'example.fi', OdsKey.ODS_ZONE_STATUS_ACTIVE)])
+        self.assertEqual([11111], [key.tag for key in self.store.get_keys_with_state(
+            'example.fi', OdsKey.ODS_ZONE_STATUS_RETIRE)])
+        self.assertEqual(OdsKey.ODS_ZONE_STATUS_ACTIVE, self.store.get_key('example.fi', 22222).state)
+        # Other zones untouched
+        self.assertEqual(OdsKey.ODS_ZONE_STATUS_READY, self.store.get_key('example.com', 33333).state)
+
+    def test_ods_keys_built_once(self):
+        zone = ODS(ZoneName='example.fi', Store=self.store)
+        self.assertIs(zone.keys, zone.keys)
+        self.assertEqual(11111, zone.get_active_key().tag)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import re
+import tempfile
+import unittest
+from datetime import datetime
+from lib.odsutils import OdsKey
+from lib.reportutils import Histogram, ZoneMetrics, ZoneReport
+
+NOW = 1700000000.0
+TRANSITION = datetime.fromtimestamp(NOW + 3600)
+ACTIVE = OdsKey(Type='KSK', Tag=11111, State=OdsKey.ODS_ZONE_STATUS_ACTIVE, Bits=2048, Algorithm=8,
+                NextTransition=None)
+RETIRE = OdsKey(Type='KSK', Tag=22222, State=OdsKey.ODS_ZONE_STATUS_RETIRE, Bits=2048, Algorithm=8,
+                NextTransition=TRANSITION)
+
+# OpenMetrics text format, see https://prometheus.io/docs/specs/om/open_metrics_spec/
+ESCAPED_STRING = r'(?:[^"\\\n]|\\\\|\\n|\\")*'
+METRIC_NAME = r'[a-zA-Z_:][a-zA-Z0-9_:]*'
+METADATA = re.compile(r'^# (TYPE|HELP|UNIT) (%s) (%s)$' % (METRIC_NAME, ESCAPED_STRING))
+LABEL = r'[a-zA-Z_][a-zA-Z0-9_]*="%s"' % ESCAPED_STRING
+SAMPLE = re.compile(r'^(%s)(?:\{(%s(?:,%s)*)\})? (-?[0-9.]+(?:e[+-]?[0-9]+)?|[+-]Inf|NaN)$' % (
+    METRIC_NAME, LABEL, LABEL))
+HISTOGRAM_SUFFIXES = ('_bucket', '_count', '_sum')
+
+
+def make_report(zone: str, keys: list, ds_tags: list, error: str = None):
+    return ZoneReport(Zone=zone, Phase=ZoneReport.PHASE_ACTIVE, Keys={key.tag: key for key in keys},
+                      Ds={tag: {"keytag": tag} for tag in ds_tags}, Error=error)
+
+
+class ZoneMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = ZoneMetrics()
+        self.metrics.update(make_report('example.fi', [ACTIVE, RETIRE], [11111, 33333]), now=NOW)
+        self.metrics.observe('dns', 0.2)
+        self.metrics.observe('dns', 3.0)
+
+    def assertExposition(self, text: str):
+        """
+        Check text is a valid OpenMetrics exposition.
+        :return: dict, metric family name -> list of (sample name, labels, value)
+        """
+        self.assertTrue(text.endswith('\n# EOF\n'), 'must end with # EOF and a newline')
+        families = {}
+        family = None
+        for line in text.splitlines()[:-1]:
+            self.assertNotEqual('# EOF', line, 'only one # EOF, as the last line')
+            metadata = METADATA.match(line)
+            if metadata:
+                name = metadata.group(2)
+                if name != family:
+                    self.assertNotIn(name, families, 'family %s must not be interleaved' % name)
+                    families[name] = []
+                    family = name
+                continue
+            sample = SAMPLE.match(line)
+            self.assertIsNotNone(sample, 'not a valid sample: %r' % line)
+            (name, labels, value) = sample.groups()
+            self.assertIn(name, [family + suffix for suffix in ('',) + HISTOGRAM_SUFFIXES],
+                          'sample %s outside of its family %s' % (name, family))
+            families[family].append((name, labels, value))
+
+        return families
+
+    def test_exposition(self):
+        families = self.assertExposition(self.metrics.render(now=NOW))
+        self.assertEqual([name for (name, _, _) in ZoneMetrics.FAMILIES] + ['ods_collection_duration_seconds'],
+                         list(families))
+        self.assertEqual([
+            ('ods_ksk_keys', 'zone="example.fi",key_state="active"', '1'),
+            ('ods_ksk_keys', 'zone="example.fi",key_state="retire"', '1'),
+        ], families['ods_ksk_keys'])
+        self.assertEqual([
+            ('ods_parent_ds', 'zone="example.fi",keytag="11111",key_state="active"', '1'),
+            ('ods_parent_ds', 'zone="example.fi",keytag="22222",key_state="retire"', '0'),
+            ('ods_parent_ds', 'zone="example.fi",keytag="33333",key_state="none"', '1'),
+        ], families['ods_parent_ds'])
+        self.assertEqual([('ods_zone_last_check_timestamp_seconds', 'zone="example.fi"', '%d' % NOW)],
+                         families['ods_zone_last_check_timestamp_seconds'])
+
+    def test_transition_at_scrape_time(self):
+        for (now, seconds) in [(NOW, '3600'), (NOW + 3600 + 60, '-60')]:
+            with self.subTest(seconds=seconds):
+                families = self.assertExposition(self.metrics.render(now=now))
+                self.assertEqual([('ods_ksk_next_transition_seconds',
+                                   'zone="example.fi",keytag="22222",key_state="retire"', seconds)],
+                                 families['ods_ksk_next_transition_seconds'])
+
+    def test_histogram(self):
+        families = self.assertExposition(self.metrics.render(now=NOW))
+        dns_samples = [(name, labels, value) for (name, labels, value) in families['ods_collection_duration_seconds']
+                       if labels.startswith('stage="dns"')]
+        buckets = [(labels, int(value)) for (name, labels, value) in dns_samples if name.endswith('_bucket')]
+        # Cumulative, +Inf last and equal to count
+        self.assertEqual([0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2, 2, 2, 2], [count for (_, count) in buckets])
+        self.assertEqual('stage="dns",le="+Inf"', buckets[-1][0])
+        self.assertIn(('ods_collection_duration_seconds_count', 'stage="dns"', '2'), dns_samples)
+        self.assertEqual(3.2, float([value for (name, _, value) in dns_samples if name.endswith('_sum')][0]))
+
+    def test_label_escaping(self):
+        zone = 'we"ird\\zone\nname.fi'
+        self.metrics.update(make_report(zone, [ACTIVE], [11111]), now=NOW)
+        families = self.assertExposition(self.metrics.render(now=NOW))
+        self.assertIn(('ods_zone_phase', 'zone="we\\"ird\\\\zone\\nname.fi",phase="active"', '1'),
+                      families['ods_zone_phase'])
+        self.assertEqual('a\\\\b\\"c\\nd', ZoneMetrics.escape('a\\b"c\nd'))
+
+    def test_failed_zone_has_no_parent_ds(self):
+        self.metrics.update(make_report('example.fi', [ACTIVE], [], error='timeout'), now=NOW)
+        families = self.assertExposition(self.metrics.render(now=NOW))
+        self.assertEqual([], families['ods_parent_ds'])
+
+    def test_retain(self):
+        self.metrics.update(make_report('example.com', [ACTIVE], [11111]), now=NOW)
+        self.assertEqual(2, len(self.metrics))
+        self.metrics.retain(['example.com'])
+        self.assertEqual(1, len(self.metrics))
+        families = self.assertExposition(self.metrics.render(now=NOW))
+        self.assertEqual([], families['ods_ksk_next_transition_seconds'])
+        self.assertEqual(['zone="example.com",phase="active"'],
+                         [labels for (_, labels, _) in families['ods_zone_phase']])
+
+    def test_empty(self):
+        self.assertExposition(ZoneMetrics().render(now=NOW))
+
+    def test_write_textfile(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'ods.prom')
+            self.metrics.write_textfile(filename)
+            with open(filename) as metrics_file:
+                self.assertExposition(metrics_file.read())
+            self.assertEqual(['ods.prom'], os.listdir(tmp_dir))
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_observe(self):
+        histogram = Histogram(Buckets=[1.0, 2.0])
+        for value in [0.5, 1.0, 1.5, 5.0]:
+            histogram.observe(value)
+        self.assertEqual([
+            'd_bucket{s="x",le="1.0"} 2',
+            'd_bucket{s="x",le="2.0"} 3',
+            'd_bucket{s="x",le="+Inf"} 4',
+            'd_count{s="x"} 4',
+            'd_sum{s="x"} 8.000000',
+        ], histogram.get_lines('d', 's="x"'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+import contextlib
+import io
+import json
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+from lib.reportutils import ZoneMetrics, ZoneReport
+from lib.serverutils import StatusServer, ZoneStatusStore
+
+STATUSES = {
+    'example.fi': {"zone": "example.fi", "phase": "active"},
+    'example.com': {"zone": "example.com", "phase": "ds-seen"},
+}
+
+
+class StatusServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.refreshes = 0
+        self.metrics = ZoneMetrics()
+        self.server = StatusServer(Refresh=self._refresh, Address='127.0.0.1', Port=0, Interval=3600,
+                                   Metrics=self.metrics)
+        self.output = io.StringIO()
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+        self._wait(lambda: self.server.httpd is not None)
+        self.url = 'http://127.0.0.1:%d' % self.server.httpd.server_address[1]
+
+    def tearDown(self):
+        self.release.set()
+        self.server.stop()
+        self.thread.join(5)
+        self.assertFalse(self.thread.is_alive(), 'server stops')
+
+    def _serve(self):
+        with contextlib.redirect_stdout(self.output):
+            self.server.serve()
+
+    def _refresh(self):
+        # First refresh is held back until released, server has nothing to serve until then
+        self.release.wait(5)
+        self.refreshes += 1
+        self.metrics.update(ZoneReport(Zone='example.fi', Phase=ZoneReport.PHASE_ACTIVE))
+
+        return STATUSES
+
+    @staticmethod
+    def _wait(condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            if time.monotonic() > deadline:
+                raise AssertionError('Timed out')
+            time.sleep(0.01)
+
+    def _get(self, path: str):
+        """
+        :return: tuple (HTTP status, Content-Type, body)
+        """
+        try:
+            with urllib.request.urlopen(self.url + path, timeout=5) as response:
+                return response.status, response.headers['Content-Type'], response.read()
+        except urllib.error.HTTPError as exc:
+            with exc:
+                return exc.code, exc.headers['Content-Type'], exc.read()
+
+    def _get_json(self, path: str):
+        (status, content_type, body) = self._get(path)
+        self.assertEqual('application/json', content_type)
+
+        return status, json.loads(body)
+
+    def test_not_refreshed_yet(self):
+        for path in ['/zones', '/zones/example.fi']:
+            with self.subTest(path):
+                (status, body) = self._get_json(path)
+                self.assertEqual(503, status)
+                self.assertIn('error', body)
+
+    def test_zones(self):
+        self.release.set()
+        self._wait(lambda: self.server.store.updated is not None)
+        (status, body) = self._get_json('/zones')
+        self.assertEqual(200, status)
+        self.assertEqual(self.server.store.updated, body["updated"])
+        self.assertEqual([STATUSES['example.com'], STATUSES['example.fi']], body["zones"])
+        self.assertEqual((200, body), self._get_json('/zones/'))
+        self.assertEqual(1, self.refreshes)
+        self.assertIn('Refreshed status of 2 zones', self.output.getvalue())
+
+    def test_zone(self):
+        self.release.set()
+        self._wait(lambda: self.server.store.updated is not None)
+        # (path, HTTP status, body or None for an error)
+        cases = [
+            ('/zones/example.fi', 200, STATUSES['example.fi']),
+            ('/zones/Example.FI.', 200, STATUSES['example.fi']),
+            ('/zones/example.fi?verbose=1', 200, STATUSES['example.fi']),
+            ('/zones/example%2Ecom', 200, STATUSES['example.com']),
+            ('/zones/unknown.fi', 404, None),
+            ('/', 404, None),
+            ('/zone', 404, None),
+        ]
+        for (path, expected_status, expected_body) in cases:
+            with self.subTest(path):
+                (status, body) = self._get_json(path)
+                self.assertEqual(expected_status, status)
+                if expected_body is None:
+                    self.assertIn('error', body)
+                else:
+                    self.assertEqual(expected_body, body)
+
+    def test_metrics(self):
+        self.release.set()
+        self._wait(lambda: self.server.store.updated is not None)
+        (status, content_type, body) = self._get('/metrics')
+        self.assertEqual(200, status)
+        self.assertEqual(ZoneMetrics.CONTENT_TYPE, content_type)
+        self.assertIn(b'ods_zone_phase{zone="example.fi",phase="active"} 1\n', body)
+        self.assertTrue(body.endswith(b'# EOF\n'))
+
+    def test_no_metrics(self):
+        self.server.httpd.metrics = None
+        (status, _) = self._get_json('/metrics')
+        self.assertEqual(404, status)
+
+    def test_method_not_supported(self):
+        request = urllib.request.Request(self.url + '/zones', data=b'{}', method='POST')
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            urllib.request.urlopen(request, timeout=5)
+        context.exception.close()
+        self.assertEqual(501, context.exception.code)
+
+
+class StatusRefreshTest(unittest.TestCase):
+
+    def test_failed_refresh_keeps_statuses(self):
+        results = [STATUSES, Exception('enforcer not running')]
+
+        def refresh():
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        server = StatusServer(Refresh=refresh)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            server._refresh()
+            updated = server.store.updated
+            server._refresh()
+        self.assertIn('enforcer not running', output.getvalue())
+        self.assertEqual(updated, server.store.updated)
+        self.assertEqual(STATUSES['example.fi'], json.loads(server.store.get('example.fi')))
+
+
+class ZoneStatusStoreTest(unittest.TestCase):
+
+    def test_replace(self):
+        store = ZoneStatusStore()
+        self.assertIsNone(store.get_all())
+        store.replace(STATUSES)
+        self.assertEqual(STATUSES['example.com'], json.loads(store.get('EXAMPLE.com.')))
+        store.replace({'example.fi': STATUSES['example.fi']})
+        # Replaced, not merged
+        self.assertIsNone(store.get('example.com'))
+        self.assertEqual([STATUSES['example.fi']], json.loads(store.get_all())["zones"])
+
+
+if __name__ == '__main__':
+    unittest.main()
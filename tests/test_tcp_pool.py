@@ -0,0 +1,133 @@
+import asyncio
+import struct
+import unittest
+import dns.message
+import dns.rdatatype
+import dns.rrset
+from lib.dnsutils import TcpConnectionPool
+
+
+class FakeAuthoritative:
+    """
+    Authoritative DNS-server over TCP on loopback. Answers DS-queries with a fixed DS-record.
+    """
+
+    def __init__(self, Delay: float = 0.0, CloseAfter: int = None):
+        """
+        :param Delay: seconds to wait before answering. Queries arriving meanwhile are answered in reverse order.
+        :param CloseAfter: close connection after answering this many queries
+        """
+        self.delay = Delay
+        self.close_after = CloseAfter
+        self.connections = 0
+        self.server = None
+        self.port = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    @staticmethod
+    def answer(wire: bytes):
+        query = dns.message.from_wire(wire)
+        response = dns.message.make_response(query)
+        response.answer.append(dns.rrset.from_text(query.question[0].name, 3600, 'IN', 'DS',
+                                                   '12345 8 2 %064x' % len(query.question[0].name)))
+
+        return response.to_wire()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        answered = 0
+        try:
+            while self.close_after is None or answered < self.close_after:
+                queries = [await self._read_query(reader)]
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                    # Pipelined queries arrived meanwhile
+                    while True:
+                        try:
+                            queries.append(await asyncio.wait_for(self._read_query(reader), 0.01))
+                        except asyncio.TimeoutError:
+                            break
+                for wire in reversed(queries):
+                    response = FakeAuthoritative.answer(wire)
+                    writer.write(struct.pack('!H', len(response)) + response)
+                    answered += 1
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass
+        writer.close()
+
+    @staticmethod
+    async def _read_query(reader: asyncio.StreamReader):
+        (length,) = struct.unpack('!H', await reader.readexactly(2))
+
+        return await reader.readexactly(length)
+
+
+class TcpConnectionPoolTest(unittest.TestCase):
+
+    def _run(self, server: FakeAuthoritative, test):
+        async def _test():
+            await server.start()
+            pool = TcpConnectionPool(Port=server.port)
+            try:
+                await test(pool)
+            finally:
+                await pool.close()
+                await server.stop()
+
+        asyncio.run(_test())
+
+    @staticmethod
+    def _check_answer(test: unittest.TestCase, zone: str, response: dns.message.Message):
+        test.assertEqual(dns.name.from_text(zone), response.answer[0].name)
+        test.assertEqual(dns.rdatatype.DS, response.answer[0].rdtype)
+
+    def test_reuse(self):
+        server = FakeAuthoritative()
+
+        async def test(pool: TcpConnectionPool):
+            for zone in ('example.fi', 'example.com', 'example.org'):
+                query = dns.message.make_query(zone, dns.rdatatype.DS)
+                self._check_answer(self, zone, await pool.query(query, '127.0.0.1', 2.0))
+            self.assertEqual(1, pool.get_connection_count())
+            self.assertEqual(1, server.connections)
+
+        self._run(server, test)
+
+    def test_pipelining(self):
+        server = FakeAuthoritative(Delay=0.1)
+        zones = ['zone%d.example' % idx for idx in range(8)]
+
+        async def test(pool: TcpConnectionPool):
+            queries = [pool.query(dns.message.make_query(zone, dns.rdatatype.DS), '127.0.0.1', 2.0)
+                       for zone in zones]
+            responses = await asyncio.gather(*queries)
+            # Responses arrive out of order, matched by query id
+            for (zone, response) in zip(zones, responses):
+                self._check_answer(self, zone, response)
+            self.assertEqual(1, server.connections)
+
+        self._run(server, test)
+
+    def test_closed_by_server(self):
+        server = FakeAuthoritative(CloseAfter=1)
+
+        async def test(pool: TcpConnectionPool):
+            for zone in ('example.fi', 'example.com'):
+                query = dns.message.make_query(zone, dns.rdatatype.DS)
+                self._check_answer(self, zone, await pool.query(query, '127.0.0.1', 2.0))
+            # Second query went over a new connection
+            self.assertEqual(2, server.connections)
+
+        self._run(server, test)
+
+
+if __name__ == '__main__':
+    unittest.main()
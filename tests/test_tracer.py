@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+import unittest
+from lib.traceutils import Tracer
+
+
+class TracerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tracer = Tracer()
+        self.tracer.enable()
+
+    def _get_summary(self):
+        return {total[0]: total for total in self.tracer.get_summary()}
+
+    def test_nested_self_time(self):
+        with self.tracer.span('outer', 'test'):
+            time.sleep(0.02)
+            with self.tracer.span('inner', 'test'):
+                time.sleep(0.05)
+        summary = self._get_summary()
+        (_, _, count, total, self_total, _) = summary['outer']
+        self.assertEqual(1, count)
+        self.assertAlmostEqual(0.02, self_total, delta=0.015)
+        self.assertAlmostEqual(summary['inner'][3], total - self_total, delta=0.001)
+
+    def test_concurrent_tasks_subtracted_once(self):
+        async def query(delay: float):
+            with self.tracer.span('query', 'test'):
+                await asyncio.sleep(delay)
+
+        async def hedged():
+            with self.tracer.span('get ds', 'test'):
+                await asyncio.sleep(0.02)
+                # Like AsyncDNS._query_hedged: queries in tasks of their own, in lanes of their own
+                tasks = [asyncio.ensure_future(query(0.05)), asyncio.ensure_future(query(0.05))]
+                await asyncio.gather(*tasks)
+
+        asyncio.run(hedged())
+        (_, _, _, total, self_total, _) = self._get_summary()['get ds']
+        self.assertGreater(total, 0.07)
+        # Overlapping children count once: self time is the 20 ms before the queries
+        self.assertAlmostEqual(0.02, self_total, delta=0.015)
+
+    def test_lanes_reused(self):
+        async def query():
+            with self.tracer.span('query', 'test'):
+                await asyncio.sleep(0.001)
+
+        async def run():
+            with self.tracer.span('run', 'test'):
+                for _ in range(50):
+                    await asyncio.gather(*[asyncio.ensure_future(query()) for _ in range(3)])
+
+        asyncio.run(run())
+        trace = self.tracer.to_json()
+        spans = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+        lanes = [event["tid"] for event in trace["traceEvents"] if event["ph"] == "M"]
+        self.assertEqual(151, len(spans))
+        # The main task and three queries at a time
+        self.assertEqual([1, 2, 3, 4], lanes)
+        self.assertEqual({1, 2, 3, 4}, {event["tid"] for event in spans})
+        # Spans running at the same time are in lanes of their own
+        by_lane = {}
+        for event in spans:
+            by_lane.setdefault(event["tid"], []).append((event["ts"], event["ts"] + event["dur"]))
+        for intervals in by_lane.values():
+            intervals.sort()
+            for (previous, current) in zip(intervals, intervals[1:]):
+                self.assertLessEqual(previous[1], current[0] + 1)
+
+    def test_thread_lanes(self):
+        barrier = threading.Barrier(2)
+
+        def work():
+            with self.tracer.span('work', 'test'):
+                # Both running at the same time
+                barrier.wait(5)
+
+        threads = [threading.Thread(target=work, name='worker-%d' % idx) for idx in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with self.tracer.span('main', 'test'):
+            pass
+        names = {event["args"]["name"] for event in self.tracer.to_json()["traceEvents"] if event["ph"] == "M"}
+        self.assertEqual({'worker-0', 'worker-1', threading.current_thread().name}, names)
+
+
+if __name__ == '__main__':
+    unittest.main()
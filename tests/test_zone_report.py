@@ -0,0 +1,256 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from lib.dnsutils import ChildKeys, PropagationReport, ServerDsResult
+from lib.odsutils import ODS, OdsKey
+from lib.reportutils import JsonRenderer, NdjsonRenderer, TextRenderer, ZoneAction, ZoneReport, read_results
+
+ZONE = 'example.fi'
+PARENT = '192.0.2.53'
+TRANSITION = datetime(2030, 5, 1, 10, 0)
+DIGEST = 'ab' * 32
+
+
+def make_key(tag: int, state: str, next_transition: datetime = None, ds_at_parent: str = None):
+    return OdsKey(Type='KSK', Tag=tag, State=state, Bits=2048, Algorithm=8, NextTransition=next_transition,
+                  DSAtParent=ds_at_parent)
+
+
+def make_zone(keys: list):
+    zone = ODS(ZoneName=ZONE, Keys={key.tag: key for key in keys})
+    # As exported by enforcer, no enforcer needed
+    zone.ds_info = {key.tag: [8, 2, DIGEST] for key in keys if key.state != OdsKey.ODS_ZONE_STATUS_ACTIVE}
+
+    return zone
+
+
+def make_ds(tags: list, digest: str = DIGEST):
+    return {tag: {"keytag": tag, "keyalgo": 8, "keylabels": 2, "key": digest} for tag in tags}
+
+
+def ds_gone(tag: int):
+    return ZoneAction.ds_command('ds-gone', ZONE, tag)
+
+
+def ds_seen(tag: int):
+    return ZoneAction.ds_command('ds-seen', ZONE, tag)
+
+
+ACTIVE = make_key(11111, OdsKey.ODS_ZONE_STATUS_ACTIVE, TRANSITION)
+PUBLISH = make_key(22222, OdsKey.ODS_ZONE_STATUS_PUBLISH, TRANSITION)
+READY = make_key(33333, OdsKey.ODS_ZONE_STATUS_READY)
+RETIRE = make_key(44444, OdsKey.ODS_ZONE_STATUS_RETIRE, TRANSITION)
+# Waiting for ds-gone
+RETIRE_WAITING = make_key(55555, OdsKey.ODS_ZONE_STATUS_RETIRE, None, 'retract')
+
+# (name, keys, DS-tags at parent, phase, actions as (kind, keytag), commands, lines of baseline zone_status in order)
+CASES = [
+    ('active', [ACTIVE], [11111], ZoneReport.PHASE_ACTIVE, [], [], [
+        "  Zone has active RSASHA256 (2048 bits) key with tag 11111",
+        "  Zone has DS-record with tag 11111 in DNS server %s" % PARENT,
+        "  Found tags in active key and DS-record. Tags match. All good. Nothing to do.",
+    ]),
+    ('active no DS', [ACTIVE], [], ZoneReport.PHASE_ACTIVE_NO_DS, [], [], [
+        "  Zone has active RSASHA256 (2048 bits) key with tag 11111",
+        "  Zone has no DS-records in DNS %s" % PARENT,
+    ]),
+    ('rolled over', [ACTIVE, RETIRE], [11111, 44444], ZoneReport.PHASE_DS_GONE,
+     [(ZoneAction.ROLLED_OVER, 44444)], [ds_gone(44444)], [
+        "  Zone has active RSASHA256 (2048 bits) key with tag 11111",
+        "  Zone has performed a KSK rollover",
+        "    Suggest: To perform KSK rollover to the end, do following:",
+        "      To get old key retired:",
+        "      0) Make sure your DNS-changes are full propagated.",
+        "         This message will display as long as changes can not be detected.",
+        "      1) (optional) If your Domain name registrar supports multiple keys, remove key with tag 44444",
+        "      2) " + ds_gone(44444),
+    ]),
+    ('retired DS gone', [ACTIVE, RETIRE_WAITING], [11111], ZoneReport.PHASE_DS_GONE,
+     [(ZoneAction.GONE_SEEN, 55555)], [ds_gone(55555)], [
+        "  DS-record of retired key with tag 55555 is gone from parent",
+        "    Suggest: To confirm it, run following:",
+        "      " + ds_gone(55555),
+    ]),
+    ('retired, enforcer not waiting', [ACTIVE, RETIRE], [11111], ZoneReport.PHASE_ACTIVE, [], [], [
+        "  Found tags in active key and DS-record. Tags match. All good. Nothing to do.",
+    ]),
+    ('publish seen', [PUBLISH], [22222], ZoneReport.PHASE_DS_SEEN, [(ZoneAction.PUBLISH_SEEN, 22222)],
+     [ds_seen(22222)], [
+        "  Zone has no active keys",
+        "  Zone is waiting for a RSASHA256 (2048 bits) key with tag 22222 to be published",
+        "    Suggest: To publish the key, run following:",
+        "      " + ds_seen(22222),
+    ]),
+    ('publish submit', [PUBLISH], [], ZoneReport.PHASE_SUBMIT, [(ZoneAction.PUBLISH_SUBMIT, 22222)], [
+        ZoneAction.ds_command('ds-submit', ZONE, 22222), ZoneAction.export_command(ZONE, 'publish'),
+        ZoneAction.ds_command('ds-publish', ZONE, 22222)], [
+        "  Zone is waiting for a RSASHA256 (2048 bits) key with tag 22222 to be published",
+        "    Suggest: To publish the key, do following:",
+        "      1) " + ZoneAction.ds_command('ds-submit', ZONE, 22222),
+        "      2) ods-enforcer key export --zone %s --keytype ksk --keystate publish --ds" % ZONE,
+        "      3) In your Domain name registrar's user interface:",
+        "         upload information from step 2) into zone %s DNSSEC setup with following details:" % ZONE,
+        "         - Key tag: 22222",
+        "         - Key algorithm: 8 (RSASHA256)",
+        "         - Key digest type: 2 (SHA-256)",
+        "         - Key digest: (see key export output)",
+        "      4) " + ZoneAction.ds_command('ds-publish', ZONE, 22222),
+        "      5) Wait. Eventually the key will be propagated according to chosen key policy.",
+    ]),
+    ('ready', [READY], [33333], ZoneReport.PHASE_DS_SEEN, [(ZoneAction.READY_SEEN, 33333)], [ds_seen(33333)], [
+        "  Zone is waiting for a RSASHA256 (2048 bits) key with tag 33333 to be DS-seen",
+        "    Suggest: To confirm key setup, run following:",
+        "      " + ds_seen(33333),
+    ]),
+    ('rollover seen', [READY, RETIRE], [33333, 44444], ZoneReport.PHASE_ROLLOVER,
+     [(ZoneAction.ROLLOVER_SEEN, 33333), (ZoneAction.ROLLOVER_RETIRE, 44444)], [ds_seen(33333), ds_gone(44444)], [
+        "  Zone is waiting for KSK rollover",
+        "    Suggest: To perform KSK rollover, do following:",
+        "      To get new key published:",
+        "      1) " + ds_seen(33333),
+        "",
+        "      To get old key retired:",
+        "      0) Important: Do this only after new key steps have been completed!",
+        "      1) (optional) If your Domain name registrar supports multiple keys, remove key with tag 44444",
+        "      2) " + ds_gone(44444),
+    ]),
+    ('rollover upload', [READY, RETIRE], [44444], ZoneReport.PHASE_ROLLOVER,
+     [(ZoneAction.ROLLOVER_UPLOAD, 33333), (ZoneAction.ROLLOVER_RETIRE, 44444)],
+     [ZoneAction.export_command(ZONE, 'ready'), ds_seen(33333), ds_gone(44444)], [
+        "      To get new key published:",
+        "      1) ods-enforcer key export --zone %s --keytype ksk --keystate ready --ds" % ZONE,
+        "      2) In your Domain name registrar's user interface:",
+        "         upload information from step 1) into zone %s DNSSEC setup with following details:" % ZONE,
+        "         - Key tag: 33333",
+        "      3) Wait. Keep running this command until you see a 'Zone has DS-record with tag 33333 in DNS'",
+        "      4) " + ds_seen(33333),
+        "      To get old key retired:",
+    ]),
+    ('broken', [READY, RETIRE], [], ZoneReport.PHASE_BROKEN, [(ZoneAction.BROKEN, None)], [], [
+        "  Zone has no active keys",
+        "  Zone is royally messed up!",
+        "  Zone has no DS-records in DNS %s" % PARENT,
+    ]),
+    ('retire', [RETIRE], [44444], ZoneReport.PHASE_DS_GONE, [(ZoneAction.RETIRE, 44444)], [ds_gone(44444)], [
+        "  Zone has no active keys",
+        "  Zone is waiting for KSK rollover",
+        "    Suggest: To perform KSK rollover to the end, do following:",
+        "      2) " + ds_gone(44444),
+    ]),
+    ('retire, no DS', [RETIRE], [], ZoneReport.PHASE_WAITING, [], [], [
+        "  Zone has no active keys",
+        "  Zone has no DS-records in DNS %s" % PARENT,
+    ]),
+]
+
+
+class ZoneReportTest(unittest.TestCase):
+
+    def assertLinesInOrder(self, expected: list, lines: list):
+        position = 0
+        for line in expected:
+            self.assertIn(line, lines[position:], "\n".join(lines))
+            position = lines.index(line, position) + 1
+
+    def test_analyze(self):
+        for (name, keys, ds_tags, phase, actions, commands, text) in CASES:
+            with self.subTest(name):
+                report = ZoneReport.analyze(make_zone(keys), (PARENT, make_ds(ds_tags) if ds_tags else None))
+                self.assertEqual(phase, report.phase)
+                self.assertEqual(actions, [(action.kind, action.key.tag if action.key else None)
+                                           for action in report.actions])
+                self.assertEqual(commands, report.get_commands())
+                lines = TextRenderer.format(report)
+                self.assertEqual("OpenDNSSEC zone %s information:" % ZONE, lines[0])
+                self.assertLinesInOrder(text, lines)
+                self.assertEqual("Hint: Verify the status by visiting https://dnssec-analyzer.verisignlabs.com/%s"
+                                 % ZONE, lines[-1])
+
+    def test_not_propagated(self):
+        propagation = PropagationReport(Zone=ZONE, Parent='fi.', Servers=[
+            ServerDsResult(Host='a.fi.', Address='192.0.2.1', Ds=make_ds([33333, 44444]), Rtt=0.01),
+            ServerDsResult(Host='b.fi.', Address='192.0.2.2', Ds=make_ds([44444]), Rtt=0.01)])
+        report = ZoneReport.analyze(make_zone([READY, RETIRE]), propagation=propagation)
+        self.assertFalse(report.is_propagated())
+        self.assertEqual([ZoneAction.ROLLOVER_SEEN, ZoneAction.ROLLOVER_RETIRE],
+                         [action.kind for action in report.actions])
+        # No ds-seen nor ds-gone before servers agree
+        self.assertEqual([], report.get_commands())
+        self.assertEqual([], report.get_safe_actions())
+        lines = TextRenderer.format(report)
+        self.assertLinesInOrder([
+            "      1) Wait. DS-records differ between servers of the parent zone, changes are still propagating.",
+            "      2) Wait. DS-records differ between servers of the parent zone, changes are still propagating.",
+            "  Parent zone fi. servers don't agree, changes are propagating:",
+            "    a.fi. (192.0.2.1): 33333, 44444 in 10.0 ms",
+            "    b.fi. (192.0.2.2): 44444 in 10.0 ms",
+        ], lines)
+
+    def test_ds_mismatch(self):
+        child = ChildKeys(Zone=ZONE, Address='192.0.2.80', Dnskeys={
+            33333: {"flags": 257, "algorithm": 8, "digests": {2: DIGEST}}})
+        propagation = PropagationReport(Zone=ZONE, Parent='fi.', Servers=[
+            ServerDsResult(Host='a.fi.', Address='192.0.2.1', Ds=make_ds([33333], 'cd' * 32), Rtt=0.01)])
+        report = ZoneReport.analyze(make_zone([READY]), propagation=propagation, child=child)
+        self.assertEqual(ZoneReport.PHASE_DS_MISMATCH, report.phase)
+        self.assertEqual([(ZoneAction.DS_MISMATCH, 33333)], [(action.kind, action.key.tag)
+                                                              for action in report.actions])
+        self.assertEqual([ZoneAction.export_command(ZONE, 'ready')], report.get_commands())
+        self.assertEqual([], report.get_safe_actions())
+        self.assertLinesInOrder([
+            "  DS-record with tag 33333 at parent doesn't match the key served by the zone",
+            "    Suggest: Don't run ds-seen. To fix the DS-record, do following:",
+            "  Zone has KSK DNSKEY-records with tags 33333 in DNS server 192.0.2.80",
+            "    Tag 33333: digest of DS-record at parent doesn't match the DNSKEY-record",
+        ], TextRenderer.format(report))
+
+    def test_safe_actions(self):
+        child = ChildKeys(Zone=ZONE, Address='192.0.2.80', Dnskeys={
+            33333: {"flags": 257, "algorithm": 8, "digests": {2: DIGEST}}})
+        propagation = PropagationReport(Zone=ZONE, Parent='fi.', Servers=[
+            ServerDsResult(Host='a.fi.', Address='192.0.2.1', Ds=make_ds([33333]), Rtt=0.01)])
+        report = ZoneReport.analyze(make_zone([READY]), propagation=propagation, child=child)
+        self.assertEqual([('ds-seen', 33333)], report.get_safe_actions())
+        # Unverified DS-records are never safe
+        report = ZoneReport.analyze(make_zone([READY]), propagation=propagation)
+        self.assertEqual([], report.get_safe_actions())
+
+    def test_failed(self):
+        lines = TextRenderer.format(ZoneReport.failed(ZONE, 'timeout'))
+        self.assertEqual(["OpenDNSSEC zone %s information:" % ZONE, "  Failed to query DS-records: timeout"], lines)
+
+    def test_json_round_trip(self):
+        reports = [ZoneReport.analyze(make_zone(keys), (PARENT, make_ds(ds_tags) if ds_tags else None))
+                   for (_, keys, ds_tags, _, _, _, _) in CASES]
+        reports.append(ZoneReport.failed('failed.example', 'timeout'))
+        expected = [json.loads(json.dumps(report.to_json())) for report in reports]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for renderer_class in (JsonRenderer, NdjsonRenderer):
+                with self.subTest(renderer_class.__name__):
+                    output = io.StringIO()
+                    renderer = renderer_class(Output=output)
+                    renderer.begin()
+                    for report in reports:
+                        renderer.zone(report)
+                    renderer.end()
+                    filename = os.path.join(tmp_dir, renderer_class.__name__)
+                    with open(filename, 'w') as result_file:
+                        result_file.write(output.getvalue())
+                    self.assertEqual(expected, read_results(filename))
+                    # Records pass through unchanged, eg. when merging shards
+                    output = io.StringIO()
+                    renderer = renderer_class(Output=output)
+                    renderer.begin()
+                    for record in expected:
+                        renderer.record(record)
+                    renderer.end()
+                    with open(filename, 'w') as result_file:
+                        result_file.write(output.getvalue())
+                    self.assertEqual(expected, read_results(filename))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+from datetime import datetime
+from lib.odsutils import ODS, OdsKey, ZoneScheduler
+
+NOW = 1700000000.0
+ZONE = 'example.fi'
+
+
+def make_zone(*keys):
+    """
+    :param keys: tuples (keytag, state, seconds to next transition or None)
+    """
+    ods_keys = {}
+    for (tag, state, transition) in keys:
+        if transition is not None:
+            transition = datetime.fromtimestamp(NOW + transition)
+        ods_keys[tag] = OdsKey(Type='KSK', Tag=tag, State=state, Bits=2048, Algorithm=8, NextTransition=transition)
+
+    return ODS(ZoneName=ZONE, Keys=ods_keys)
+
+
+class ZoneSchedulerQueueTest(unittest.TestCase):
+
+    def test_pop_in_due_order(self):
+        scheduler = ZoneScheduler()
+        scheduler.schedule('c.fi', NOW + 300)
+        scheduler.schedule('a.fi', NOW + 100)
+        scheduler.schedule('b.fi', NOW + 200)
+        self.assertEqual(3, len(scheduler))
+        self.assertEqual(NOW + 100, scheduler.get_next_due())
+        self.assertEqual([], scheduler.pop_due(NOW))
+        self.assertEqual(['a.fi'], scheduler.pop_due(NOW + 100))
+        self.assertEqual(['b.fi', 'c.fi'], scheduler.pop_due(NOW + 300))
+        self.assertEqual(0, len(scheduler))
+        self.assertIsNone(scheduler.get_next_due())
+
+    def test_batch_window(self):
+        scheduler = ZoneScheduler()
+        scheduler.schedule('a.fi', NOW)
+        scheduler.schedule('b.fi', NOW + ZoneScheduler.BATCH_WINDOW)
+        scheduler.schedule('c.fi', NOW + ZoneScheduler.BATCH_WINDOW + 1)
+        self.assertEqual(['a.fi', 'b.fi'], scheduler.pop_due(NOW))
+        self.assertIn('c.fi', scheduler)
+
+    def test_reschedule_and_remove(self):
+        scheduler = ZoneScheduler()
+        scheduler.schedule('a.fi', NOW + 100)
+        scheduler.schedule('b.fi', NOW + 200)
+        # Stale heap entries of a rescheduled or removed zone are skipped
+        scheduler.schedule('a.fi', NOW + 1000)
+        scheduler.remove('b.fi')
+        self.assertEqual(1, len(scheduler))
+        self.assertNotIn('b.fi', scheduler)
+        self.assertEqual(NOW + 1000, scheduler.get_next_due())
+        self.assertEqual([], scheduler.pop_due(NOW + 500))
+        self.assertEqual(['a.fi'], scheduler.pop_due(NOW + 1000))
+
+
+class ZoneSchedulerIntervalTest(unittest.TestCase):
+    ACTIVE = OdsKey.ODS_ZONE_STATUS_ACTIVE
+    READY = OdsKey.ODS_ZONE_STATUS_READY
+
+    def setUp(self):
+        self.scheduler = ZoneScheduler(RolloverInterval=600, SteadyInterval=86400)
+
+    def test_intervals(self):
+        # (description, keys, DS at parent, DS TTL, propagated, expected interval)
+        cases = [
+            ('steady', [(11111, self.ACTIVE, None)], {11111: {}}, None, True, 86400),
+            ('DS mismatch', [(11111, self.ACTIVE, None)], {22222: {}}, None, True, 600),
+            ('no DS', [(11111, self.ACTIVE, None)], None, None, True, 600),
+            ('rollover', [(11111, self.ACTIVE, None), (22222, self.READY, None)], {11111: {}}, None, True, 600),
+            ('rollover, short TTL', [(11111, self.ACTIVE, None), (22222, self.READY, None)], {11111: {}}, 300,
+             True, 300),
+            ('rollover, tiny TTL', [(11111, self.ACTIVE, None), (22222, self.READY, None)], {11111: {}}, 5,
+             True, ZoneScheduler.MIN_INTERVAL),
+            ('rollover, long TTL', [(11111, self.ACTIVE, None), (22222, self.READY, None)], {11111: {}}, 86400,
+             True, 600),
+            ('propagating', [(11111, self.ACTIVE, None)], {11111: {}}, None, False, ZoneScheduler.MIN_INTERVAL),
+            ('transition first', [(11111, self.ACTIVE, 3600)], {11111: {}}, None, True, 3600),
+            ('transition imminent', [(11111, self.ACTIVE, 10)], {11111: {}}, None, True,
+             ZoneScheduler.MIN_INTERVAL),
+            ('transition later', [(11111, self.ACTIVE, 100000)], {11111: {}}, None, True, 86400),
+            ('transition overdue', [(11111, self.ACTIVE, -3600)], {11111: {}}, None, True, 86400),
+            ('transition overdue, rollover', [(11111, self.ACTIVE, None), (22222, self.READY, -3600)], {11111: {}},
+             None, True, 600),
+        ]
+        for (description, keys, dns_result, ds_ttl, propagated, interval) in cases:
+            with self.subTest(description):
+                due = self.scheduler.get_next_check(make_zone(*keys), dns_result, ds_ttl=ds_ttl,
+                                                    propagated=propagated, now=NOW)
+                self.assertEqual(NOW + interval, due)
+
+    def test_overdue_transition_backs_off(self):
+        # Enforcer not acting on a passed transition must not requeue the zone every MIN_INTERVAL
+        zone = make_zone((11111, self.ACTIVE, None), (22222, self.READY, 0))
+        now = NOW
+        for _ in range(3):
+            due = self.scheduler.get_next_check(zone, {11111: {}}, now=now)
+            self.assertEqual(now + 600, due)
+            now = due
+
+    def test_retry(self):
+        self.assertEqual(NOW + 600, self.scheduler.get_retry(NOW))
+
+
+if __name__ == '__main__':
+    unittest.main()
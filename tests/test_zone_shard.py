@@ -0,0 +1,94 @@
+import json
+import os
+import tempfile
+import unittest
+from lib.odsutils import ZoneShard
+from lib.reportutils import merge_results
+
+ZONES = ['example.fi', 'example.com', 'foo.example.fi', 'bar.example.fi']
+
+
+class ZoneShardTest(unittest.TestCase):
+
+    def test_get_shard(self):
+        # CRC32, fixed for good: shards of different hosts and versions must agree
+        self.assertEqual([1, 2, 2, 1], [ZoneShard.get_shard(zone, 4) for zone in ZONES])
+        self.assertEqual(1, ZoneShard.get_shard('Example.FI.', 4))
+        # Shards of fi, com, example.fi and example.fi
+        self.assertEqual([3, 3, 1, 1], [ZoneShard.get_shard(zone, 4, ZoneShard.BY_PARENT) for zone in ZONES])
+
+    def test_partition(self):
+        zones = ['zone%d.fi' % idx for idx in range(1000)]
+        for by in ZoneShard.BY:
+            for count in (1, 3, 8):
+                with self.subTest(by=by, count=count):
+                    shards = ZoneShard.partition(zones, count, by)
+                    self.assertEqual(count, len(shards))
+                    # Each zone in exactly one shard, the shard selecting it
+                    self.assertEqual(sorted(zones), sorted([zone for shard in shards for zone in shard]))
+                    for (index, shard) in enumerate(shards, start=1):
+                        self.assertEqual(shard, ZoneShard(Index=index, Count=count, By=by).select(zones))
+
+    def test_by_zone_is_even(self):
+        shards = ZoneShard.partition(['zone%d.fi' % idx for idx in range(1000)], 4)
+        for shard in shards:
+            self.assertLess(abs(len(shard) - 250), 50)
+
+    def test_by_parent_keeps_parent_together(self):
+        zones = ['zone%d.example.fi' % idx for idx in range(100)]
+        shards = ZoneShard.partition(zones, 4, ZoneShard.BY_PARENT)
+        self.assertEqual([zones], [shard for shard in shards if shard])
+
+    def test_parse(self):
+        shard = ZoneShard.parse('2/4', ZoneShard.BY_PARENT)
+        self.assertEqual((2, 4, ZoneShard.BY_PARENT), (shard.index, shard.count, shard.by))
+        for value in ['2', '2/x', '0/4', '5/4', '1/0', '1/2/3']:
+            with self.subTest(value), self.assertRaises(ValueError):
+                ZoneShard.parse(value)
+        with self.assertRaises(ValueError):
+            ZoneShard(Index=1, Count=2, By='random')
+
+
+class MergeResultsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write(self, name: str, content: str):
+        filename = os.path.join(self.tmp_dir.name, name)
+        with open(filename, 'w') as results_file:
+            results_file.write(content)
+
+        return filename
+
+    def test_merge(self):
+        shard1 = self._write('shard1.json', json.dumps({"zones": [
+            {"zone": "example.fi", "phase": "active"},
+            {"zone": "b.fi", "phase": "active"},
+        ]}))
+        shard2 = self._write('shard2.ndjson', '\n'.join([
+            json.dumps({"zone": "a.fi", "phase": "ds-seen"}),
+            '',
+            json.dumps({"zone": "example.fi", "phase": "ds-gone"}),
+        ]) + '\n')
+        merged = merge_results([shard1, shard2])
+        # Ordered by zone, the last file wins
+        self.assertEqual([('a.fi', 'ds-seen'), ('b.fi', 'active'), ('example.fi', 'ds-gone')],
+                         [(record["zone"], record["phase"]) for record in merged])
+        self.assertEqual('active', merge_results([shard2, shard1])[2]["phase"])
+
+    def test_merge_single_zone_ndjson(self):
+        shard = self._write('shard.ndjson', json.dumps({"zone": "example.fi", "phase": "active"}) + '\n')
+        self.assertEqual([{"zone": "example.fi", "phase": "active"}], merge_results([shard]))
+
+    def test_merge_broken_line(self):
+        shard = self._write('shard.ndjson', '{"zone": "example.fi"}\n{"zone": \n')
+        with self.assertRaisesRegex(ValueError, 'shard.ndjson line 2'):
+            merge_results([shard])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from lib.odsutils import ODS, OdsKey
+from lib.reportutils import NdjsonRenderer, StateRenderer, ZoneReport, ZoneStates
+
+NOW = 1700000000.0
+TRANSITION = datetime(2030, 5, 1, 10, 0)
+ACTIVE = OdsKey(Type='KSK', Tag=11111, State=OdsKey.ODS_ZONE_STATUS_ACTIVE, Bits=2048, Algorithm=8,
+                NextTransition=None)
+READY = OdsKey(Type='KSK', Tag=22222, State=OdsKey.ODS_ZONE_STATUS_READY, Bits=2048, Algorithm=8,
+               NextTransition=TRANSITION)
+
+
+def make_report(zone: str, keys: list, ds_tags: list, phase: str = ZoneReport.PHASE_ACTIVE):
+    return ZoneReport(Zone=zone, Phase=phase, Keys={key.tag: key for key in keys},
+                      Ds={tag: {"keytag": tag} for tag in ds_tags})
+
+
+class ZoneStatesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp_dir.name, 'states.json')
+        # Previous run
+        states = ZoneStates(Filename=self.filename)
+        states.update(make_report('example.fi', [ACTIVE], [11111]), now=NOW)
+        states.update(make_report('example.com', [ACTIVE, READY], [11111], ZoneReport.PHASE_WAITING), now=NOW)
+        states.update(make_report('removed.fi', [ACTIVE], [11111]), now=NOW)
+        states.save()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_update(self):
+        states = ZoneStates(Filename=self.filename)
+        # (description, report, changed)
+        cases = [
+            ('unchanged', make_report('example.fi', [ACTIVE], [11111]), False),
+            ('new zone', make_report('new.fi', [ACTIVE], [11111]), True),
+            ('DS changed', make_report('example.fi', [ACTIVE], [11111, 22222]), True),
+            ('keys changed', make_report('example.fi', [ACTIVE, READY], [11111]), True),
+            ('phase changed', make_report('example.fi', [ACTIVE], [11111], ZoneReport.PHASE_DS_SEEN), True),
+        ]
+        for (description, report, changed) in cases:
+            with self.subTest(description):
+                self.assertEqual(changed, states.update(report, now=NOW + 60))
+                self.assertEqual(int(NOW + 60), states.current[report.zone]["checked"])
+
+    def test_keep(self):
+        states = ZoneStates(Filename=self.filename)
+        example_fi = ODS(ZoneName='example.fi', Keys={ACTIVE.tag: ACTIVE})
+        example_com = ODS(ZoneName='example.com', Keys={ACTIVE.tag: ACTIVE, READY.tag: READY})
+        rolled = ODS(ZoneName='example.fi', Keys={ACTIVE.tag: ACTIVE, READY.tag: READY})
+        unknown = ODS(ZoneName='new.fi', Keys={ACTIVE.tag: ACTIVE})
+        self.assertFalse(states.keep(example_fi, 3600, now=NOW + 7200), 'checked too long ago')
+        self.assertFalse(states.keep(rolled, 3600, now=NOW + 60), 'keys changed in enforcer')
+        self.assertFalse(states.keep(unknown, 3600, now=NOW + 60), 'not in previous run')
+        self.assertEqual({}, states.current)
+        self.assertTrue(states.keep(example_fi, 3600, now=NOW + 60))
+        self.assertTrue(states.keep(example_com, 3600, now=NOW + 60))
+        # Kept as is, when DNS was checked stays
+        self.assertEqual(int(NOW), states.current['example.fi']["checked"])
+
+    def test_keep_needs_steady_phase(self):
+        states = ZoneStates(Filename=self.filename)
+        states.update(make_report('example.fi', [ACTIVE], [11111], ZoneReport.PHASE_DS_SEEN), now=NOW)
+        states.save()
+        states = ZoneStates(Filename=self.filename)
+        self.assertFalse(states.keep(ODS(ZoneName='example.fi', Keys={ACTIVE.tag: ACTIVE}), 3600, now=NOW + 60))
+
+    def test_save(self):
+        states = ZoneStates(Filename=self.filename)
+        states.update(make_report('example.fi', [ACTIVE], [11111]), now=NOW)
+        self.assertEqual(['example.com', 'removed.fi'], states.get_removed())
+        states.save(complete=False)
+        self.assertEqual(['example.com', 'example.fi', 'removed.fi'], sorted(ZoneStates(self.filename).previous))
+        states.save()
+        self.assertEqual(['example.fi'], sorted(ZoneStates(self.filename).previous))
+        with open(self.filename) as state_file:
+            self.assertEqual(ZoneStates.VERSION, json.load(state_file)["version"])
+        self.assertEqual(['states.json'], os.listdir(self.tmp_dir.name), 'no temporary files left behind')
+
+    def test_unknown_version(self):
+        with open(self.filename, 'w') as state_file:
+            json.dump({"version": ZoneStates.VERSION + 1, "zones": {}}, state_file)
+        with self.assertRaises(ValueError):
+            ZoneStates(Filename=self.filename)
+
+    def test_get_keys(self):
+        self.assertEqual([[11111, 'active', None], [22222, 'ready', '2030-05-01T10:00:00']],
+                         ZoneStates.get_keys({READY.tag: READY, ACTIVE.tag: ACTIVE}))
+
+    def test_changed_only(self):
+        reports = [
+            make_report('example.fi', [ACTIVE], [11111]),
+            make_report('example.com', [ACTIVE], [11111]),
+            make_report('new.fi', [ACTIVE], [11111]),
+        ]
+        for (changed_only, zones) in [(True, ['example.com', 'new.fi']),
+                                      (False, ['example.fi', 'example.com', 'new.fi'])]:
+            with self.subTest(changed_only=changed_only):
+                output = io.StringIO()
+                states = ZoneStates(Filename=self.filename)
+                renderer = StateRenderer(Renderer=NdjsonRenderer(Output=output), States=states,
+                                         ChangedOnly=changed_only)
+                renderer.begin()
+                for report in reports:
+                    renderer.zone(report)
+                renderer.end()
+                self.assertEqual(zones, [json.loads(line)["zone"] for line in output.getvalue().splitlines()])
+                self.assertEqual(len(zones), renderer.count)
+                # All zones are recorded, whether output or not
+                self.assertEqual(['example.com', 'example.fi', 'new.fi'], sorted(states.current))
+
+
+if __name__ == '__main__':
+    unittest.main()